@@ -0,0 +1,117 @@
+import argparse
+import json
+import random
+import time
+
+from encoder.chunker import Chunker
+from encoder.fec import FecEncoder
+from decoder.freamereassembler import FrameReassembler
+
+# Benchmark de FEC: costo de codificación/decodificación por frame vs. tasa de recuperación.
+# Uso: python -m benchmarks.fec_benchmark --frame-size 60000 --loss 0.01 0.02 0.05
+
+
+class _RecoveryCounter:
+    """Logger mínimo compatible con FrameLogMetrics que solo cuenta lo que interesa."""
+    def __init__(self):
+        self.recovered_chunks = 0
+
+    def log_fec_recovered(self, chunks):
+        self.recovered_chunks += chunks
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+def run_case(scheme, parity_count, loss_rate, frame_size, payload_size, frames, seed):
+    rng = random.Random(seed)
+    fec = FecEncoder(scheme, parity_count) if scheme != 'none' else None
+    chunker = Chunker(payload_size=payload_size, fec=fec)
+    counter = _RecoveryCounter()
+    # max_age_s=0: todo frame incompleto se resuelve en la misma llamada
+    reassembler = FrameReassembler(payload_size=payload_size, max_age_s=0.0,
+                                   chunk_threshold=1.01, logger=counter)
+
+    encode_time = 0.0
+    decode_time = 0.0
+    damaged = 0
+    delivered_intact = 0
+
+    for _ in range(frames):
+        frame = rng.randbytes(frame_size)
+
+        start = time.perf_counter()
+        packets = chunker.chunk_frame(frame, quality_id=1, is_keyframe=False)
+        encode_time += time.perf_counter() - start
+
+        data_chunks = -(-frame_size // payload_size)
+        lost_data = 0
+        survivors = []
+        for index, packet in enumerate(packets):
+            if rng.random() < loss_rate:
+                lost_data += index < data_chunks
+                continue
+            survivors.append(packet)
+        damaged += lost_data > 0
+
+        for packet in survivors:
+            reassembler.add_chunk(packet)
+
+        start = time.perf_counter()
+        result = reassembler.get_next_frame()
+        decode_time += time.perf_counter() - start
+
+        if result is not None and bytes(result['frame_data']) == frame:
+            delivered_intact += 1
+
+    recovered_frames = delivered_intact - (frames - damaged)
+    return {
+        'scheme': scheme,
+        'parity_count': parity_count if fec else 0,
+        'loss_rate': loss_rate,
+        'frame_size': frame_size,
+        'frames': frames,
+        'overhead_pct': 100.0 * (len(packets) - data_chunks) / data_chunks,
+        'encode_ms_per_frame': 1000.0 * encode_time / frames,
+        'decode_ms_per_frame': 1000.0 * decode_time / frames,
+        'damaged_frames': damaged,
+        'recovered_frames': recovered_frames,
+        'recovery_rate': (recovered_frames / damaged) if damaged else 1.0,
+        'intact_rate': delivered_intact / frames,
+        'recovered_chunks': counter.recovered_chunks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de FEC por frame")
+    parser.add_argument('--frame-size', type=int, default=60000, help="bytes del JPEG simulado")
+    parser.add_argument('--payload-size', type=int, default=1400)
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--loss', type=float, nargs='+', default=[0.01, 0.02, 0.05])
+    parser.add_argument('--parity', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--json', help="archivo donde guardar los resultados")
+    args = parser.parse_args()
+
+    results = []
+    for loss_rate in args.loss:
+        results.append(run_case('none', 0, loss_rate, args.frame_size, args.payload_size, args.frames, args.seed))
+        for scheme in ('xor', 'rs'):
+            for parity_count in args.parity:
+                results.append(run_case(scheme, parity_count, loss_rate, args.frame_size,
+                                        args.payload_size, args.frames, args.seed))
+
+    print(f"{'esquema':>7} {'m':>3} {'pérdida':>8} {'overhead':>9} {'enc ms':>8} {'dec ms':>8} "
+          f"{'dañados':>8} {'recup.':>7} {'intactos':>9}")
+    for r in results:
+        print(f"{r['scheme']:>7} {r['parity_count']:>3} {r['loss_rate']:>8.3f} {r['overhead_pct']:>8.1f}% "
+              f"{r['encode_ms_per_frame']:>8.3f} {r['decode_ms_per_frame']:>8.3f} {r['damaged_frames']:>8} "
+              f"{r['recovery_rate']:>7.1%} {r['intact_rate']:>9.1%}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,387 @@
+import argparse
+import itertools
+import json
+import select
+import socket
+import threading
+import time
+
+import numpy as np
+import cv2
+
+from encoder.chunker import Chunker
+from encoder.fec import FEC_HEADER_SIZE
+from encoder.tiledelta import DeltaChain, is_tile_delta, apply_tile_delta
+from udp_connection.udp_server import UDPServer
+from udp_connection.udp_client import UDPClient
+from udp_connection.subscribers import SubscriberRegistry
+from decoder.freamereassembler import FrameReassembler
+from decoder.videoplaybackbuffer import VideoPlaybackBuffer
+from workers.encoder.screencapture_worker import ScreenCaptureWorker
+from workers.encoder.chunker_worker import ChunkerWorker
+from workers.encoder.network_sender_worker import UDPServerWorker
+from workers.encoder.control_worker import ControlWorker
+from workers.decoder.network_receiver_worker import UDPReceiverWorker
+from workers.decoder.framereassembler_worker import FrameReassemblerWorker
+from workers.decoder.videoplaybackbuffer_worker import VideoPlaybackBufferWorker
+from benchmarks.synthetic_source import SyntheticFrameSource, read_sequence
+from tools.impairment_proxy import ImpairmentProxy, add_impairment_arguments, impairment_from_args, IMPAIRMENT_OPTIONS
+
+# Benchmark de punta a punta sobre 127.0.0.1, sin pantalla ni ventana:
+# fuente sintética → chunker/UDP reales → reensamblado y playback reales → sumidero que decodifica.
+# Compara el camino de server.py contra server_threads.py y el de client.py contra client3.py.
+# Uso: python -m benchmarks.loopback_benchmark --resolutions 800x600 1920x1080 --motion 0.1 0.5 --json out.json
+# Con --profile o alguna opción de degradación (--loss, --jitter-ms, ...) los clientes pasan por
+# tools/impairment_proxy.py en lugar de hablar directo con el servidor.
+
+PAYLOAD_SIZE = 1400
+HOST = '127.0.0.1'
+PROXY_PORT_OFFSET = 1000
+
+
+class _CountingLogger:
+    """Logger mínimo compatible con FrameLogMetrics que solo cuenta eventos del reensamblador."""
+    def __init__(self):
+        self.chunks = 0
+        self.complete = 0
+        self.partial = 0
+        self.expired = 0
+        self.skipped = 0
+
+    def log_chunk_received(self):
+        self.chunks += 1
+
+    def log_frame_complete(self, received_chunks, avg_latency):
+        self.complete += 1
+
+    def log_frame_partial(self, received_chunks):
+        self.partial += 1
+
+    def log_frame_expired(self, received_chunks):
+        self.expired += 1
+
+    def log_frames_skipped(self, count):
+        self.skipped += count
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class HeadlessSink:
+    """Reemplaza a LiveVideoViewer: decodifica sin mostrar y mide la latencia captura → decodificado."""
+    def __init__(self, source: SyntheticFrameSource):
+        self.source = source
+        self.canvas = None
+        self.delta_chain = DeltaChain()  # El cliente conecta request_keyframe al arrancar
+        self.frames = 0
+        self.undecodable = 0
+        self.latencies = []
+
+    def consume(self, frame_data, metadata):
+        if is_tile_delta(frame_data):
+            usable = self.delta_chain.accept_delta(metadata) and self.canvas is not None
+            image = self.canvas if usable and apply_tile_delta(self.canvas, frame_data) else None
+        else:
+            image = cv2.imdecode(np.frombuffer(frame_data, dtype=np.uint8), cv2.IMREAD_COLOR)
+            self.canvas = image
+            if image is not None:
+                self.delta_chain.full_frame(metadata)
+        now = time.time()
+        if image is None:
+            self.undecodable += 1
+            return
+        self.frames += 1
+        captured = self.source.capture_times.get(read_sequence(image))
+        if captured is not None:
+            self.latencies.append(now - captured)
+
+
+# --- Servidores ---
+
+class SimpleServerRunner:
+    """El bucle de server.py: captura, divide y reparte en un solo hilo."""
+    name = 'server'
+
+    def __init__(self, source, port):
+        self.source = source
+        self.server = UDPServer(host_ip=HOST, port=port, buffer_size=PAYLOAD_SIZE + 16,
+                                zero_copy=True, batch_send=True)
+        self.registry = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.server.set_socket()
+        self.server.bind()
+        self.registry = SubscriberRegistry(self.server, on_join=lambda addr: self.source.request_keyframe(),
+                                           on_keyframe_request=lambda addr: self.source.request_keyframe())
+        self.thread.start()
+
+    def _handle_control(self, timeout=0.0):
+        for data, addr in self.server.poll_control(timeout):
+            self.registry.handle_message(data, addr)
+
+    def _run(self):
+        while self.registry.count() == 0 and not self.stop_event.is_set():
+            self._handle_control(timeout=0.1)
+        for frame in self.source:
+            if self.stop_event.is_set():
+                break
+            self._handle_control()
+            is_keyframe, quality_id = self.source.is_keyframe()
+            self.registry.broadcast(self.server.build_chunks(frame, quality_id, is_keyframe))
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        time.sleep(0.1)  # Deja vaciar las colas de envío antes de contar y mandar el EOF
+        stats = self.registry.get_stats()
+        self.registry.close()
+        return stats
+
+
+class ThreadedServerRunner:
+    """Los workers de server_threads.py: captura, chunking y envío en hilos separados."""
+    name = 'server_threads'
+
+    def __init__(self, source, port):
+        self.source = source
+        udp_server = UDPServer(host_ip=HOST, port=port, buffer_size=PAYLOAD_SIZE + 16, batch_send=True)
+        screen_worker = ScreenCaptureWorker(source)
+        self.workers = {
+            "screen": screen_worker,
+            "chunker": ChunkerWorker(Chunker(payload_size=PAYLOAD_SIZE), source=screen_worker),
+            "udp": UDPServerWorker(udp_server, on_join=lambda addr: source.request_keyframe(),
+                                   on_keyframe_request=lambda addr: source.request_keyframe()),
+        }
+        self.control = ControlWorker(workers=self.workers, udp_server=udp_server, screen_capturer=source)
+
+    def start(self):
+        # Como ControlWorker.start() pero sin el hilo de teclado
+        for worker in self.workers.values():
+            worker.start()
+        threading.Thread(target=self._start_when_subscribed, daemon=True).start()
+
+    def _start_when_subscribed(self):
+        if self.workers["udp"].wait_for_subscriber(timeout=10.0):
+            self.control.main_thread.start()
+
+    def stop(self):
+        self.control.should_exit = True
+        if self.control.main_thread.is_alive():
+            self.control.main_thread.join()
+        for worker in self.workers.values():
+            worker.stop()
+        time.sleep(0.1)
+        stats = self.workers["udp"].get_subscriber_stats()
+        self.workers["udp"].close_subscribers()
+        return stats
+
+
+# --- Clientes ---
+
+class SimpleClientRunner:
+    """El bucle de client.py: recibe, reensambla y reproduce en un solo hilo."""
+    name = 'client'
+
+    def __init__(self, port, sink, fps):
+        self.client = UDPClient(host_ip=HOST, port=port, buffer_size=PAYLOAD_SIZE + 16 + FEC_HEADER_SIZE)
+        self.logger = _CountingLogger()
+        self.reassembler = FrameReassembler(payload_size=PAYLOAD_SIZE, logger=self.logger)
+        self.playbackbuffer = VideoPlaybackBuffer(fps=fps)
+        self.sink = sink
+        self.running = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.client.set_socket()
+        self.client.send_packet("READY")
+        self.client.start_heartbeat()
+        self.sink.delta_chain.request_keyframe = self.client.request_keyframe
+        self.running = True
+        self.thread.start()
+
+    def _run(self):
+        sock = self.client.socket
+        while self.running:
+            readable, _, _ = select.select([sock], [], [], 0.2)
+            chunk = None
+            if readable:
+                chunk, _ = self.client.receive_chunk()
+                if chunk and self.client.is_eof(chunk):
+                    break
+            if chunk:
+                self.reassembler.add_chunk(chunk)
+
+            frame = self.reassembler.get_next_frame()
+            frame_data, metadata = self.playbackbuffer.push_and_get(frame)
+            if frame_data:
+                self.sink.consume(frame_data, metadata)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self.client.send_bye()
+
+
+class ThreadedClientRunner:
+    """Los workers de client3.py: recepción por lotes, reensamblado y playback en hilos separados."""
+    name = 'client3'
+
+    def __init__(self, port, sink, fps):
+        self.client = UDPClient(host_ip=HOST, port=port, buffer_size=PAYLOAD_SIZE + 16 + FEC_HEADER_SIZE)
+        self.logger = _CountingLogger()
+        self.reassembler = FrameReassembler(payload_size=PAYLOAD_SIZE, logger=self.logger)
+        self.sink = sink
+        self.fps = fps
+        self.running = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.client.set_socket()
+        self.client.send_packet("READY")
+        self.client.start_heartbeat()
+        self.sink.delta_chain.request_keyframe = self.client.request_keyframe
+        self.receiver = UDPReceiverWorker(udp_client=self.client, batch_mode=True)
+        self.reassembler_worker = FrameReassemblerWorker(reassembler=self.reassembler,
+                                                         input_queue=self.receiver.packet_queue)
+        self.playback_worker = VideoPlaybackBufferWorker(video_buffer=VideoPlaybackBuffer(fps=self.fps),
+                                                         input_queue=self.reassembler_worker.output_queue)
+        self.receiver.start()
+        self.reassembler_worker.start()
+        self.playback_worker.start()
+        self.running = True
+        self.thread.start()
+
+    def _run(self):
+        while self.running:
+            result = self.playback_worker.get_next_decoded_frame(timeout=0.2)
+            if result is not None:
+                self.sink.consume(*result)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        self._wake_receiver()
+        self.receiver.stop()
+        self.reassembler_worker.stop()
+        self.playback_worker.stop()
+        self.client.send_bye()
+
+    def _wake_receiver(self):
+        """
+        El EOF del servidor puede no llegar (el proxy lo descarta, demora o reordena):
+        un EOF local desbloquea al receptor si sigue esperando en recvmmsg.
+        """
+        port = self.client.socket.getsockname()[1]
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.sendto(b'\xff' * 6, (HOST, port))
+
+
+SERVERS = {runner.name: runner for runner in (SimpleServerRunner, ThreadedServerRunner)}
+CLIENTS = {runner.name: runner for runner in (SimpleClientRunner, ThreadedClientRunner)}
+
+
+def run_case(server_name, client_name, width, height, fps, motion, jpeg_kb, duration, port, tile_delta,
+             impairment=None):
+    source = SyntheticFrameSource(width=width, height=height, fps=fps, motion=motion,
+                                  jpeg_kb=jpeg_kb or None, tile_delta=tile_delta)
+    sink = HeadlessSink(source)
+    server = SERVERS[server_name](source, port)
+    proxy = None
+    client_port = port
+    if impairment is not None:
+        client_port = port + PROXY_PORT_OFFSET
+        proxy = ImpairmentProxy(client_port, (HOST, port), downstream=impairment, stats_interval=0)
+    client = CLIENTS[client_name](client_port, sink, fps)
+
+    server.start()
+    if proxy is not None:
+        proxy.start()
+    client.start()
+    start = time.time()
+    time.sleep(duration)
+    subscriber_stats = server.stop()
+    elapsed = time.time() - start
+    time.sleep(0.2)  # Últimos paquetes y EOF
+    client.stop()
+    if proxy is not None:
+        proxy.stop()
+
+    sent = next(iter(subscriber_stats.values()), {'frames_sent': 0, 'packets_sent': 0, 'bytes_sent': 0})
+    counts = client.logger
+    latencies_ms = np.array(sink.latencies) * 1000.0
+    return {
+        'server': server_name,
+        'client': client_name,
+        'resolution': f'{width}x{height}',
+        'fps': fps,
+        'motion': motion,
+        'jpeg_kb_target': jpeg_kb,
+        'duration_s': elapsed,
+        'avg_jpeg_kb': (source.total_bytes / source.encoded_frames / 1024) if source.encoded_frames else 0.0,
+        'frames_captured': source.seq,
+        'frames_sent': sent['frames_sent'],
+        'frames_displayed': sink.frames,
+        'displayed_fps': sink.frames / elapsed,
+        'throughput_mbps': sent['bytes_sent'] * 8 / elapsed / 1e6,
+        'packets_sent': sent['packets_sent'],
+        'packets_received': counts.chunks,
+        'packet_loss': 1.0 - counts.chunks / sent['packets_sent'] if sent['packets_sent'] else 0.0,
+        'frames_complete': counts.complete,
+        'frames_partial': counts.partial,
+        'frames_expired': counts.expired,
+        'frames_skipped': counts.skipped,
+        'completeness': counts.complete / sent['frames_sent'] if sent['frames_sent'] else 0.0,
+        'latency_p50_ms': float(np.percentile(latencies_ms, 50)) if len(latencies_ms) else None,
+        'latency_p99_ms': float(np.percentile(latencies_ms, 99)) if len(latencies_ms) else None,
+    }
+
+
+def _resolution(text):
+    width, height = text.lower().split('x')
+    return int(width), int(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de punta a punta por loopback")
+    parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=sorted(SERVERS))
+    parser.add_argument('--clients', nargs='+', choices=sorted(CLIENTS), default=sorted(CLIENTS))
+    parser.add_argument('--resolutions', type=_resolution, nargs='+', default=[(800, 600)])
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--motion', type=float, nargs='+', default=[0.1],
+                        help="fracción de la imagen que cambia por frame")
+    parser.add_argument('--jpeg-kb', type=int, nargs='+', default=[0],
+                        help="tamaño objetivo del JPEG en KB (0 = según la calidad por defecto)")
+    parser.add_argument('--duration', type=float, default=5.0, help="segundos por configuración")
+    parser.add_argument('--tile-delta', action='store_true')
+    parser.add_argument('--port', type=int, default=6100)
+    parser.add_argument('--json', help="archivo donde guardar los resultados")
+    add_impairment_arguments(parser)
+    args = parser.parse_args()
+    impaired = args.profile is not None or any(getattr(args, name) is not None for name in IMPAIRMENT_OPTIONS)
+
+    results = []
+    cases = itertools.product(args.servers, args.clients, args.resolutions, args.motion, args.jpeg_kb)
+    for index, (server_name, client_name, (width, height), motion, jpeg_kb) in enumerate(cases):
+        print(f"[BENCH] {server_name} → {client_name} {width}x{height} motion={motion} jpeg_kb={jpeg_kb}")
+        results.append(run_case(server_name, client_name, width, height, args.fps, motion, jpeg_kb,
+                                args.duration, args.port + index, args.tile_delta,
+                                impairment_from_args(args, args.seed) if impaired else None))
+
+    print(f"{'servidor':>15} {'cliente':>8} {'resolución':>10} {'mov.':>5} {'KB':>6} {'fps':>6} "
+          f"{'Mbit/s':>7} {'pérdida':>8} {'complet.':>9} {'p50 ms':>7} {'p99 ms':>7}")
+    for r in results:
+        p50 = f"{r['latency_p50_ms']:.1f}" if r['latency_p50_ms'] is not None else '-'
+        p99 = f"{r['latency_p99_ms']:.1f}" if r['latency_p99_ms'] is not None else '-'
+        print(f"{r['server']:>15} {r['client']:>8} {r['resolution']:>10} {r['motion']:>5.2f} "
+              f"{r['avg_jpeg_kb']:>6.1f} {r['displayed_fps']:>6.1f} {r['throughput_mbps']:>7.1f} "
+              f"{r['packet_loss']:>8.2%} {r['completeness']:>9.1%} {p50:>7} {p99:>7}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+import numpy as np
+
+from encoder.screencapturer import ScreenCapturer
+
+# Cada frame lleva su número de secuencia en una franja de bloques blancos/negros
+# (arriba a la izquierda) que sobrevive a la compresión JPEG; así el receptor puede
+# saber qué frame está mostrando y medir la latencia captura → pantalla.
+SEQ_BITS = 24
+SEQ_BLOCK = 16
+
+
+def stamp_sequence(image: np.ndarray, seq: int):
+    for bit in range(SEQ_BITS):
+        value = 255 if (seq >> bit) & 1 else 0
+        image[:SEQ_BLOCK, bit * SEQ_BLOCK:(bit + 1) * SEQ_BLOCK, :3] = value
+
+
+def read_sequence(image: np.ndarray) -> int:
+    """Lee el número de secuencia de un frame decodificado (BGR)."""
+    half = SEQ_BLOCK // 2
+    seq = 0
+    for bit in range(SEQ_BITS):
+        x = bit * SEQ_BLOCK + half
+        if image[half - 2:half + 2, x - 2:x + 2].mean() > 127:
+            seq |= 1 << bit
+    return seq
+
+
+class SyntheticFrameSource(ScreenCapturer):
+    """
+    Reemplazo de ScreenCapturer sin pantalla (no usa mss) para benchmarks:
+    - motion: fracción de la imagen que cambia en cada frame (una franja que se desplaza)
+    - detail: amplitud del ruido de la textura; más detalle, JPEG más grande
+    - jpeg_kb: si se indica, la calidad se ajusta sola para acercarse a ese tamaño
+    Guarda el instante de captura de cada frame en capture_times (por secuencia).
+    """
+    def __init__(self, width=800, height=600, fps=60, quality=80, motion=0.1,
+                 detail=6, jpeg_kb=None, seed=1234, **kwargs):
+        super().__init__(width=width, height=height, fps=fps, quality=quality, **kwargs)
+        if width < SEQ_BITS * SEQ_BLOCK or height < SEQ_BLOCK:
+            raise ValueError(f"Resolución mínima {SEQ_BITS * SEQ_BLOCK}x{SEQ_BLOCK} para la marca de secuencia")
+        self.motion = max(0.0, min(motion, 1.0))
+        self.jpeg_kb = jpeg_kb
+        self.rng = np.random.default_rng(seed)
+
+        # Textura base: degradado suave + ruido (el ruido es lo que cuesta comprimir)
+        gradient = np.linspace(0, 200, width, dtype=np.float32)[None, :, None]
+        noise = self.rng.normal(0, detail, (height, width, 1)).astype(np.float32)
+        base = np.clip(gradient + noise + 30, 0, 255).astype(np.uint8)
+        self.texture = np.concatenate([base, np.roll(base, 7, axis=1), np.roll(base, 13, axis=0),
+                                       np.full((height, width, 1), 255, np.uint8)], axis=2)
+        self.frame = self.texture.copy()
+
+        self.seq = 0
+        self.capture_times = {}
+        self.last_size = 0
+        self.total_bytes = 0
+        self.encoded_frames = 0
+
+    def grab_raw(self) -> np.ndarray:
+        self._wait_next_frame()
+
+        # Franja en movimiento: su contenido cambia en cada frame
+        band = int(self.height * self.motion)
+        if band > 0:
+            top = (self.seq * max(1, band // 2)) % max(1, self.height - band + 1)
+            self.frame[:] = self.texture
+            self.frame[top:top + band] = np.roll(self.texture[top:top + band], self.seq * 3, axis=1)
+
+        stamp_sequence(self.frame, self.seq)
+        self.capture_times[self.seq % (1 << SEQ_BITS)] = self.last_frame_time
+        self.seq += 1
+        return self.frame
+
+    def __next__(self):
+        payload = super().__next__()
+        self.last_size = len(payload)
+        self.total_bytes += self.last_size
+        self.encoded_frames += 1
+        if self.jpeg_kb:
+            # Ajuste proporcional simple de la calidad hacia el tamaño pedido
+            target = self.jpeg_kb * 1024
+            if self.last_size > target * 1.1:
+                self.quality = max(5, self.quality - 2)
+            elif self.last_size < target * 0.9:
+                self.quality = min(100, self.quality + 2)
+        return payload
+
+    def release(self):
+        pass
@@ -1,30 +1,60 @@
 import socket
 from udp_connection.udp_client import UDPClient
+from encoder.fec import FEC_HEADER_SIZE
 from decoder.freamereassembler import FrameReassembler
 from decoder.livevideoviewer import LiveVideoViewer
 from decoder.videoplaybackbuffer import VideoPlaybackBuffer
 from logger.framelogmetrics import FrameLogMetrics
 from logger.bufferlogger import BufferLogger
+from logger.frametracer import FrameTracer
+from logger.metrics import REGISTRY, MetricsExporter
+from udp_connection.clocksync import ClockSync
 
 # Config
 WIDTH, HEIGHT = 800, 600
 FPS = 60
 PAYLOAD_SIZE = 1400
-BUFFER_SIZE = PAYLOAD_SIZE + 16
+SERVER_PORT = 5005  # Puerto del servidor; el de tools/impairment_proxy.py para probar con una red degradada
+BUFFER_SIZE = PAYLOAD_SIZE + 16 + FEC_HEADER_SIZE  # Los paquetes de paridad FEC llevan una sub-cabecera
+MULTICAST_GROUP = None  # Mismo grupo que el servidor para recibir por multicast
+MULTICAST_PORT = 5006
+MULTICAST_INTERFACE = '0.0.0.0'
+METRICS_PATH = None  # p. ej. 'client_metrics.prom': snapshot periódico en formato de Prometheus
+METRICS_HTTP_PORT = None  # p. ej. 9101: sirve las métricas en http://127.0.0.1:<puerto>/metrics
+TRACE_PATH = None  # p. ej. 'client_trace.npz': instantes por etapa de cada frame (ver tools/trace_report.py)
+CLOCK_SYNC = True  # Estima el reloj del servidor por ping/pong: latencias y plazos correctos entre equipos
+BUFFER_LOG_DEBUG = False  # Mensajes de texto del buffer de reproducción (y todos los sondeos)
+BUFFER_LOG_BINARY = False  # Registros binarios en buffer.blog (ver tools/decode_buffer_log.py)
 
 # Cliente UDP
-client = UDPClient(port=5005, buffer_size=BUFFER_SIZE)
+client = UDPClient(port=SERVER_PORT, buffer_size=BUFFER_SIZE, multicast_group=MULTICAST_GROUP,
+                   multicast_port=MULTICAST_PORT, multicast_interface=MULTICAST_INTERFACE)
 client.set_socket()
 client.send_packet("READY")
+client.start_heartbeat()
 client.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 1024 * 1024)
 
 # Logging y ensamblador
 log = FrameLogMetrics()
-buffer_logger = BufferLogger(log_file="buffer.log")
+buffer_logger = BufferLogger(log_file="buffer.blog" if BUFFER_LOG_BINARY else "buffer.log",
+                             debug=BUFFER_LOG_DEBUG, binary=BUFFER_LOG_BINARY)
+clock = ClockSync((client.host_ip, SERVER_PORT)) if CLOCK_SYNC else None
+if clock:
+    clock.start()
+tracer = FrameTracer(clock=clock) if TRACE_PATH else None
 
-reassembler = FrameReassembler(payload_size=PAYLOAD_SIZE, width=WIDTH, height=HEIGHT, logger=log)
-decoder = LiveVideoViewer(width=WIDTH, height=HEIGHT)
-playbackbuffer = VideoPlaybackBuffer(fps=FPS, logger=buffer_logger)
+reassembler = FrameReassembler(payload_size=PAYLOAD_SIZE, width=WIDTH, height=HEIGHT, logger=log, tracer=tracer,
+                               clock=clock)
+decoder = LiveVideoViewer(width=WIDTH, height=HEIGHT, request_keyframe=client.request_keyframe)
+playbackbuffer = VideoPlaybackBuffer(fps=FPS, logger=buffer_logger, tracer=tracer)
+
+exporter = None
+if METRICS_PATH or METRICS_HTTP_PORT:
+    playbackbuffer.register_metrics(REGISTRY)
+    if clock:
+        clock.register_metrics(REGISTRY)
+    exporter = MetricsExporter(path=METRICS_PATH, http_port=METRICS_HTTP_PORT)
+    exporter.start()
 
 try:
     while True:
@@ -46,11 +76,24 @@ try:
             reassembler.add_chunk(chunk)
 
         frame = reassembler.get_next_frame()
-        frame_data, _ = playbackbuffer.push_and_get(frame)
+        frame_data, metadata = playbackbuffer.push_and_get(frame)
 
         if frame_data:
-            decoder.decode_and_display(frame_data)
+            image = decoder.prepare_frame(frame_data, metadata)
+            if tracer:
+                tracer.mark(metadata['frame_id'], metadata['timestamp'], 'decoded')
+            decoder.show(image)
+            if tracer:
+                tracer.mark(metadata['frame_id'], metadata['timestamp'], 'displayed')
 
 finally:
+    client.send_bye()
     decoder.release()
+    log.stop()
     buffer_logger.stop()
+    if clock:
+        clock.stop()
+    if exporter:
+        exporter.stop()
+    if tracer:
+        tracer.save(TRACE_PATH)
@@ -1,37 +1,67 @@
 import socket
 import queue
+import time
 from udp_connection.udp_client import UDPClient
+from encoder.fec import FEC_HEADER_SIZE
 from decoder.freamereassembler import FrameReassembler
 from decoder.livevideoviewer import LiveVideoViewer
+from decoder.catchup import CatchUpController
 from decoder.videoplaybackbuffer import VideoPlaybackBuffer
 from logger.framelogmetrics import FrameLogMetrics
 from logger.bufferlogger import BufferLogger
+from logger.frametracer import FrameTracer
+from logger.metrics import REGISTRY, MetricsExporter
+from udp_connection.clocksync import ClockSync
 
 from workers.decoder.network_receiver_worker import UDPReceiverWorker
+from workers.decoder.decode_pool_worker import DecodePoolWorker
 
 # Config
 WIDTH, HEIGHT = 800, 600
 FPS = 75
 PAYLOAD_SIZE = 1400
-BUFFER_SIZE = PAYLOAD_SIZE + 16
+SERVER_PORT = 5005  # Puerto del servidor; el de tools/impairment_proxy.py para probar con una red degradada
+BUFFER_SIZE = PAYLOAD_SIZE + 16 + FEC_HEADER_SIZE  # Los paquetes de paridad FEC llevan una sub-cabecera
+MULTICAST_GROUP = None  # Mismo grupo que el servidor para recibir por multicast
+MULTICAST_PORT = 5006
+MULTICAST_INTERFACE = '0.0.0.0'
+BATCH_RECEIVE = True  # recvmmsg sobre un anillo preasignado, un item de cola por lote
+NACK_ENABLED = False  # Pide al servidor los chunks perdidos mientras el frame siga a tiempo
+METRICS_PATH = None  # p. ej. 'client_metrics.prom': snapshot periódico en formato de Prometheus
+METRICS_HTTP_PORT = None  # p. ej. 9101: sirve las métricas en http://127.0.0.1:<puerto>/metrics
+TRACE_PATH = None  # p. ej. 'client_trace.npz': instantes por etapa de cada frame (ver tools/trace_report.py)
+CLOCK_SYNC = True  # Estima el reloj del servidor por ping/pong: latencias y plazos correctos entre equipos
+CATCHUP_MAX_LAG_MS = 50  # Si los frames listos tardarían más en decodificarse, se saltea al más nuevo (None = mostrar todos)
+DECODE_WORKERS = 2  # Decodificadores JPEG en paralelo, entregando en orden (None = decodificar en el bucle de visualización)
+DECODE_MODE = 'thread'  # 'thread' (cv2 libera el GIL) o 'process' (memoria compartida)
+BUFFER_LOG_DEBUG = False  # Mensajes de texto del buffer de reproducción (y todos los sondeos)
+BUFFER_LOG_BINARY = False  # Registros binarios en buffer.blog (ver tools/decode_buffer_log.py)
 
 # Crear el cliente y worker
-client = UDPClient(port=5005, buffer_size=BUFFER_SIZE)
+client = UDPClient(port=SERVER_PORT, buffer_size=BUFFER_SIZE, multicast_group=MULTICAST_GROUP,
+                   multicast_port=MULTICAST_PORT, multicast_interface=MULTICAST_INTERFACE)
 client.set_socket()
 client.send_packet("READY")
+client.start_heartbeat()
 client.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 16 * 1024 * 1024)
 
-receiver_worker = UDPReceiverWorker(udp_client=client, max_queue_size=2400)
+receiver_worker = UDPReceiverWorker(udp_client=client, batch_mode=BATCH_RECEIVE)
 receiver_worker.start()
 
 
 # Logging y ensamblador
 log = FrameLogMetrics()
-buffer_logger = BufferLogger(log_file="buffer.log")
+buffer_logger = BufferLogger(log_file="buffer.blog" if BUFFER_LOG_BINARY else "buffer.log",
+                             debug=BUFFER_LOG_DEBUG, binary=BUFFER_LOG_BINARY)
+clock = ClockSync((client.host_ip, SERVER_PORT)) if CLOCK_SYNC else None
+if clock:
+    clock.start()
+tracer = FrameTracer(clock=clock) if TRACE_PATH else None
 
-reassembler = FrameReassembler(payload_size=PAYLOAD_SIZE, width=WIDTH, height=HEIGHT, logger=log)
-decoder = LiveVideoViewer(width=WIDTH, height=HEIGHT)
-playbackbuffer = VideoPlaybackBuffer(fps=FPS, logger=buffer_logger)
+reassembler = FrameReassembler(payload_size=PAYLOAD_SIZE, width=WIDTH, height=HEIGHT, logger=log,
+                               nack=NACK_ENABLED, tracer=tracer, clock=clock)
+decoder = LiveVideoViewer(width=WIDTH, height=HEIGHT, request_keyframe=client.request_keyframe)
+playbackbuffer = VideoPlaybackBuffer(fps=FPS, logger=buffer_logger, tracer=tracer)
 
 
 from workers.decoder.framereassembler_worker import FrameReassemblerWorker
@@ -44,7 +74,8 @@ frame_queue = queue.Queue(maxsize=60)
 reassembler_worker = FrameReassemblerWorker(
     reassembler=reassembler,
     input_queue=chunk_queue,
-    output_queue=frame_queue
+    output_queue=frame_queue,
+    nack_sender=client.send_nack if NACK_ENABLED else None
 )
 reassembler_worker.start()
 
@@ -61,22 +92,77 @@ playback_worker = VideoPlaybackBufferWorker(
 )
 playback_worker.start()
 
+catchup = None
+if CATCHUP_MAX_LAG_MS is not None:
+    catchup = CatchUpController(max_lag_ms=CATCHUP_MAX_LAG_MS, request_keyframe=client.request_keyframe)
+
+decode_pool = None
+if DECODE_WORKERS:
+    # El pool consume la cola de reproducción (con la puesta al día) y entrega imágenes listas
+    decode_pool = DecodePoolWorker(viewer=decoder, input_queue=playback_queue, workers=DECODE_WORKERS,
+                                   mode=DECODE_MODE, catchup=catchup)
+    decode_pool.start()
+
+exporter = None
+if METRICS_PATH or METRICS_HTTP_PORT:
+    for worker in (receiver_worker, reassembler_worker, playback_worker, decode_pool):
+        if worker:
+            worker.register_metrics(REGISTRY)
+    if clock:
+        clock.register_metrics(REGISTRY)
+    exporter = MetricsExporter(path=METRICS_PATH, http_port=METRICS_HTTP_PORT)
+    exporter.start()
+
 
 try:
     while True:
         if receiver_worker.should_stop():
             break
 
-        result = playback_worker.get_next_decoded_frame(timeout=1.0)
-        if result is None:
-            continue
-
-        frame_data, metadata = result
-        decoder.decode_and_display(frame_data)
+        if decode_pool:
+            result = decode_pool.get(timeout=1.0)
+            if result is None:
+                continue
+            image, metadata = result
+        else:
+            if catchup:
+                frames = catchup.next_frames(playback_queue, timeout=1.0)
+                if not frames:
+                    continue
+                for frame_data, frame_metadata in frames[:-1]:
+                    decoder.decode_frame(frame_data, metadata=frame_metadata)  # Deltas intermedios: solo actualizan el canvas
+                frame_data, metadata = frames[-1]
+            else:
+                result = playback_worker.get_next_decoded_frame(timeout=1.0)
+                if result is None:
+                    continue
+                frame_data, metadata = result
+            started = time.perf_counter()
+            image = decoder.prepare_frame(frame_data, metadata)
+
+        if tracer:
+            tracer.mark(metadata['frame_id'], metadata['timestamp'], 'decoded')
+        decoder.show(image)
+        if tracer:
+            tracer.mark(metadata['frame_id'], metadata['timestamp'], 'displayed')
+        if catchup and not decode_pool:
+            catchup.record_decode(time.perf_counter() - started)
 
 finally:
+    client.send_bye()
     receiver_worker.stop()
     reassembler_worker.stop()
     playback_worker.stop()
+    if decode_pool:
+        decode_pool.stop()
     decoder.release()
+    log.stop()
+    if catchup:
+        print(f"[CATCHUP] {catchup.get_stats()}")
     buffer_logger.stop()
+    if clock:
+        clock.stop()
+    if exporter:
+        exporter.stop()
+    if tracer:
+        tracer.save(TRACE_PATH)
@@ -0,0 +1,119 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from decoder.freamereassembler import FrameReassembler
+from decoder.livevideoviewer import LiveVideoViewer
+from decoder.videoplaybackbuffer import VideoPlaybackBuffer
+from logger.framelogmetrics import FrameLogMetrics
+from logger.bufferlogger import BufferLogger
+from logger.frametracer import FrameTracer
+from logger.metrics import REGISTRY, MetricsExporter
+from udp_connection.async_transport import AsyncUDPClient
+from udp_connection.clocksync import ClockSync
+
+# Variante asyncio de client3.py: recepción, reensamblado y agenda de reproducción en
+# un solo event loop; solo la decodificación JPEG (y el escalado) va a un executor.
+
+# Config
+WIDTH, HEIGHT = 800, 600
+FPS = 75
+PAYLOAD_SIZE = 1400
+SERVER_HOST = '127.0.0.1'
+SERVER_PORT = 5005  # Puerto del servidor; el de tools/impairment_proxy.py para probar con una red degradada
+NACK_ENABLED = False  # Pide al servidor los chunks perdidos mientras el frame siga a tiempo
+METRICS_PATH = None  # p. ej. 'client_metrics.prom': snapshot periódico en formato de Prometheus
+METRICS_HTTP_PORT = None  # p. ej. 9101: sirve las métricas en http://127.0.0.1:<puerto>/metrics
+TRACE_PATH = None  # p. ej. 'client_trace.npz': instantes por etapa de cada frame (ver tools/trace_report.py)
+CLOCK_SYNC = True  # Estima el reloj del servidor por ping/pong: latencias y plazos correctos entre equipos
+BUFFER_LOG_DEBUG = False  # Mensajes de texto del buffer de reproducción (y todos los sondeos)
+BUFFER_LOG_BINARY = False  # Registros binarios en buffer.blog (ver tools/decode_buffer_log.py)
+
+
+async def playout(playbackbuffer: VideoPlaybackBuffer, frame_added: asyncio.Event,
+                  decoder: LiveVideoViewer, executor, client: AsyncUDPClient, tracer: FrameTracer = None):
+    """Muestra cada frame en su instante de reproducción; duerme hasta entonces o hasta que llegue uno."""
+    loop = asyncio.get_running_loop()
+    while not client.closed.is_set():
+        wait = playbackbuffer.time_until_playback()
+        if wait is None:
+            frame_added.clear()
+            await frame_added.wait()
+            continue
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+        frame_data, metadata = playbackbuffer.get_frame_for_display()
+        if frame_data is None:
+            frame_added.clear()
+            await frame_added.wait()
+            continue
+
+        # El executor es de un solo hilo: los deltas por tiles se aplican en orden
+        image = await loop.run_in_executor(executor, decoder.prepare_frame, frame_data, metadata)
+        if tracer:
+            tracer.mark(metadata['frame_id'], metadata['timestamp'], 'decoded')
+        if not decoder.show(image):
+            break  # ESC
+        if tracer:
+            tracer.mark(metadata['frame_id'], metadata['timestamp'], 'displayed')
+
+
+async def main():
+    log = FrameLogMetrics()
+    buffer_logger = BufferLogger(log_file="buffer.blog" if BUFFER_LOG_BINARY else "buffer.log",
+                                 debug=BUFFER_LOG_DEBUG, binary=BUFFER_LOG_BINARY)
+    clock = ClockSync((SERVER_HOST, SERVER_PORT)) if CLOCK_SYNC else None
+    if clock:
+        clock.start()
+    tracer = FrameTracer(clock=clock) if TRACE_PATH else None
+
+    reassembler = FrameReassembler(payload_size=PAYLOAD_SIZE, width=WIDTH, height=HEIGHT, logger=log,
+                                   nack=NACK_ENABLED, tracer=tracer, clock=clock)
+    loop = asyncio.get_running_loop()
+    # El viewer corre en el executor: el pedido de keyframe vuelve al event loop
+    decoder = LiveVideoViewer(width=WIDTH, height=HEIGHT,
+                              request_keyframe=lambda: loop.call_soon_threadsafe(client.request_keyframe))
+    playbackbuffer = VideoPlaybackBuffer(fps=FPS, logger=buffer_logger, tracer=tracer)
+    frame_added = asyncio.Event()
+
+    exporter = None
+    if METRICS_PATH or METRICS_HTTP_PORT:
+        playbackbuffer.register_metrics(REGISTRY)
+        if clock:
+            clock.register_metrics(REGISTRY)
+        exporter = MetricsExporter(path=METRICS_PATH, http_port=METRICS_HTTP_PORT)
+        exporter.start()
+
+    def on_frame(frame):
+        playbackbuffer.add_frame(frame)
+        frame_added.set()
+
+    client = AsyncUDPClient(reassembler, on_frame, host_ip=SERVER_HOST, port=SERVER_PORT, nack=NACK_ENABLED)
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="decoder")
+
+    await client.start()
+    player = asyncio.create_task(playout(playbackbuffer, frame_added, decoder, executor, client, tracer))
+    closed = asyncio.create_task(client.closed.wait())
+    try:
+        await asyncio.wait([player, closed], return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        player.cancel()
+        closed.cancel()
+        client.close()
+        executor.shutdown()
+        decoder.release()
+        log.stop()
+        buffer_logger.stop()
+        if clock:
+            clock.stop()
+        if exporter:
+            exporter.stop()
+        if tracer:
+            tracer.save(TRACE_PATH)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("[MAIN] Interrupción manual detectada.")
@@ -0,0 +1,104 @@
+import queue
+import time
+from typing import Callable, Optional
+
+from encoder.tiledelta import is_tile_delta
+from logger.metrics import REGISTRY, MetricsRegistry
+
+
+class CatchUpController:
+    """
+    Política de puesta al día del bucle de decodificación/visualización del cliente.
+    Si los frames ya listos en la cola tardarían más de max_lag_ms en decodificarse
+    (cantidad × tiempo medio de decodificar y mostrar), se saltea al más nuevo que se
+    pueda decodificar por sí solo (JPEG completo) y se descartan los anteriores sin
+    decodificarlos. Los deltas por tiles posteriores a ese frame se aplican todos (dependen
+    del canvas) pero solo se escala y muestra el último. Si el atraso es solo de deltas
+    se pide un keyframe al servidor (como mucho uno cada keyframe_interval_s).
+    """
+    def __init__(self, max_lag_ms: float = 50.0, min_backlog: int = 2,
+                 request_keyframe: Optional[Callable[[], None]] = None, keyframe_interval_s: float = 1.0,
+                 report_interval_s: float = 5.0, registry: MetricsRegistry = REGISTRY):
+        self.max_lag_s = max_lag_ms / 1000.0
+        self.min_backlog = min_backlog
+        self.request_keyframe = request_keyframe
+        self.keyframe_interval_s = keyframe_interval_s
+        self.last_keyframe_request = 0.0
+        self.report_interval_s = report_interval_s
+        self.last_report = 0.0
+        self.reported = (0, 0)
+
+        self.decode_time_s = 0.0  # Promedio móvil de decodificar + mostrar un frame
+        # Cuentas de este controlador; los contadores del registro son globales al proceso
+        self.triggers = 0
+        self.skipped = 0
+        self.keyframe_requests = 0
+        self.triggers_total = registry.counter('catchup_triggers_total', "Veces que el cliente se puso al día salteando frames")
+        self.skipped_total = registry.counter('catchup_skipped_frames_total', "Frames descartados sin decodificar por atraso")
+        self.keyframe_requests_total = registry.counter('catchup_keyframe_requests_total',
+                                                        "Keyframes pedidos por atraso con solo deltas en cola")
+
+    def record_decode(self, seconds: float):
+        self.decode_time_s = seconds if self.decode_time_s == 0.0 else 0.9 * self.decode_time_s + 0.1 * seconds
+
+    def is_behind(self, backlog: int) -> bool:
+        return backlog >= self.min_backlog and backlog * self.decode_time_s > self.max_lag_s
+
+    def next_frames(self, frames: queue.Queue, timeout: Optional[float] = None):
+        """
+        Próximos frames de la cola como lista de (frame_data, metadata): todos deben
+        decodificarse en orden y solo el último mostrarse. Lista vacía si no llegó nada.
+        """
+        try:
+            first = frames.get(timeout=timeout)
+        except queue.Empty:
+            return []
+        if not self.is_behind(frames.qsize() + 1):
+            return [first]
+
+        pending = [first]
+        while True:
+            try:
+                pending.append(frames.get_nowait())
+            except queue.Empty:
+                break
+
+        start = len(pending) - 1
+        while start >= 0 and is_tile_delta(pending[start][0]):
+            start -= 1
+        if start > 0:
+            self.triggers += 1
+            self.skipped += start
+            self.triggers_total.inc()
+            self.skipped_total.inc(start)
+            self._report()
+            return pending[start:]
+
+        # Ningún frame para descartar: hay que aplicar todos los deltas. Si no hay ni un
+        # frame completo en cola, un keyframe permitirá saltear en el próximo atraso
+        now = time.monotonic()
+        if start < 0 and self.request_keyframe and now - self.last_keyframe_request >= self.keyframe_interval_s:
+            self.last_keyframe_request = now
+            self.keyframe_requests += 1
+            self.keyframe_requests_total.inc()
+            self.request_keyframe()
+        return pending
+
+    def _report(self):
+        """Resumen en consola como mucho cada report_interval_s (puede activarse en cada frame)."""
+        now = time.monotonic()
+        if now - self.last_report < self.report_interval_s:
+            return
+        triggers, skipped = self.triggers, self.skipped
+        print(f"[CATCHUP] {triggers - self.reported[0]} puestas al día, {skipped - self.reported[1]} frames "
+              f"descartados sin decodificar (decodificar+mostrar: {self.decode_time_s * 1000:.1f} ms)")
+        self.last_report = now
+        self.reported = (triggers, skipped)
+
+    def get_stats(self) -> dict:
+        return {
+            'triggers': self.triggers,
+            'skipped_frames': self.skipped,
+            'keyframe_requests': self.keyframe_requests,
+            'decode_ms': self.decode_time_s * 1000.0,
+        }
@@ -1,106 +1,366 @@
 import time
+import heapq
 import numpy as np
-import struct
+from encoder.chunker import HEADER, HEADER_SIZE, FLAG_KEYFRAME, FLAG_PARITY, FLAG_RETRANSMIT, frame_id_diff
+from encoder.fec import FEC_HEADER, FEC_HEADER_SIZE, recover_chunks
+
+
+class FrameSlot:
+    """
+    Estado de un frame en vuelo: un único bytearray preasignado donde cada
+    payload se escribe en su offset, más un bitmap de chunks recibidos.
+    """
+    __slots__ = ('buffer', 'bitmap', 'received', 'total', 'latency_sum',
+                 'timestamp', 'quality_id', 'flags', 'last_len', 'deadline',
+                 'parities', 'fec_scheme', 'parity_count', 'fec_pending',
+                 'first_arrival', 'highest_index', 'nack_sent_at', 'nack_count', 'retransmitted')
+
+    def __init__(self, buffer: bytearray, total: int, timestamp: float, quality_id: int, flags: int,
+                 deadline: float, first_arrival: float):
+        self.buffer = buffer
+        self.bitmap = bytearray((total + 7) >> 3)
+        self.received = 0
+        self.total = total
+        self.latency_sum = 0.0
+        self.timestamp = timestamp
+        self.quality_id = quality_id
+        self.flags = flags
+        self.last_len = None  # Largo del último chunk, conocido solo cuando llega
+        self.deadline = deadline  # Momento en que se entrega como parcial o se descarta
+
+        # FEC: {índice de paridad: payload}, esquema y si hay datos nuevos para intentar recuperar
+        self.parities = None
+        self.fec_scheme = None
+        self.parity_count = 0
+        self.fec_pending = False
+
+        # NACK: llegada del primer paquete, mayor índice visto y pedidos enviados
+        self.first_arrival = first_arrival
+        self.highest_index = -1
+        self.nack_sent_at = None
+        self.nack_count = 0
+        self.retransmitted = 0
+
+    def has(self, index: int) -> bool:
+        return bool(self.bitmap[index >> 3] & (1 << (index & 7)))
+
+    def mark(self, index: int):
+        self.bitmap[index >> 3] |= 1 << (index & 7)
+        self.received += 1
+
+    def missing(self):
+        """Índices de los chunks que todavía no llegaron."""
+        return [i for i in range(self.total) if not self.has(i)]
+
+
+class FrameBufferPool:
+    """
+    Pool de bytearrays reciclados para los frames.
+    Los buffers nunca salen del ensamblador: los frames se entregan como bytes
+    (una copia por frame), así las colas aguas abajo pueden retener frames el
+    tiempo que haga falta sin que un buffer reciclado los sobrescriba.
+    """
+    def __init__(self, max_free: int = 32):
+        self.max_free = max_free
+        self.free = []
+
+    def acquire(self, size: int) -> bytearray:
+        for i, buf in enumerate(self.free):
+            if len(buf) >= size:
+                return self.free.pop(i)
+        return bytearray(size)
+
+    def release(self, buf: bytearray):
+        if len(self.free) < self.max_free:
+            self.free.append(buf)
+
 
 class FrameReassembler:
     def __init__(self, payload_size=1400, max_age_s=0.05, chunk_threshold=0.5,
-                 width=800, height=600, logger=None): 
-        self.frames = {}  # frame_id: { 'chunks': {i: data}, 'timestamp': float, ... }
+                 width=800, height=600, logger=None, stale_window=64,
+                 nack=False, nack_delay_s=0.003, nack_interval_s=0.01, nack_retries=2,
+                 nack_min_remaining_s=0.005, tracer=None, clock=None):
+        self.frames = {}  # frame_id: FrameSlot
         self.payload_size = payload_size
         self.max_age_s = max_age_s
         self.chunk_threshold = chunk_threshold
         self.expected_frame_id = 0
+        self.newest_frame_id = None  # Se inicializa con el primer chunk recibido
+        self.stale_window = stale_window
+        self.gap_since = None  # Momento en que se detectó que falta expected_frame_id
         self.logger = logger
+        self.tracer = tracer  # FrameTracer opcional: primera/última recepción y reensamblado
+        self.deadlines = []  # min-heap de (deadline, frame_id)
+        # Plazos y latencias se miden en el reloj del servidor (el de las cabeceras): con un
+        # ClockSync se estima desde el monotónico local; sin él se asume la misma hora de pared
+        self._now = clock.server_now if clock else time.time
 
-        self.last_complete_chunks = {}
-        self.last_total_chunks = 0
+        # Modo NACK: pedir chunks faltantes mientras el frame siga dentro de su plazo
+        self.nack = nack
+        self.nack_delay_s = nack_delay_s            # Espera ante reordenamiento antes del primer NACK
+        self.nack_interval_s = nack_interval_s      # Separación mínima entre NACKs del mismo frame
+        self.nack_retries = nack_retries
+        self.nack_min_remaining_s = nack_min_remaining_s  # No pedir si el plazo vence antes de un RTT
+        self.width = width
+        self.height = height
+
+        self.pool = FrameBufferPool()
+        self.zeros = bytes(payload_size)
 
-    def _now(self):
-        return time.time()
+        # Último frame completo (para ocultar chunks perdidos en frames parciales)
+        self.last_complete_buffer = None
+        self.last_complete_len = 0
+        self.last_total_chunks = 0
 
     def add_chunk(self, packet: bytes):
-        if len(packet) < 16:
+        if len(packet) < HEADER_SIZE:
             return  # Paquete inválido
 
-        frame_id = int.from_bytes(packet[0:2], 'big')
-        chunk_index = int.from_bytes(packet[2:4], 'big')
-        total_chunks = int.from_bytes(packet[4:6], 'big')
-        quality_id = packet[6]
-        flags = packet[7]
-        timestamp = struct.unpack('>d', packet[8:16])[0]
-        payload = packet[16:]
+        frame_id, chunk_index, total_chunks, quality_id, flags, timestamp = HEADER.unpack_from(packet)
+        payload_len = len(packet) - HEADER_SIZE
+        if flags & FLAG_PARITY:
+            self._add_parity(packet, frame_id, chunk_index, total_chunks, quality_id, flags, timestamp)
+            return
+        if chunk_index >= total_chunks or payload_len > self.payload_size:
+            return  # Cabecera inconsistente
 
-        latency = self._now() - timestamp
+        now = self._now()
+        latency = now - timestamp
 
         if self.logger:
             self.logger.log_chunk_received()
 
-        if frame_id not in self.frames:
-            self.frames[frame_id] = {
-                'chunks': {},
-                'latencies': [],
-                'timestamp': timestamp,
-                'total': total_chunks,
-                'quality_id': quality_id,
-                'flags': flags,
-            }
+        if not self._track_frame_id(frame_id):
+            if flags & FLAG_RETRANSMIT and self.logger:
+                self.logger.log_late_retransmit()
+            return  # Chunk de un frame ya entregado, saltado o desalojado
+
+        slot = self._get_slot(frame_id, total_chunks, timestamp, quality_id, flags)
+        if slot is None or slot.has(chunk_index):
+            return  # Duplicado o chunk de otro frame con el mismo id
+
+        # Copia directa del payload a su offset dentro del buffer del frame
+        offset = chunk_index * self.payload_size
+        slot.buffer[offset:offset + payload_len] = memoryview(packet)[HEADER_SIZE:]
+        if chunk_index == total_chunks - 1:
+            slot.last_len = payload_len
+            # El relleno del último chunk debe ser cero para que la paridad cuadre
+            slot.buffer[offset + payload_len:offset + self.payload_size] = self.zeros[:self.payload_size - payload_len]
+        slot.mark(chunk_index)
+        slot.latency_sum += latency
+        if self.tracer:
+            self.tracer.mark_first(frame_id, timestamp, 'first_receive', now)
+            self.tracer.mark(frame_id, timestamp, 'last_receive', now)
+        if slot.parities:
+            slot.fec_pending = True
+        if chunk_index > slot.highest_index:
+            slot.highest_index = chunk_index
+        if flags & FLAG_RETRANSMIT:
+            slot.retransmitted += 1
+
+    def _get_slot(self, frame_id, total_chunks, timestamp, quality_id, flags):
+        """Devuelve el slot del frame, creándolo si es el primer paquete (None si no coincide)."""
+        slot = self.frames.get(frame_id)
+        if slot is None:
+            buffer = self.pool.acquire(total_chunks * self.payload_size)
+            deadline = timestamp + self.max_age_s
+            slot = FrameSlot(buffer, total_chunks, timestamp, quality_id,
+                             flags & ~(FLAG_PARITY | FLAG_RETRANSMIT), deadline, self._now())
+            self.frames[frame_id] = slot
+            heapq.heappush(self.deadlines, (deadline, frame_id))
+        elif slot.total != total_chunks:
+            return None
+        return slot
+
+    def _add_parity(self, packet, frame_id, parity_index, total_chunks, quality_id, flags, timestamp):
+        """Guarda un paquete de paridad FEC en el slot de su frame."""
+        if len(packet) != HEADER_SIZE + FEC_HEADER_SIZE + self.payload_size:
+            return  # Paridad con otro payload_size
+        if not self._track_frame_id(frame_id):
+            return
+
+        slot = self._get_slot(frame_id, total_chunks, timestamp, quality_id, flags)
+        if slot is None:
+            return
+        if slot.parities is None:
+            slot.parities = {}
+        if parity_index in slot.parities:
+            return
+
+        scheme, parity_count, last_len = FEC_HEADER.unpack_from(packet, HEADER_SIZE)
+        slot.fec_scheme = scheme
+        slot.parity_count = parity_count
+        if slot.last_len is None:
+            slot.last_len = last_len
+        # Copia: el paquete puede ser una vista sobre el anillo de recepción
+        slot.parities[parity_index] = bytes(memoryview(packet)[HEADER_SIZE + FEC_HEADER_SIZE:])
+        slot.fec_pending = True
+
+    def _try_fec(self, slot):
+        """Reconstruye chunks perdidos con la paridad recibida, antes de recurrir al ocultamiento."""
+        slot.fec_pending = False
+        total = slot.total
+        if slot.parities is None or slot.received == total:
+            return
+
+        # El relleno del último chunk ya está en cero (se escribe al recibirlo)
+        data = np.frombuffer(slot.buffer, dtype=np.uint8, count=total * self.payload_size)
+        data = data.reshape(total, self.payload_size)
+        recovered = recover_chunks(slot.fec_scheme, slot.parity_count, data, slot.has, slot.parities)
+        for index in recovered:
+            slot.mark(index)
+        if recovered and self.logger:
+            self.logger.log_fec_recovered(len(recovered))
+
+    def _track_frame_id(self, frame_id) -> bool:
+        """
+        Actualiza el frame más nuevo visto y desaloja el estado que quedó fuera
+        de la ventana. Devuelve False si el chunk llega tarde y debe ignorarse.
+        """
+        if self.newest_frame_id is None:
+            self.newest_frame_id = frame_id
+            self.expected_frame_id = frame_id
+            return True
 
-        self.frames[frame_id]['chunks'][chunk_index] = payload
-        self.frames[frame_id]['latencies'].append(latency)
+        behind = frame_id_diff(frame_id, self.expected_frame_id)
+        if behind < 0:
+            if behind < -self.stale_window:
+                # Salto hacia atrás muy grande: el emisor reinició la numeración
+                self._resync(frame_id)
+                return True
+            return False
+
+        if frame_id_diff(frame_id, self.newest_frame_id) > 0:
+            self.newest_frame_id = frame_id
+            if frame_id_diff(frame_id, self.expected_frame_id) >= self.stale_window:
+                self._evict_before((frame_id - self.stale_window + 1) % 65536)
+        return True
+
+    def _resync(self, frame_id):
+        for slot in self.frames.values():
+            self.pool.release(slot.buffer)
+        self.frames.clear()
+        self.newest_frame_id = frame_id
+        self.expected_frame_id = frame_id
+        self.gap_since = None
+
+    def _evict_before(self, new_expected):
+        """Descarta los frames anteriores a new_expected y avanza expected_frame_id."""
+        evicted = 0
+        for frame_id in list(self.frames):
+            if frame_id_diff(frame_id, new_expected) < 0:
+                slot = self.frames.pop(frame_id)
+                if self.logger:
+                    self.logger.log_frame_expired(slot.received)
+                self.pool.release(slot.buffer)
+                evicted += 1
+        # Ids salteados sin haber recibido ningún chunk
+        skipped = frame_id_diff(new_expected, self.expected_frame_id) - evicted
+        if self.logger and skipped > 0:
+            self.logger.log_frames_skipped(skipped)
+        self.expected_frame_id = new_expected
+        self.gap_since = None
+
+    def _skip_missing(self) -> bool:
+        """
+        expected_frame_id no tiene ningún chunk. Salta al siguiente frame presente
+        si alguno posterior ya está completo o si venció el plazo de espera.
+        """
+        if not self.frames:
+            self.gap_since = None
+            return False
+
+        later_complete = any(slot.received == slot.total for slot in self.frames.values())
+        if not later_complete:
+            now = self._now()
+            if self.gap_since is None:
+                self.gap_since = now
+            if now - self.gap_since < self.max_age_s:
+                return False
+
+        next_id = min(self.frames, key=lambda fid: frame_id_diff(fid, self.expected_frame_id))
+        self._evict_before(next_id)
+        return True
+
+    def _frame_dict(self, frame_id, slot, frame_data, partial=False):
+        if self.tracer:
+            self.tracer.mark(frame_id, slot.timestamp, 'reassembled')
+        return {
+            'frame_id': frame_id,
+            'timestamp': slot.timestamp,
+            'frame_data': frame_data,
+            'is_keyframe': bool(slot.flags & FLAG_KEYFRAME),
+            'quality_id': slot.quality_id,
+            'partial': partial  # Chunks perdidos rellenados con otro frame: no sirve como base de deltas
+        }
+
+    def _conceal_missing(self, slot):
+        """Rellena los chunks faltantes con el último frame válido o con ceros."""
+        buf = memoryview(slot.buffer)
+        last = memoryview(self.last_complete_buffer) if self.last_complete_buffer is not None else None
+        for i in slot.missing():
+            start = i * self.payload_size
+            end = start + self.payload_size
+            if last is not None and i < self.last_total_chunks:
+                source_end = min(end, self.last_complete_len)
+                copied = source_end - start
+                buf[start:source_end] = last[start:source_end]
+                if copied < self.payload_size:
+                    buf[source_end:end] = self.zeros[:self.payload_size - copied]
+            else:
+                buf[start:end] = self.zeros
 
     def get_next_frame(self):
-        while self.expected_frame_id in self.frames:
-            info = self.frames[self.expected_frame_id]
-            age = self._now() - info['timestamp']
-            received = len(info['chunks'])
-            total = info['total']
-            latencias = info['latencies']
+        while True:
+            slot = self.frames.get(self.expected_frame_id)
+            if slot is None:
+                # Evita el bloqueo de cabeza de línea cuando se pierde un frame entero
+                if self._skip_missing():
+                    continue
+                break
+            self.gap_since = None
+
+            if slot.fec_pending:
+                self._try_fec(slot)
+            age = self._now() - slot.timestamp
+            received = slot.received
+            total = slot.total
 
             # 1. Frame completo
             if received == total:
-                chunks = info['chunks']
-                frame_data = b''.join(chunks[i] for i in range(total))
-                
-                # Guardar como último frame válido
-                self.last_complete_chunks = chunks.copy()
+                frame_len = (total - 1) * self.payload_size + slot.last_len
+                frame_data = bytes(memoryview(slot.buffer)[:frame_len])
+
+                # Guardar como último frame válido; el anterior vuelve al pool
+                if self.last_complete_buffer is not None:
+                    self.pool.release(self.last_complete_buffer)
+                self.last_complete_buffer = slot.buffer
+                self.last_complete_len = frame_len
                 self.last_total_chunks = total
 
-                frame_dict = {
-                    'frame_id': self.expected_frame_id,
-                    'timestamp': info['timestamp'],
-                    'frame_data': frame_data,
-                    'is_keyframe': bool(info['flags'] & 0b00000001),
-                    'quality_id': info['quality_id']
-                }
+                frame_dict = self._frame_dict(self.expected_frame_id, slot, frame_data)
 
                 if self.logger:
-                    avg_latency = sum(latencias) / len(latencias) if latencias else 0.0
+                    avg_latency = slot.latency_sum / received if received else 0.0
                     self.logger.log_frame_complete(received, avg_latency)
+                    if slot.retransmitted:
+                        self.logger.log_nack_recovered_frame()
 
                 del self.frames[self.expected_frame_id]
                 self.expected_frame_id = (self.expected_frame_id + 1) % 65536
                 return frame_dict
 
             # 2. Frame parcial aceptable
-            elif age > self.max_age_s and (received / total) >= self.chunk_threshold:
-                reconstructed_chunks = []
-                for i in range(total):
-                    if i in info['chunks']:
-                        reconstructed_chunks.append(info['chunks'][i])
-                    elif i in self.last_complete_chunks:
-                        reconstructed_chunks.append(self.last_complete_chunks[i])
-                    else:
-                        reconstructed_chunks.append(b'\x00' * self.payload_size)
-
-                frame_data = b''.join(reconstructed_chunks)
-
-                frame_dict = {
-                    'frame_id': self.expected_frame_id,
-                    'timestamp': info['timestamp'],
-                    'frame_data': frame_data,
-                    'is_keyframe': bool(info['flags'] & 0b00000001),
-                    'quality_id': info['quality_id']
-                }
+            elif age >= self.max_age_s and (received / total) >= self.chunk_threshold:
+                self._conceal_missing(slot)
+                if slot.last_len is not None:
+                    frame_len = (total - 1) * self.payload_size + slot.last_len
+                else:
+                    frame_len = total * self.payload_size
+
+                frame_dict = self._frame_dict(self.expected_frame_id, slot, bytes(memoryview(slot.buffer)[:frame_len]),
+                                              partial=True)
+                self.pool.release(slot.buffer)
 
                 if self.logger:
                     self.logger.log_frame_partial(received)
@@ -110,10 +370,11 @@ class FrameReassembler:
                 return frame_dict
 
             # 3. Frame descartado por incompleto
-            elif age > self.max_age_s:
+            elif age >= self.max_age_s:
                 if self.logger:
                     self.logger.log_frame_expired(received)
 
+                self.pool.release(slot.buffer)
                 del self.frames[self.expected_frame_id]
                 self.expected_frame_id = (self.expected_frame_id + 1) % 65536
                 continue
@@ -122,11 +383,73 @@ class FrameReassembler:
 
         return None
 
+    def next_deadline(self):
+        """
+        Próximo instante en que get_next_frame() puede entregar o descartar algo
+        sin que lleguen más paquetes (None si no hay nada pendiente).
+        Debe llamarse después de get_next_frame(): los plazos ya vencidos que
+        quedan en el heap están bloqueados por un hueco y se descartan.
+        """
+        now = self._now()
+        heap = self.deadlines
+        while heap:
+            deadline, frame_id = heap[0]
+            slot = self.frames.get(frame_id)
+            if deadline > now and slot is not None and slot.deadline == deadline:
+                break
+            heapq.heappop(heap)
+
+        deadline = heap[0][0] if heap else None
+        if self.gap_since is not None:
+            gap_deadline = self.gap_since + self.max_age_s
+            deadline = gap_deadline if deadline is None else min(deadline, gap_deadline)
+        return deadline
+
+    def collect_nacks(self):
+        """
+        Devuelve [(frame_id, [índices faltantes])] para los frames con huecos
+        que todavía pueden recuperarse antes de su plazo. Vacío si el modo NACK
+        está desactivado.
+        """
+        if not self.nack:
+            return []
+
+        now = self._now()
+        requests = []
+        for frame_id, slot in self.frames.items():
+            if slot.received == slot.total or slot.nack_count >= self.nack_retries:
+                continue
+            if now - slot.first_arrival < self.nack_delay_s:
+                continue  # Puede ser solo reordenamiento
+            if slot.deadline - now < self.nack_min_remaining_s:
+                continue  # La retransmisión llegaría tarde
+            if slot.nack_sent_at is not None and now - slot.nack_sent_at < self.nack_interval_s:
+                continue
+
+            missing = slot.missing()
+            if frame_id == self.newest_frame_id:
+                # En el frame más nuevo, lo posterior al último índice puede estar en camino
+                missing = [i for i in missing if i < slot.highest_index]
+            if not missing:
+                continue
+
+            slot.nack_sent_at = now
+            slot.nack_count += 1
+            requests.append((frame_id, missing))
+            if self.logger:
+                self.logger.log_nack_sent(len(missing))
+        return requests
+
+    def time_to_next_deadline(self):
+        """Segundos hasta next_deadline() (0 si ya venció, None si no hay plazos)."""
+        deadline = self.next_deadline()
+        if deadline is None:
+            return None
+        return max(0.0, deadline - self._now())
+
     def update_config(self, width, height):
         if (width, height) != (self.width, self.height):
             print(f"[REASSEMBLER] Resolución cambiada a {width}x{height}")
             self.width = width
             self.height = height
             # Reconfigura buffers internos si es necesario
-
-
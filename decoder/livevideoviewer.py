@@ -1,25 +1,107 @@
 import cv2
 import numpy as np
+from encoder.tiledelta import DeltaChain, is_tile_delta, apply_tile_delta
+
+# Decodificación JPEG a escala reducida (el IDCT escalado de libjpeg es mucho más barato
+# que decodificar completo y achicar después)
+REDUCED_DECODE_FLAGS = {8: cv2.IMREAD_REDUCED_COLOR_8, 4: cv2.IMREAD_REDUCED_COLOR_4,
+                        2: cv2.IMREAD_REDUCED_COLOR_2, 1: cv2.IMREAD_COLOR}
+
+
+def reduced_decode_factor(stream_size, width: int, height: int) -> int:
+    """Mayor factor de IMREAD_REDUCED_* que deja la imagen igual o más grande que la ventana."""
+    if stream_size is None:
+        return 1
+    stream_width, stream_height = stream_size
+    for factor in (8, 4, 2):
+        if stream_width // factor >= width and stream_height // factor >= height:
+            return factor
+    return 1
+
+
+def decode_jpeg(frame_data, factor: int = 1):
+    return cv2.imdecode(np.frombuffer(frame_data, dtype=np.uint8), REDUCED_DECODE_FLAGS[factor])
+
+
+def fit_to_window(image, width: int, height: int, out=None):
+    """
+    Lleva la imagen al tamaño de la ventana. Sin cv2.resize si ya coincide; con out
+    (buffer reutilizable de alto x ancho x 3) el resultado se escribe ahí.
+    """
+    if image.shape[1] == width and image.shape[0] == height:
+        if out is None:
+            return image
+        np.copyto(out, image)
+        return out
+    if out is None:
+        return cv2.resize(image, (width, height))
+    return cv2.resize(image, (width, height), dst=out)
+
 
 class LiveVideoViewer:
-    def __init__(self, window_name="Pantalla Remota", width=800, height=600):
+    def __init__(self, window_name="Pantalla Remota", width=800, height=600,
+                 request_keyframe=None, keyframe_interval_s=1.0):
         self.window_name = window_name
         self.width = width
         self.height = height
         self.fullscreen = False  # Estado inicial
+        self.canvas = None  # Último frame completo, sobre el que se pegan los tiles delta
+        self.stream_size = None  # (ancho, alto) del stream, para elegir la escala de decodificación
+        self.tile_deltas = False  # Con deltas el canvas debe ser de tamaño completo: sin escala reducida
+        self.delta_chain = DeltaChain(request_keyframe, keyframe_interval_s)
 
         cv2.namedWindow(self.window_name, cv2.WINDOW_NORMAL)
         cv2.resizeWindow(self.window_name, width, height)
 
-    def decode_and_display(self, frame_data: bytes):
-        img_array = np.frombuffer(frame_data, dtype=np.uint8)
-        frame = cv2.imdecode(img_array, cv2.IMREAD_COLOR)
+    def decode_frame(self, frame_data: bytes, factor: int = 1, metadata=None):
+        """
+        Decodifica un JPEG completo (a 1/factor del tamaño si factor > 1) o pega un
+        frame delta sobre el canvas persistente. Con metadata (la del ensamblador) los
+        deltas parciales o posteriores a un frame perdido no se aplican.
+        """
+        if is_tile_delta(frame_data):
+            self.tile_deltas = True
+            if metadata is not None and not self.delta_chain.accept_delta(metadata):
+                return self.canvas  # Se congela la imagen hasta el próximo frame completo
+            try:
+                if apply_tile_delta(self.canvas, frame_data):
+                    return self.canvas
+            except (ValueError, cv2.error):
+                pass  # Delta dañado (p. ej. frame parcial): se mantiene el canvas
+            return self.canvas
+
+        frame = decode_jpeg(frame_data, factor)
+        if frame is not None:
+            self.set_canvas(frame, factor, metadata)
+        return frame
+
+    def set_canvas(self, frame, factor: int = 1, metadata=None):
+        """Registra un frame completo ya decodificado (también desde un pool de decodificación)."""
+        self.stream_size = (frame.shape[1] * factor, frame.shape[0] * factor)
+        self.canvas = frame
+        if metadata is not None:
+            self.full_frame_received(metadata)
+
+    def full_frame_received(self, metadata):
+        # Un JPEG parcial solo es un problema si después vienen deltas
+        self.delta_chain.full_frame(metadata, deltas=self.tile_deltas)
+
+    def decode_factor(self) -> int:
+        return 1 if self.tile_deltas else reduced_decode_factor(self.stream_size, self.width, self.height)
+
+    def prepare_frame(self, frame_data: bytes, metadata=None):
+        """Decodifica y escala al tamaño de la ventana (la parte costosa, apta para un executor)."""
+        frame = self.decode_frame(frame_data, self.decode_factor(), metadata)
 
         if frame is None:
-            frame = np.zeros((self.height, self.width, 3), dtype=np.uint8)
-        else:
-            frame = cv2.resize(frame, (self.width, self.height))
+            return np.zeros((self.height, self.width, 3), dtype=np.uint8)
+        return fit_to_window(frame, self.width, self.height)
+
+    def decode_and_display(self, frame_data: bytes, metadata=None):
+        return self.show(self.prepare_frame(frame_data, metadata))
 
+    def show(self, frame):
+        """Muestra un frame ya preparado; devuelve False si se presionó ESC."""
         cv2.imshow(self.window_name, frame)
         key = cv2.waitKey(1) & 0xFF
 
@@ -1,69 +1,213 @@
 # decoder/videoplaybackbuffer.py
 import time
+import bisect
 import collections
 import threading
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List
+
+from encoder.chunker import frame_id_diff
+
+
+class PlayoutQueue:
+    """
+    Cola de frames ordenada por instante del servidor (timestamp de la cabecera):
+    un frame apenas reordenado se inserta en su lugar, buscando desde el final.
+    Un frame es viejo si no es posterior al último que salió de la cola, comparando
+    frame_id con aritmética de números de serie (segura ante la vuelta en 65536) y
+    timestamp; basta con que uno de los dos sea posterior (p. ej. servidor reiniciado).
+    La duración y la cantidad de keyframes se mantienen en cada operación.
+    """
+    def __init__(self, frame_duration_ms: float):
+        self.frames = collections.deque()
+        self.frame_duration_ms = frame_duration_ms
+        self.duration_ms = 0.0
+        self.keyframes = 0
+        self.last_removed_id = None
+        self.last_removed_timestamp = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def _update_duration(self):
+        if len(self.frames) > 1:
+            self.duration_ms = (self.frames[-1]['timestamp'] - self.frames[0]['timestamp']) * 1000.0
+        else:
+            self.duration_ms = self.frame_duration_ms if self.frames else 0.0
+
+    def is_stale(self, frame: Dict[str, Any]) -> bool:
+        return self.last_removed_id is not None and \
+            frame_id_diff(frame['frame_id'], self.last_removed_id) <= 0 and \
+            frame['timestamp'] <= self.last_removed_timestamp
+
+    def insert(self, frame: Dict[str, Any]) -> Optional[str]:
+        """Inserta el frame en orden; devuelve el motivo si se descarta (viejo o duplicado)."""
+        if self.is_stale(frame):
+            return "demasiado antiguo"
+        timestamp = frame['timestamp']
+        index = len(self.frames)
+        while index > 0 and self.frames[index - 1]['timestamp'] > timestamp:
+            index -= 1
+        if index > 0 and self.frames[index - 1]['timestamp'] == timestamp:
+            return "duplicado"
+
+        if index == len(self.frames):
+            self.frames.append(frame)
+        else:
+            self.frames.insert(index, frame)
+        if frame['is_keyframe']:
+            self.keyframes += 1
+        self._update_duration()
+        return None
+
+    def peek(self) -> Dict[str, Any]:
+        return self.frames[0]
+
+    def popleft(self) -> Dict[str, Any]:
+        frame = self.frames.popleft()
+        if frame['is_keyframe']:
+            self.keyframes -= 1
+        self.last_removed_id = frame['frame_id']
+        self.last_removed_timestamp = frame['timestamp']
+        self._update_duration()
+        return frame
+
+    def jump_to_newest_keyframe(self) -> List[Dict[str, Any]]:
+        """Descarta todo lo anterior al keyframe más reciente; devuelve los frames descartados."""
+        if not self.keyframes:
+            return []
+        index = len(self.frames) - 1
+        while not self.frames[index]['is_keyframe']:
+            index -= 1
+        return [self.popleft() for _ in range(index)]
+
+    def clear(self):
+        self.frames.clear()
+        self.keyframes = 0
+        self.duration_ms = 0.0
+        self.last_removed_id = None
+        self.last_removed_timestamp = None
+
 
 class VideoPlaybackBuffer:
-    def __init__(self, initial_buffer_ms: int = 5, max_buffer_ms: int =50,
-                 min_buffer_ms: int = 50, fps: int = 60, logger: Any = None):
-        self.buffer = collections.deque()
+    """
+    Buffer de reproducción con objetivo de demora adaptativo (adaptive=True):
+    - por cada frame que llega se mide su tránsito (llegada local - instante del servidor);
+      el jitter es el percentil jitter_percentile del tránsito menos el mínimo de la ventana
+    - la demora objetivo es ese jitter + target_margin_ms, acotada a [min_buffer_ms, max_buffer_ms]
+    - la demora real de un frame es cuánto lleva desde que llegaría sin jitter (tránsito mínimo)
+    - la reproducción se acelera o frena hasta max_rate_adjust (a tope con rate_adjust_ms de
+      diferencia) para acercar la demora real al objetivo, en lugar de descartar frames
+    Con adaptive=False se conserva la agenda fija con resincronización en keyframes.
+    """
+    def __init__(self, initial_buffer_ms: int = 5, max_buffer_ms: int = 120,
+                 min_buffer_ms: int = 5, fps: int = 60, logger: Any = None, tracer: Any = None,
+                 adaptive: bool = True, jitter_percentile: float = 0.95, jitter_window: int = 256,
+                 target_margin_ms: float = 2.0, max_rate_adjust: float = 0.05, rate_adjust_ms: float = 20.0):
+        self.expected_frame_duration_ms = (1000.0 / fps) if fps > 0 else 33.33
+        self.buffer = PlayoutQueue(self.expected_frame_duration_ms)
         self.lock = threading.Lock()
         self.logger = logger
+        self.tracer = tracer  # FrameTracer opcional: marca cuándo entra cada frame al buffer
+        # Los mensajes de debug se arman solo si el logger los va a guardar
+        self.debug = bool(logger) and getattr(logger, 'debug_enabled', True)
 
         self.initial_buffer_size_ms = initial_buffer_ms
         self.max_buffer_size_ms = max_buffer_ms
         self.min_buffer_size_ms = min_buffer_ms
-        self.expected_frame_duration_ms = (1000.0 / fps) if fps > 0 else 33.33
 
         self.last_playback_time_client = None
         self.last_playback_timestamp_server = None
         self.is_playing = False
         self.last_keyframe_info = None
 
-        if self.logger:
+        # Demora adaptativa
+        self.adaptive = adaptive
+        self.jitter_percentile = jitter_percentile
+        self.target_margin_ms = target_margin_ms
+        self.max_rate_adjust = max_rate_adjust
+        self.rate_adjust_ms = rate_adjust_ms
+        self.transits = collections.deque(maxlen=jitter_window)  # En orden de llegada
+        self.sorted_transits = []                                  # Los mismos, ordenados
+        self.jitter_ms = 0.0
+        self.target_delay_ms = float(max(min_buffer_ms, initial_buffer_ms))
+        self.playout_delay_ms = 0.0
+        self.playout_rate = 1.0
+
+        if self.debug:
             self.logger.log_debug("[JITTER_BUFFER] Inicializando buffer.")
 
     def _get_current_buffer_duration_ms(self) -> float:
-        if not self.buffer:
-            return 0.0
-        if len(self.buffer) == 1:
-            return self.expected_frame_duration_ms
-        return (self.buffer[-1]['timestamp'] - self.buffer[0]['timestamp']) * 1000.0
+        return self.buffer.duration_ms
+
+    def _observe_arrival(self, timestamp: float, now: float):
+        """Actualiza la ventana de tránsitos y la demora objetivo con la llegada de un frame."""
+        transit = now - timestamp
+        if len(self.transits) == self.transits.maxlen:
+            oldest = self.transits.popleft()
+            del self.sorted_transits[bisect.bisect_left(self.sorted_transits, oldest)]
+        self.transits.append(transit)
+        bisect.insort(self.sorted_transits, transit)
+
+        if len(self.sorted_transits) >= 8:
+            index = int(self.jitter_percentile * (len(self.sorted_transits) - 1))
+            self.jitter_ms = (self.sorted_transits[index] - self.sorted_transits[0]) * 1000.0
+            self.target_delay_ms = min(self.max_buffer_size_ms,
+                                       max(self.min_buffer_size_ms, self.jitter_ms + self.target_margin_ms))
+
+    def _playout_time(self, frame: Dict[str, Any], now: float) -> float:
+        """Instante local en que corresponde mostrar frame, con la velocidad ajustada a la demora objetivo."""
+        elapsed_server = frame['timestamp'] - self.last_playback_timestamp_server
+        if not self.adaptive or not self.sorted_transits:
+            return self.last_playback_time_client + elapsed_server
+
+        self.playout_delay_ms = (now - frame['timestamp'] - self.sorted_transits[0]) * 1000.0
+        error = (self.playout_delay_ms - self.target_delay_ms) / self.rate_adjust_ms
+        self.playout_rate = 1.0 + max(-1.0, min(1.0, error)) * self.max_rate_adjust
+        return self.last_playback_time_client + elapsed_server / self.playout_rate
 
     def _clean_buffer_on_overflow(self):
-        while self._get_current_buffer_duration_ms() > self.max_buffer_size_ms and len(self.buffer) > 1:
+        while self.buffer.duration_ms > self.max_buffer_size_ms and len(self.buffer) > 1:
             dropped_frame_info = self.buffer.popleft()
             if self.logger:
                 self.logger.log_buffer_drop(dropped_frame_info['frame_id'])
+            if self.debug:
                 self.logger.log_debug(f"[JITTER_BUFFER] Descartado frame {dropped_frame_info['frame_id']} por overflow. Buffer: {self._get_current_buffer_duration_ms():.2f}ms")
 
     def add_frame(self, frame: Dict[str, Any]):
         with self.lock:
             frame_id = frame["frame_id"]
-            if self.buffer and frame_id <= self.buffer[-1]["frame_id"] and not frame["is_keyframe"]:
-                if self.logger:
-                    self.logger.log_debug(f"[JITTER_BUFFER] Descartado frame {frame_id} (demasiado antiguo/duplicado).")
+            rejected = self.buffer.insert(frame)
+            if rejected:
+                if self.debug:
+                    self.logger.log_debug(f"[JITTER_BUFFER] Descartado frame {frame_id} ({rejected}).")
                 return
 
-            self.buffer.append(frame)
+            if self.adaptive:
+                frame["arrival"] = time.monotonic()
+                self._observe_arrival(frame["timestamp"], frame["arrival"])
+            if self.tracer:
+                self.tracer.mark(frame_id, frame["timestamp"], 'buffered')
             self._clean_buffer_on_overflow()
 
             if self.logger:
                 current_duration = self._get_current_buffer_duration_ms()
                 self.logger.log_buffer_add(frame_id, current_duration)
-                self.logger.log_debug(f"[JITTER_BUFFER] Añadido frame {frame_id}. Buffer: {current_duration:.2f}ms")
+                if self.debug:
+                    self.logger.log_debug(f"[JITTER_BUFFER] Añadido frame {frame_id}. Buffer: {current_duration:.2f}ms")
 
     def get_frame_for_display(self) -> Optional[Tuple[bytes, Dict[str, Any]]]:
         with self.lock:
             if not self.buffer:
-                self.is_playing = False
+                # Con demora adaptativa el buffer vacío entre frames es normal: la agenda sigue
+                # y un frame tardío se muestra al llegar (la demora crece y luego se recupera)
+                if not self.adaptive:
+                    self.is_playing = False
                 if self.logger:
                     self.logger.log_buffer_state("Underflow (empty)", 0.0)
                 return None, None
 
-            current_time_client = time.time()
-            next_frame_info = self.buffer[0]
+            current_time_client = time.monotonic()  # Solo se usan diferencias: no afecta el ajuste de hora
+            next_frame_info = self.buffer.peek()
 
             if not self.is_playing:
                 if self._get_current_buffer_duration_ms() < self.initial_buffer_size_ms:
@@ -77,12 +221,13 @@ class VideoPlaybackBuffer:
                 if self.logger:
                     self.logger.log_buffer_state("Playback started", self._get_current_buffer_duration_ms())
 
-            if next_frame_info['is_keyframe']:
+            if next_frame_info['is_keyframe'] and not self.adaptive:
                 if self.last_keyframe_info is None or \
                    abs((next_frame_info['timestamp'] - self.last_keyframe_info['timestamp_server']) - \
                        (current_time_client - self.last_keyframe_info['time_client'])) > (self.expected_frame_duration_ms / 1000.0 * 2):
-                    if self.logger:
+                    if self.debug:
                         self.logger.log_debug(f"[JITTER_BUFFER] Keyframe {next_frame_info['frame_id']} detectado. Resincronizando.")
+                    if self.logger:
                         self.logger.log_resync_event(next_frame_info['frame_id'], self._get_current_buffer_duration_ms())
                     self.last_playback_time_client = current_time_client
                     self.last_playback_timestamp_server = next_frame_info['timestamp']
@@ -91,16 +236,23 @@ class VideoPlaybackBuffer:
                         'time_client': current_time_client
                     }
 
-            expected_playback_time_client = self.last_playback_time_client + \
-                                            (next_frame_info['timestamp'] - self.last_playback_timestamp_server)
+            expected_playback_time_client = self._playout_time(next_frame_info, current_time_client)
 
             if current_time_client >= expected_playback_time_client:
                 frame_to_display = self.buffer.popleft()
-                self.last_playback_time_client = current_time_client
+                if self.adaptive:
+                    # La agenda avanza al instante en que el frame podía mostrarse: lo planificado o
+                    # su llegada si llegó tarde. Un sondeo tardío del consumidor no acumula demora
+                    self.last_playback_time_client = max(expected_playback_time_client, frame_to_display['arrival'])
+                else:
+                    self.last_playback_time_client = current_time_client
                 self.last_playback_timestamp_server = frame_to_display['timestamp']
 
                 if self.logger:
                     self.logger.log_buffer_state("Frame delivered", self._get_current_buffer_duration_ms())
+                    if self.adaptive:
+                        self.logger.log_playout_delay(frame_to_display['frame_id'], self.target_delay_ms,
+                                                      self.playout_delay_ms)
 
                 metadata = {
                     k: v for k, v in frame_to_display.items()
@@ -122,6 +274,37 @@ class VideoPlaybackBuffer:
             self.add_frame(frame)
         return self.get_frame_for_display()
 
+    def time_until_playback(self) -> Optional[float]:
+        """
+        Segundos hasta que el primer frame del buffer deba mostrarse (0 si ya venció).
+        None si el buffer está vacío o todavía no alcanzó el llenado inicial.
+        """
+        with self.lock:
+            if not self.buffer:
+                return None
+            if not self.is_playing:
+                return 0.0 if self._get_current_buffer_duration_ms() >= self.initial_buffer_size_ms else None
+            now = time.monotonic()
+            return max(0.0, self._playout_time(self.buffer.peek(), now) - now)
+
+    def skip_to_newest_keyframe(self) -> int:
+        """
+        Descarta los frames anteriores al keyframe más reciente del buffer y reprograma
+        la reproducción para mostrarlo ya. Devuelve cuántos frames se descartaron.
+        """
+        with self.lock:
+            dropped = self.buffer.jump_to_newest_keyframe()
+            for frame in dropped:
+                if self.logger:
+                    self.logger.log_buffer_drop(frame['frame_id'])
+            if dropped and self.is_playing:
+                keyframe = self.buffer.peek()
+                self.last_playback_time_client = time.monotonic()
+                self.last_playback_timestamp_server = keyframe['timestamp']
+                if self.logger:
+                    self.logger.log_resync_event(keyframe['frame_id'], self.buffer.duration_ms)
+            return len(dropped)
+
     def is_ready(self) -> bool:
         with self.lock:
             return self._get_current_buffer_duration_ms() >= self.initial_buffer_size_ms
@@ -130,6 +313,25 @@ class VideoPlaybackBuffer:
         with self.lock:
             return self._get_current_buffer_duration_ms()
 
+    def get_playout_stats(self) -> Dict[str, float]:
+        """Demora objetivo y real (ms), jitter medido y velocidad de reproducción actual."""
+        return {
+            'target_delay_ms': self.target_delay_ms,
+            'playout_delay_ms': self.playout_delay_ms,
+            'jitter_ms': self.jitter_ms,
+            'playout_rate': self.playout_rate,
+        }
+
+    def register_metrics(self, registry):
+        registry.gauge('playback_buffer_ms', "Duración del buffer de reproducción",
+                       fn=self.get_buffer_duration_ms)
+        registry.gauge('playout_target_delay_ms', "Demora objetivo del buffer adaptativo",
+                       fn=lambda: self.target_delay_ms)
+        registry.gauge('playout_delay_ms', "Demora real del último frame mostrado",
+                       fn=lambda: self.playout_delay_ms)
+        registry.gauge('playout_rate', "Velocidad de reproducción (1 = tiempo real)",
+                       fn=lambda: self.playout_rate)
+
     def clear(self):
         with self.lock:
             self.buffer.clear()
@@ -137,6 +339,7 @@ class VideoPlaybackBuffer:
             self.last_playback_timestamp_server = None
             self.is_playing = False
             self.last_keyframe_info = None
+            self.playout_rate = 1.0
             if self.logger:
                 self.logger.log_buffer_state("Buffer cleared", 0.0)
             print("[JITTER_BUFFER] Buffer limpiado y estado reseteado.")
@@ -1,18 +1,37 @@
-import time
 import math
 import struct
 
+from udp_connection.clocksync import stream_time
+
+# Cabecera de 16 bytes: frame_id, chunk_index, total_chunks, quality_id, flags, timestamp
+HEADER = struct.Struct('>HHHBBd')
+HEADER_SIZE = HEADER.size
+
+FLAG_KEYFRAME = 0b00000001
+FLAG_PARITY = 0b00000010  # Paquete de paridad FEC (chunk_index = índice de paridad)
+FLAG_RETRANSMIT = 0b00000100  # Chunk reenviado en respuesta a un NACK
+
+
+def frame_id_diff(a: int, b: int) -> int:
+    """Diferencia a - b entre frame_ids de 16 bits, segura ante la vuelta en 65536 (en [-32768, 32767])."""
+    return ((a - b + 32768) & 0xFFFF) - 32768
+
 class Chunker:
-    def __init__(self, payload_size=1400):
+    def __init__(self, payload_size=1400, fec=None):
         self.payload_size = payload_size
         self.frame_id = 0
+        self.fec = fec  # FecEncoder opcional: agrega paquetes de paridad a cada frame
+        # Buffer reutilizable para la cabecera en el modo zero-copy
+        self.header_buffer = bytearray(HEADER_SIZE)
+        # Slab de cabeceras para el envío por lotes (crece según el frame más grande)
+        self.header_slab = bytearray()
 
     def chunk_frame(self, frame_data: bytes, quality_id: int, is_keyframe: bool):
         chunks = []
         total_chunks = math.ceil(len(frame_data) / self.payload_size)
-        timestamp = time.time()
+        timestamp = stream_time()
 
-        flags = 0b00000001 if is_keyframe else 0b00000000
+        flags = FLAG_KEYFRAME if is_keyframe else 0b00000000
         quality_id = max(0, min(quality_id, 255))  # Clamp por seguridad
 
         for i in range(total_chunks):
@@ -20,15 +39,78 @@ class Chunker:
             end = start + self.payload_size
             payload = frame_data[start:end]
 
-            header = (
-                self.frame_id.to_bytes(2, 'big') +
-                i.to_bytes(2, 'big') +
-                total_chunks.to_bytes(2, 'big') +
-                quality_id.to_bytes(1, 'big') +
-                flags.to_bytes(1, 'big') +
-                struct.pack('>d', timestamp)
-            )
+            header = HEADER.pack(self.frame_id, i, total_chunks, quality_id, flags, timestamp)
             chunks.append(header + payload)
 
+        for j, parity in enumerate(self._parity_payloads(frame_data)):
+            header = HEADER.pack(self.frame_id, j, total_chunks, quality_id, flags | FLAG_PARITY, timestamp)
+            chunks.append(header + parity)
+
+        self.frame_id = (self.frame_id + 1) % 65536
+        return chunks
+
+    def iter_chunk_views(self, frame_data, quality_id: int, is_keyframe: bool):
+        """
+        Modo zero-copy: genera tuplas (header, payload) sin concatenar.
+        La cabecera se escribe siempre en el mismo buffer, por lo que solo es
+        válida hasta la siguiente iteración (pensado para enviar con sendmsg).
+        """
+        view = memoryview(frame_data)
+        total_chunks = math.ceil(len(view) / self.payload_size)
+        timestamp = stream_time()
+
+        flags = FLAG_KEYFRAME if is_keyframe else 0b00000000
+        quality_id = max(0, min(quality_id, 255))  # Clamp por seguridad
+
+        frame_id = self.frame_id
         self.frame_id = (self.frame_id + 1) % 65536
-        return chunks
\ No newline at end of file
+
+        header = self.header_buffer
+        for i in range(total_chunks):
+            start = i * self.payload_size
+            HEADER.pack_into(header, 0, frame_id, i, total_chunks, quality_id, flags, timestamp)
+            yield header, view[start:start + self.payload_size]
+
+        for j, parity in enumerate(self._parity_payloads(view)):
+            HEADER.pack_into(header, 0, frame_id, j, total_chunks, quality_id, flags | FLAG_PARITY, timestamp)
+            yield header, parity
+
+    def chunk_frame_views(self, frame_data, quality_id: int, is_keyframe: bool):
+        """
+        Variante por lotes del modo zero-copy: devuelve una lista de tuplas
+        (header, payload) con todas las cabeceras en un slab reutilizable.
+        Las vistas son válidas hasta la siguiente llamada.
+        """
+        view = memoryview(frame_data)
+        total_chunks = math.ceil(len(view) / self.payload_size)
+        timestamp = stream_time()
+
+        flags = FLAG_KEYFRAME if is_keyframe else 0b00000000
+        quality_id = max(0, min(quality_id, 255))  # Clamp por seguridad
+
+        parities = self._parity_payloads(view)
+        needed = (total_chunks + len(parities)) * HEADER_SIZE
+        if len(self.header_slab) < needed:
+            self.header_slab = bytearray(needed)
+        slab = memoryview(self.header_slab)
+
+        chunks = []
+        for i in range(total_chunks):
+            offset = i * HEADER_SIZE
+            start = i * self.payload_size
+            HEADER.pack_into(slab, offset, self.frame_id, i, total_chunks, quality_id, flags, timestamp)
+            chunks.append((slab[offset:offset + HEADER_SIZE], view[start:start + self.payload_size]))
+
+        for j, parity in enumerate(parities):
+            offset = (total_chunks + j) * HEADER_SIZE
+            HEADER.pack_into(slab, offset, self.frame_id, j, total_chunks, quality_id, flags | FLAG_PARITY, timestamp)
+            chunks.append((slab[offset:offset + HEADER_SIZE], parity))
+
+        self.frame_id = (self.frame_id + 1) % 65536
+        return chunks
+
+    def _parity_payloads(self, frame_data):
+        """Payloads de paridad del frame (lista vacía si no hay FEC configurado)."""
+        if self.fec is None:
+            return []
+        return self.fec.encode(frame_data, self.payload_size)
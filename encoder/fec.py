@@ -0,0 +1,180 @@
+import math
+import functools
+import struct
+import numpy as np
+
+# Sub-cabecera de los paquetes de paridad (va después de la cabecera de 16 bytes):
+# esquema, cantidad de paquetes de paridad del frame, largo del último chunk de datos
+FEC_HEADER = struct.Struct('>BBH')
+FEC_HEADER_SIZE = FEC_HEADER.size
+
+SCHEME_XOR = 1
+SCHEME_RS = 2
+SCHEMES = {'xor': SCHEME_XOR, 'rs': SCHEME_RS}
+
+# Reed-Solomon sobre GF(256): datos + paridad no pueden superar 256 símbolos
+RS_MAX_SYMBOLS = 256
+
+
+def _build_gf_tables(poly=0x11d):
+    exp = np.zeros(512, dtype=np.int32)
+    log = np.zeros(256, dtype=np.int32)
+    x = 1
+    for i in range(255):
+        exp[i] = x
+        log[x] = i
+        x <<= 1
+        if x & 0x100:
+            x ^= poly
+    exp[255:510] = exp[0:255]
+
+    # Tabla de multiplicación completa: MUL[a, b] = a * b en GF(256)
+    logs = log[1:]
+    mul = np.zeros((256, 256), dtype=np.uint8)
+    mul[1:, 1:] = exp[logs[:, None] + logs[None, :]]
+    return exp, log, mul
+
+
+GF_EXP, GF_LOG, GF_MUL = _build_gf_tables()
+_EXP = GF_EXP.tolist()
+_LOG = GF_LOG.tolist()
+
+
+def _gf_mul(a, b):
+    if a == 0 or b == 0:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+
+def _gf_inv(a):
+    return _EXP[255 - _LOG[a]]
+
+
+@functools.lru_cache(maxsize=1024)
+def _cauchy_row(parity_index, k):
+    """Coeficientes de la fila de paridad j: 1 / (x_j + y_i), con x_j = k + j, y_i = i."""
+    x = k + parity_index
+    return np.array([_gf_inv(x ^ i) for i in range(k)], dtype=np.uint8)
+
+
+def _gf_invert_matrix(matrix):
+    """Invierte una matriz cuadrada (listas de ints) en GF(256) por Gauss-Jordan."""
+    n = len(matrix)
+    aug = [row[:] + [1 if i == j else 0 for j in range(n)] for i, row in enumerate(matrix)]
+    for col in range(n):
+        pivot = next(r for r in range(col, n) if aug[r][col])
+        aug[col], aug[pivot] = aug[pivot], aug[col]
+        inv = _gf_inv(aug[col][col])
+        aug[col] = [_gf_mul(v, inv) for v in aug[col]]
+        for r in range(n):
+            factor = aug[r][col]
+            if r != col and factor:
+                aug[r] = [v ^ _gf_mul(factor, p) for v, p in zip(aug[r], aug[col])]
+    return [row[n:] for row in aug]
+
+
+def _xor_groups(k, parity_count):
+    """Grupos intercalados: la paridad j cubre los chunks i con i % parity_count == j."""
+    return [list(range(j, k, parity_count)) for j in range(parity_count)]
+
+
+class FecEncoder:
+    """
+    Genera paquetes de paridad por frame.
+    - 'xor': parity_count grupos intercalados, recupera 1 chunk perdido por grupo.
+    - 'rs': Reed-Solomon (Cauchy sobre GF(256)), recupera hasta parity_count chunks
+      perdidos cualesquiera. Si el frame tiene demasiados chunks (k + m > 256)
+      ese frame se protege con XOR.
+    """
+    def __init__(self, scheme: str = 'xor', parity_count: int = 2):
+        if scheme not in SCHEMES:
+            raise ValueError(f"Esquema FEC desconocido: {scheme}")
+        self.scheme = SCHEMES[scheme]
+        self.parity_count = max(1, min(parity_count, 255))
+        self._rs_rows = {}  # k: matriz de coeficientes (m, k)
+
+    def _rs_matrix(self, k):
+        matrix = self._rs_rows.get(k)
+        if matrix is None:
+            matrix = np.stack([_cauchy_row(j, k) for j in range(self.parity_count)])
+            self._rs_rows[k] = matrix
+        return matrix
+
+    def scheme_for(self, total_chunks: int) -> int:
+        if self.scheme == SCHEME_RS and total_chunks + self.parity_count <= RS_MAX_SYMBOLS:
+            return SCHEME_RS
+        return SCHEME_XOR
+
+    def encode(self, frame_data, payload_size: int):
+        """Devuelve la lista de payloads de paridad (sub-cabecera + payload_size bytes)."""
+        total_chunks = math.ceil(len(frame_data) / payload_size)
+        if total_chunks == 0:
+            return []
+
+        # Matriz (k, payload_size) con el último chunk rellenado con ceros
+        data = np.zeros((total_chunks, payload_size), dtype=np.uint8)
+        data.reshape(-1)[:len(frame_data)] = np.frombuffer(frame_data, dtype=np.uint8)
+        last_len = len(frame_data) - (total_chunks - 1) * payload_size
+
+        scheme = self.scheme_for(total_chunks)
+        parity_count = min(self.parity_count, total_chunks)
+        if scheme == SCHEME_RS:
+            matrix = self._rs_matrix(total_chunks)
+            rows = [np.bitwise_xor.reduce(GF_MUL[matrix[j][:, None], data], axis=0)
+                    for j in range(parity_count)]
+        else:
+            rows = [np.bitwise_xor.reduce(data[group], axis=0)
+                    for group in _xor_groups(total_chunks, parity_count)]
+
+        header = FEC_HEADER.pack(scheme, parity_count, last_len)
+        return [header + row.tobytes() for row in rows]
+
+
+def recover_chunks(scheme: int, parity_count: int, data: np.ndarray, present, parities: dict):
+    """
+    Reconstruye en el lugar los chunks faltantes de data (matriz (k, payload_size),
+    con el relleno del último chunk en cero). present(i) indica si el chunk i llegó;
+    parities es {índice: buffer de payload_size bytes}. Devuelve los índices recuperados.
+    """
+    total_chunks = data.shape[0]
+    missing = [i for i in range(total_chunks) if not present(i)]
+    if not missing or not parities:
+        return []
+    missing_set = set(missing)
+
+    if scheme == SCHEME_XOR:
+        recovered = []
+        for j, group in enumerate(_xor_groups(total_chunks, parity_count)):
+            lost = [i for i in group if i in missing_set]
+            if len(lost) != 1 or j not in parities:
+                continue
+            others = [i for i in group if i != lost[0]]
+            acc = np.frombuffer(parities[j], dtype=np.uint8).copy()
+            if others:
+                acc ^= np.bitwise_xor.reduce(data[others], axis=0)
+            data[lost[0]] = acc
+            recovered.append(lost[0])
+        return recovered
+
+    # Reed-Solomon: hacen falta al menos tantas paridades como chunks perdidos
+    if len(parities) < len(missing):
+        return []
+    rows = sorted(parities)[:len(missing)]
+    known = [i for i in range(total_chunks) if i not in missing_set]
+    coefficients = {j: _cauchy_row(j, total_chunks) for j in rows}
+
+    # S_j = P_j xor sum(c_ji * D_i) sobre los chunks conocidos
+    syndromes = []
+    for j in rows:
+        acc = np.frombuffer(parities[j], dtype=np.uint8).copy()
+        if known:
+            acc ^= np.bitwise_xor.reduce(GF_MUL[coefficients[j][known][:, None], data[known]], axis=0)
+        syndromes.append(acc)
+
+    system = [[int(coefficients[j][i]) for i in missing] for j in rows]
+    inverse = _gf_invert_matrix(system)
+    stacked = np.stack(syndromes)
+    for row, i in enumerate(missing):
+        factors = np.array(inverse[row], dtype=np.uint8)
+        data[i] = np.bitwise_xor.reduce(GF_MUL[factors[:, None], stacked], axis=0)
+    return missing
@@ -0,0 +1,81 @@
+import time
+
+
+class FrameSource:
+    """
+    Interfaz común de las fuentes de frames del servidor.
+    Una fuente es un iterador que entrega cada frame ya codificado (JPEG o delta por tiles)
+    a su ritmo; después de cada next(), is_keyframe() describe el frame entregado.
+    - ScreenCapturer: captura en vivo con mss (monitor configurable)
+    - RecordingFrameSource: envuelve otra fuente y graba lo que entrega en un contenedor indexado
+    - ReplayFrameSource: reproduce una grabación desde un mmap, sin copiar los frames
+    Las fuentes con raw_capture = True además ofrecen grab_raw() (BGRA sin codificar)
+    para el pool de codificación en paralelo.
+    stage_times: instantes (captura, escalado, codificación) del último frame, para el trazado por etapas.
+    """
+    raw_capture = False
+    tile_encoder = None
+    stage_times = None
+
+    def __init__(self, width=800, height=600, fps=60, quality=80):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.quality = quality
+        self.frame_duration = 1.0 / fps
+        self.last_frame_time = time.time()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        raise NotImplementedError
+
+    def _wait_next_frame(self):
+        """Duerme hasta el próximo instante de frame según los fps configurados."""
+        now = time.time()
+        next_frame_time = self.last_frame_time + self.frame_duration
+        sleep_duration = max(0.0, next_frame_time - now)
+        if sleep_duration > 0:
+            time.sleep(sleep_duration)
+
+        self.last_frame_time = time.time()
+
+    def grab_raw(self):
+        raise NotImplementedError(f"{type(self).__name__} no entrega frames sin codificar")
+
+    def is_keyframe(self):
+        raise NotImplementedError
+
+    def request_keyframe(self):
+        """Pide que el próximo frame pueda decodificarse solo (p. ej. al entrar un cliente)."""
+        pass
+
+    def update_config(self, width, height, fps):
+        pass
+
+    def get_fps(self):
+        return self.fps
+
+    def release(self):
+        pass
+
+
+def open_frame_source(width=800, height=600, fps=60, tile_delta=False, monitor=1,
+                      record_path=None, replay_path=None, replay_speed=1.0, replay_loop=False):
+    """
+    Arma la fuente de frames según la configuración de los servidores:
+    una grabación si hay replay_path, si no la pantalla; y la graba si hay record_path.
+    """
+    # Import local: las fuentes concretas importan este módulo
+    if replay_path is not None:
+        from encoder.recording import ReplayFrameSource
+        source = ReplayFrameSource(replay_path, speed=replay_speed, loop=replay_loop)
+    else:
+        from encoder.screencapturer import ScreenCapturer
+        source = ScreenCapturer(width=width, height=height, fps=fps, tile_delta=tile_delta, monitor=monitor)
+
+    if record_path is not None:
+        from encoder.recording import RecordingFrameSource
+        source = RecordingFrameSource(source, record_path)
+    return source
@@ -0,0 +1,265 @@
+import os
+import time
+import heapq
+import queue
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory, resource_tracker
+from multiprocessing.connection import wait
+from typing import Optional
+import numpy as np
+import cv2
+
+
+def _encode_worker(worker_id, conn):
+    """Proceso de codificación: lee el frame BGRA del anillo compartido, lo redimensiona y lo comprime."""
+    attached = {}
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+
+        seq, shm_name, slot, shape, width, height, quality = task
+        start = time.perf_counter()
+        data = None
+        try:
+            shm = attached.get(shm_name)
+            if shm is None:
+                # Un anillo nuevo (cambió la resolución de captura): se sueltan los anteriores
+                for old in attached.values():
+                    old.close()
+                attached.clear()
+                shm = shared_memory.SharedMemory(name=shm_name)
+                attached[shm_name] = shm
+
+            slot_bytes = shape[0] * shape[1] * shape[2]
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=slot * slot_bytes)
+            resized = cv2.resize(frame[:, :, :3], (width, height))
+            success, encoded = cv2.imencode('.jpg', resized, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+            if success:
+                data = encoded.tobytes()
+            del frame
+        except Exception as e:
+            print(f"[ENCODER POOL] Worker {worker_id}: error codificando frame {seq}: {e}")
+
+        conn.send((seq, slot, data, time.perf_counter() - start, worker_id))
+
+    for shm in attached.values():
+        shm.close()
+
+
+class ParallelJpegEncoder:
+    """
+    Etapa de codificación en paralelo:
+    - los frames BGRA capturados se copian a un anillo en multiprocessing.shared_memory
+    - un pool de procesos los redimensiona y codifica a JPEG
+    - un hilo colector reordena los resultados por número de secuencia
+
+    submit() no bloquea: si no hay slots libres el frame se descarta (el pool va atrasado).
+    Cada proceso tiene su propio pipe (sin locks compartidos que un proceso muerto deje
+    tomados): si uno muere (segfault, OOM) el pipe da EOF, sus frames en vuelo se saltean,
+    sus slots se liberan y se lo reemplaza.
+    """
+    def __init__(self, width: int = 800, height: int = 600, quality: int = 80,
+                 workers: Optional[int] = None, ring_slots: Optional[int] = None,
+                 max_output_size: int = 8):
+        self.width = width
+        self.height = height
+        self.quality = quality
+        self.num_workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.ring_slots = ring_slots or 2 * self.num_workers
+
+        self.ctx = mp.get_context()
+        self.processes = []
+        self.connections = []  # Pipe de cada proceso: tareas hacia él, resultados desde él
+
+        self.shm = None
+        self.slot_shape = None
+        self.ring = None
+        self.free_slots = queue.Queue()
+
+        self.next_submit_seq = 0
+        self.next_emit_seq = 0
+        self.pending = []  # heap de (seq, data) esperando a los anteriores
+        self.in_flight = {}  # seq: (slot, worker_id) de los frames sin resultado
+        self.workers_lock = threading.Lock()  # in_flight, processes y connections
+        self.output_queue = queue.Queue(maxsize=max_output_size)
+
+        self.dropped_input = 0
+        self.dropped_output = 0
+        self.lost_frames = 0
+        self.restarted_workers = 0
+        self.worker_stats = {}  # worker_id: {'frames', 'total_s', 'max_s'}
+        self.stats_lock = threading.Lock()
+
+        self.running = False
+        self.collector = threading.Thread(target=self._collect_loop, daemon=True)
+
+    def start(self):
+        self.running = True
+        # El resource tracker debe existir antes de crear los procesos para que lo compartan;
+        # si no, cada hijo levanta uno propio y borra el anillo al terminar
+        resource_tracker.ensure_running()
+        for worker_id in range(self.num_workers):
+            process, conn = self._spawn(worker_id)
+            self.processes.append(process)
+            self.connections.append(conn)
+        self.collector.start()
+        print(f"[ENCODER POOL] {self.num_workers} procesos de codificación, {self.ring_slots} slots compartidos.")
+
+    def _spawn(self, worker_id):
+        conn, child_conn = self.ctx.Pipe()
+        process = self.ctx.Process(target=_encode_worker, args=(worker_id, child_conn), daemon=True)
+        process.start()
+        child_conn.close()  # Solo el hijo lo tiene abierto: si muere, conn da EOF
+        return process, conn
+
+    def stop(self):
+        self.running = False
+        self.collector.join(timeout=1.0)
+        for conn in self.connections:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        for process in self.processes:
+            process.join(timeout=1.0)
+        for conn in self.connections:
+            conn.close()
+        self._release_ring()
+
+    def _release_ring(self):
+        if self.shm is not None:
+            self.ring = None
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+    def _ensure_ring(self, shape):
+        """Crea (o recrea si cambió la resolución de captura) el anillo de memoria compartida."""
+        if shape == self.slot_shape:
+            return True
+        if self.shm is not None and self.free_slots.qsize() < self.ring_slots:
+            return False  # Quedan frames en vuelo sobre el anillo anterior
+
+        self._release_ring()
+        slot_bytes = shape[0] * shape[1] * shape[2]
+        self.shm = shared_memory.SharedMemory(create=True, size=slot_bytes * self.ring_slots)
+        self.ring = np.ndarray((self.ring_slots,) + tuple(shape), dtype=np.uint8, buffer=self.shm.buf)
+        self.slot_shape = shape
+        self.free_slots = queue.Queue()
+        for slot in range(self.ring_slots):
+            self.free_slots.put(slot)
+        return True
+
+    def submit(self, frame_bgra: np.ndarray) -> bool:
+        """Copia el frame a un slot libre y lo encola para codificar. False si se descartó."""
+        if not self._ensure_ring(frame_bgra.shape):
+            self.dropped_input += 1
+            return False
+        try:
+            slot = self.free_slots.get_nowait()
+        except queue.Empty:
+            self.dropped_input += 1
+            return False
+
+        np.copyto(self.ring[slot], frame_bgra)
+        seq = self.next_submit_seq
+        self.next_submit_seq += 1
+        task = (seq, self.shm.name, slot, self.slot_shape, self.width, self.height, self.quality)
+        with self.workers_lock:
+            # Al proceso con menos frames en vuelo
+            load = [0] * len(self.processes)
+            for _, worker_id in self.in_flight.values():
+                load[worker_id] += 1
+            worker_id = load.index(min(load))
+            self.in_flight[seq] = (slot, worker_id)
+            try:
+                self.connections[worker_id].send(task)
+            except OSError:
+                pass  # Murió: el colector saltea el frame al detectarlo
+        return True
+
+    def get(self, timeout: Optional[float] = None) -> Optional[bytes]:
+        """Próximo frame codificado, en orden de captura."""
+        try:
+            return self.output_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _collect_loop(self):
+        while self.running:
+            connections = list(self.connections)
+            for conn in wait(connections, timeout=0.1):
+                worker_id = connections.index(conn)
+                try:
+                    result = conn.recv()
+                except (EOFError, OSError):
+                    self._replace_worker(worker_id)
+                    continue
+                self._accept(*result)
+            for worker_id, process in enumerate(self.processes):
+                if not process.is_alive() and self.running:
+                    self._replace_worker(worker_id)
+            self._emit_ready()
+
+    def _accept(self, seq, slot, data, elapsed, worker_id):
+        with self.workers_lock:
+            self.in_flight.pop(seq, None)
+        self.free_slots.put(slot)
+        with self.stats_lock:
+            stats = self.worker_stats.setdefault(worker_id, {'frames': 0, 'total_s': 0.0, 'max_s': 0.0})
+            stats['frames'] += 1
+            stats['total_s'] += elapsed
+            stats['max_s'] = max(stats['max_s'], elapsed)
+        heapq.heappush(self.pending, (seq, data))
+
+    def _replace_worker(self, worker_id):
+        """Un proceso murió sin que se lo detuviera: se saltean sus frames y se lo reemplaza."""
+        with self.workers_lock:
+            old = self.processes[worker_id]
+            old.join(timeout=1.0)
+            lost = [seq for seq, (_, owner) in self.in_flight.items() if owner == worker_id]
+            for seq in lost:
+                slot, _ = self.in_flight.pop(seq)
+                self.free_slots.put(slot)
+                heapq.heappush(self.pending, (seq, None))
+            self.connections[worker_id].close()
+            self.processes[worker_id], self.connections[worker_id] = self._spawn(worker_id)
+        self.lost_frames += len(lost)
+        self.restarted_workers += 1
+        print(f"[ENCODER POOL] Worker {worker_id} terminó inesperadamente (código {old.exitcode}): "
+              f"{len(lost)} frames salteados, proceso reemplazado")
+
+    def _emit_ready(self):
+        # Reordenar: se emite solo cuando llegaron todos los anteriores
+        while self.pending and self.pending[0][0] == self.next_emit_seq:
+            _, ready = heapq.heappop(self.pending)
+            self.next_emit_seq += 1
+            if ready is None:
+                continue  # Falló la codificación de ese frame (o murió su proceso)
+            try:
+                self.output_queue.put_nowait(ready)
+            except queue.Full:
+                self.dropped_output += 1
+
+    def update_config(self, width: int, height: int, quality: Optional[int] = None):
+        self.width = width
+        self.height = height
+        if quality is not None:
+            self.quality = quality
+
+    def get_worker_stats(self) -> dict:
+        """Tiempo de codificación por worker: frames, promedio y máximo en ms."""
+        with self.stats_lock:
+            return {
+                worker_id: {
+                    'frames': s['frames'],
+                    'avg_ms': 1000.0 * s['total_s'] / s['frames'] if s['frames'] else 0.0,
+                    'max_ms': 1000.0 * s['max_s'],
+                }
+                for worker_id, s in self.worker_stats.items()
+            }
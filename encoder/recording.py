@@ -0,0 +1,205 @@
+import mmap
+import struct
+import time
+
+import numpy as np
+
+from encoder.framesource import FrameSource
+from encoder.tiledelta import is_tile_delta
+
+# Contenedor de grabación (.sfr): los frames tal como salieron del codificador, con su instante.
+#   cabecera:  magic 'SFR1', ancho, alto, fps
+#   registros: cabecera del registro (instante, largo, flags, quality_id) + payload
+#   índice:    una entrada por frame (offset del payload, instante, largo, flags, quality_id)
+#   cola:      offset del índice, cantidad de frames, magic 'SFRI'
+# Si la grabación se corta antes de escribir el índice, se reconstruye recorriendo los registros.
+FILE_MAGIC = b'SFR1'
+INDEX_MAGIC = b'SFRI'
+FILE_HEADER = struct.Struct('>4sHHf')
+RECORD_HEADER = struct.Struct('>dIBB')
+TRAILER = struct.Struct('>QI4s')
+INDEX_DTYPE = np.dtype([('offset', '>u8'), ('timestamp', '>f8'), ('length', '>u4'),
+                        ('flags', 'u1'), ('quality_id', 'u1')])
+
+RECORD_KEYFRAME = 0b00000001
+RECORD_TILE_DELTA = 0b00000010  # Depende del frame anterior: no se puede empezar desde acá
+
+
+class FrameRecorder:
+    """Escribe frames codificados en un contenedor indexado."""
+    def __init__(self, path, width, height, fps):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.file.write(FILE_HEADER.pack(FILE_MAGIC, width, height, fps))
+        self.index = []
+
+    def write(self, payload, timestamp, is_keyframe, quality_id):
+        flags = RECORD_KEYFRAME if is_keyframe else 0
+        if is_tile_delta(payload) and not is_keyframe:
+            flags |= RECORD_TILE_DELTA
+        length = len(payload)
+        self.file.write(RECORD_HEADER.pack(timestamp, length, flags, quality_id))
+        self.index.append((self.file.tell(), timestamp, length, flags, quality_id))
+        self.file.write(payload)
+
+    def close(self):
+        if self.file.closed:
+            return
+        index_offset = self.file.tell()
+        self.file.write(np.array(self.index, dtype=INDEX_DTYPE).tobytes())
+        self.file.write(TRAILER.pack(index_offset, len(self.index), INDEX_MAGIC))
+        self.file.close()
+        print(f"[RECORDER] {len(self.index)} frames guardados en {self.path}")
+
+
+class RecordingFrameSource(FrameSource):
+    """Envuelve otra fuente y graba cada frame que entrega (con su instante de captura)."""
+    def __init__(self, source: FrameSource, path):
+        self.source = source
+        self.recorder = FrameRecorder(path, source.width, source.height, source.fps)
+        self.last_keyframe = (True, 0)
+
+    def __getattr__(self, name):
+        # width, height, fps, quality, ... son los de la fuente envuelta
+        return getattr(self.source, name)
+
+    @property
+    def tile_encoder(self):
+        return self.source.tile_encoder
+
+    @property
+    def stage_times(self):
+        return self.source.stage_times
+
+    def __next__(self):
+        payload = next(self.source)
+        # is_keyframe() puede cambiar el estado de la fuente: se consulta una sola vez por frame
+        self.last_keyframe = self.source.is_keyframe()
+        self.recorder.write(payload, self.source.last_frame_time, *self.last_keyframe)
+        return payload
+
+    def is_keyframe(self):
+        return self.last_keyframe
+
+    def request_keyframe(self):
+        self.source.request_keyframe()
+
+    def update_config(self, width, height, fps):
+        self.source.update_config(width, height, fps)
+
+    def get_fps(self):
+        return self.source.get_fps()
+
+    def release(self):
+        self.recorder.close()
+        self.source.release()
+
+
+class ReplayFrameSource(FrameSource):
+    """
+    Reproduce una grabación .sfr desde un mmap: cada frame es una vista sobre el archivo, sin copias.
+    speed: 1.0 respeta los tiempos originales, 2.0 va al doble, 0 entrega lo más rápido posible.
+    loop: al terminar vuelve a empezar; si no, la iteración termina (StopIteration).
+    """
+    def __init__(self, path, speed=1.0, loop=False):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mm)
+
+        magic, width, height, fps = FILE_HEADER.unpack_from(self.mm, 0)
+        if magic != FILE_MAGIC:
+            raise ValueError(f"{path} no es una grabación de frames")
+        super().__init__(width=width, height=height, fps=fps)
+        self.index = self._load_index()
+
+        self.speed = speed
+        self.loop = loop
+        self.position = 0
+        self.clock_base = None  # (instante real, instante grabado) del primer frame servido
+        self.force_keyframe = False
+        self.last_keyframe = (True, 0)
+        print(f"[REPLAY] {path}: {len(self.index)} frames {width}x{height} @ {fps:g} FPS")
+
+    def _load_index(self):
+        size = len(self.mm)
+        if size >= FILE_HEADER.size + TRAILER.size:
+            index_offset, count, magic = TRAILER.unpack_from(self.mm, size - TRAILER.size)
+            if magic == INDEX_MAGIC:
+                # Vista directa sobre el archivo, sin copiar el índice
+                return np.frombuffer(self.mm, dtype=INDEX_DTYPE, count=count, offset=index_offset)
+
+        print(f"[REPLAY] {self.path} no tiene índice (¿grabación cortada?): reconstruyendo.")
+        entries = []
+        position = FILE_HEADER.size
+        while position + RECORD_HEADER.size <= size:
+            timestamp, length, flags, quality_id = RECORD_HEADER.unpack_from(self.mm, position)
+            offset = position + RECORD_HEADER.size
+            if offset + length > size:
+                break  # Último registro incompleto
+            entries.append((offset, timestamp, length, flags, quality_id))
+            position = offset + length
+        return np.array(entries, dtype=INDEX_DTYPE)
+
+    def __len__(self):
+        return len(self.index)
+
+    def _skip_to_keyframe(self):
+        """Avanza hasta el próximo frame que se puede decodificar solo."""
+        independent = (self.index['flags'][self.position:] & RECORD_TILE_DELTA) == 0
+        candidates = np.flatnonzero(independent)
+        if len(candidates) and candidates[0] > 0:
+            self.position += int(candidates[0])
+            self.clock_base = None  # El salto no debe convertirse en espera
+
+    def __next__(self):
+        if self.position >= len(self.index):
+            if not self.loop or len(self.index) == 0:
+                raise StopIteration
+            self.position = 0
+            self.clock_base = None
+            self.force_keyframe = True  # Al dar la vuelta el receptor tiene otro frame de referencia
+
+        if self.force_keyframe:
+            self._skip_to_keyframe()
+
+        entry = self.index[self.position]
+        self.position += 1
+        timestamp = float(entry['timestamp'])
+
+        if self.clock_base is None:
+            self.clock_base = (time.time(), timestamp)
+        if self.speed > 0:
+            wall_start, recorded_start = self.clock_base
+            sleep_duration = wall_start + (timestamp - recorded_start) / self.speed - time.time()
+            if sleep_duration > 0:
+                time.sleep(sleep_duration)
+        self.last_frame_time = time.time()
+
+        flags = int(entry['flags'])
+        is_keyframe = bool(flags & RECORD_KEYFRAME) or (self.force_keyframe and not flags & RECORD_TILE_DELTA)
+        self.force_keyframe = False
+        self.last_keyframe = (is_keyframe, int(entry['quality_id']))
+
+        offset = int(entry['offset'])
+        return self.view[offset:offset + int(entry['length'])]
+
+    def is_keyframe(self):
+        return self.last_keyframe
+
+    def request_keyframe(self):
+        self.force_keyframe = True
+
+    def update_config(self, width, height, fps):
+        if (width, height) != (self.width, self.height):
+            print(f"[REPLAY] La grabación es de {self.width}x{self.height}: se ignora el cambio a {width}x{height}")
+
+    def release(self):
+        self.index = np.empty(0, dtype=INDEX_DTYPE)  # El índice también es una vista del mmap
+        try:
+            self.view.release()
+            self.mm.close()
+        except BufferError:
+            # Todavía hay frames en uso (p. ej. en la caché de retransmisión): se cierra al liberarlos
+            pass
+        self.file.close()
@@ -1,51 +1,68 @@
 import numpy as np
 import cv2
-import mss
 import time
+from encoder.framesource import FrameSource
+from udp_connection.clocksync import stream_time
+from encoder.tiledelta import TileDeltaEncoder
 
 
-class ScreenCapturer:
-    def __init__(self, width=800, height=600, fps=60, quality=80):
-        self.width = width
-        self.height = height
-        self.fps = fps
-        self.quality = quality
-        self.frame_duration = 1.0 / fps
-        self.last_frame_time = time.time()
+class ScreenCapturer(FrameSource):
+    """Captura en vivo con mss; monitor es el índice de mss (1 = pantalla principal, 0 = todas juntas)."""
+    raw_capture = True
+
+    def __init__(self, width=800, height=600, fps=60, quality=80,
+                 tile_delta=False, tile_size=32, keyframe_interval=1.0, monitor=1):
+        super().__init__(width=width, height=height, fps=fps, quality=quality)
 
         self.sct = None         # Se inicializa luego
+        self.monitor_index = monitor
         self.monitor = None
 
         self.last_keyframe_time = time.time()
         self.last_quality_id = None
 
-    def __iter__(self):
-        return self
+        # Modo delta por tiles: solo se envían los tiles que cambiaron, con keyframes periódicos
+        self.tile_encoder = TileDeltaEncoder(tile_size=tile_size, quality=quality) if tile_delta else None
+        self.keyframe_interval = keyframe_interval
+        self.last_full_frame_time = 0.0
+        self.last_frame_is_full = True
 
-    def __next__(self):
+    def grab_raw(self) -> np.ndarray:
+        """Espera al próximo instante de frame y captura la pantalla sin procesar (BGRA, tamaño nativo)."""
         # Inicializar mss si aún no fue creado (esto ocurre dentro del hilo)
         if self.sct is None:
+            import mss  # Solo para captura en vivo: las fuentes sintéticas no lo necesitan
             self.sct = mss.mss()
-            self.monitor = self.sct.monitors[1]  # Pantalla principal
-
-        now = time.time()
-        next_frame_time = self.last_frame_time + self.frame_duration
-        sleep_duration = max(0.0, next_frame_time - now)
-        if sleep_duration > 0:
-            time.sleep(sleep_duration)
+            self.monitor = self.sct.monitors[self.monitor_index]
 
-        self.last_frame_time = time.time()
+        self._wait_next_frame()
 
-        # Captura en vivo
+        # Captura en vivo: vista sobre el buffer de mss, sin copiar
         screenshot = self.sct.grab(self.monitor)
-        frame = np.array(screenshot)[:, :, :3]  # BGR
+        return np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(screenshot.height, screenshot.width, 4)
+
+    def __next__(self):
+        frame = self.grab_raw()[:, :, :3]  # BGR
+        captured = stream_time()  # Mismo reloj que las cabeceras y el trazado
 
         # Redimensionar y comprimir
         frame = cv2.resize(frame, (self.width, self.height))
+        resized = stream_time()
+
+        if self.tile_encoder is not None:
+            force_full = self.last_frame_time - self.last_full_frame_time >= self.keyframe_interval
+            self.tile_encoder.quality = self.quality
+            payload, self.last_frame_is_full = self.tile_encoder.encode(frame, force_full)
+            if self.last_frame_is_full:
+                self.last_full_frame_time = self.last_frame_time
+            self.stage_times = (captured, resized, stream_time())
+            return payload
+
         encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), self.quality]
         success, encoded = cv2.imencode('.jpg', frame, encode_param)
         if not success:
             raise RuntimeError("Error al codificar el frame de pantalla")
+        self.stage_times = (captured, resized, stream_time())
         return encoded.tobytes()
 
     def compute_quality_id(self):
@@ -69,6 +86,11 @@ class ScreenCapturer:
         now = time.time()
         quality_id = self.compute_quality_id()
 
+        # En modo delta, keyframe = frame completo (los tiles dependen del anterior)
+        if self.tile_encoder is not None:
+            self.last_quality_id = quality_id
+            return self.last_frame_is_full, quality_id
+
         # Condición 1: ha pasado un intervalo
         #en este caso defini el intervalo en un segundo
         if now - self.last_keyframe_time >= 1.0:
@@ -84,6 +106,11 @@ class ScreenCapturer:
 
         return False, quality_id
 
+    def request_keyframe(self):
+        """Fuerza que el próximo frame sea completo (p. ej. si se descartó uno en el camino)."""
+        self.last_keyframe_time = 0.0
+        self.last_full_frame_time = 0.0
+
     def update_config(self, width, height, fps):
         if (width, height, fps) != (self.width, self.height, self.fps):
             print(f"[ENCODER] Resolución cambiada a {width}x{height} @ {fps} FPS")
@@ -92,9 +119,6 @@ class ScreenCapturer:
             self.fps = fps
             # Aplica los cambios reales si se necesita reiniciar algún capturador
 
-    def get_fps(self):
-        return self.fps
-
     #agrego un release, liberando los recursos ocupados de video
     def release(self):
         if self.sct is not None:
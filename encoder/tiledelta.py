@@ -0,0 +1,174 @@
+import math
+import struct
+import time
+import numpy as np
+import cv2
+
+from encoder.chunker import frame_id_diff
+
+# Payload de un frame delta por tiles (en lugar de un JPEG completo):
+# magic, tamaño de tile, ancho y alto del frame, cantidad de tiles, columnas del mosaico,
+# luego (tile_x, tile_y) por tile y al final un único JPEG con los tiles en mosaico.
+TILE_MAGIC = b'TDLT'  # Un JPEG siempre empieza con FF D8, no hay colisión
+TILE_HEADER = struct.Struct('>4sHHHHH')
+TILE_COORD = struct.Struct('>HH')
+
+
+def is_tile_delta(frame_data) -> bool:
+    return len(frame_data) >= TILE_HEADER.size and bytes(frame_data[:4]) == TILE_MAGIC
+
+
+def changed_tiles(previous: np.ndarray, current: np.ndarray, tile_size: int) -> np.ndarray:
+    """Máscara (filas, columnas) de tiles con algún píxel distinto, comparando en bloque con NumPy."""
+    height, width = current.shape[:2]
+    rows = math.ceil(height / tile_size)
+    cols = math.ceil(width / tile_size)
+    diff = np.any(previous != current, axis=2)
+    if rows * tile_size != height or cols * tile_size != width:
+        diff = np.pad(diff, ((0, rows * tile_size - height), (0, cols * tile_size - width)))
+    return diff.reshape(rows, tile_size, cols, tile_size).any(axis=(1, 3))
+
+
+class TileDeltaEncoder:
+    """
+    Codifica solo los tiles que cambiaron respecto al frame anterior.
+    Los frames completos (keyframes) se envían como JPEG normal; si cambió más de
+    full_ratio de la pantalla también conviene mandar el frame completo.
+    """
+    def __init__(self, tile_size: int = 32, quality: int = 80, full_ratio: float = 0.5):
+        if tile_size % 16:
+            raise ValueError("tile_size debe ser múltiplo de 16 para alinear los bloques JPEG")
+        self.tile_size = tile_size
+        self.quality = quality
+        self.full_ratio = full_ratio
+        self.previous = None
+
+    def _encode_jpeg(self, image):
+        success, encoded = cv2.imencode('.jpg', image, [int(cv2.IMWRITE_JPEG_QUALITY), self.quality])
+        if not success:
+            raise RuntimeError("Error al codificar el frame de pantalla")
+        return encoded.tobytes()
+
+    def encode(self, frame: np.ndarray, force_full: bool = False):
+        """Devuelve (payload, es_completo)."""
+        previous = self.previous
+        self.previous = frame
+        if force_full or previous is None or previous.shape != frame.shape:
+            return self._encode_jpeg(frame), True
+
+        ts = self.tile_size
+        mask = changed_tiles(previous, frame, ts)
+        tile_rows, tile_cols = np.nonzero(mask)
+        count = len(tile_rows)
+        if count > self.full_ratio * mask.size:
+            return self._encode_jpeg(frame), True
+
+        height, width = frame.shape[:2]
+        header = TILE_HEADER.pack(TILE_MAGIC, ts, width, height, count, 0)
+        if count == 0:
+            return header, False
+
+        # Extrae todos los tiles cambiados de una vez (el frame se rellena si no es múltiplo)
+        rows, cols = mask.shape
+        padded = frame
+        if rows * ts != height or cols * ts != width:
+            padded = np.pad(frame, ((0, rows * ts - height), (0, cols * ts - width), (0, 0)), mode='edge')
+        tiles = padded.reshape(rows, ts, cols, ts, 3).transpose(0, 2, 1, 3, 4)[tile_rows, tile_cols]
+
+        # Mosaico aproximadamente cuadrado para que el JPEG no supere los límites de tamaño
+        mosaic_cols = math.ceil(math.sqrt(count))
+        mosaic_rows = math.ceil(count / mosaic_cols)
+        if mosaic_rows * mosaic_cols != count:
+            tiles = np.concatenate([tiles, np.zeros((mosaic_rows * mosaic_cols - count, ts, ts, 3), np.uint8)])
+        mosaic = tiles.reshape(mosaic_rows, mosaic_cols, ts, ts, 3).transpose(0, 2, 1, 3, 4)
+        mosaic = mosaic.reshape(mosaic_rows * ts, mosaic_cols * ts, 3)
+
+        coords = np.empty((count, 2), dtype='>u2')
+        coords[:, 0] = tile_cols
+        coords[:, 1] = tile_rows
+        header = TILE_HEADER.pack(TILE_MAGIC, ts, width, height, count, mosaic_cols)
+        return header + coords.tobytes() + self._encode_jpeg(mosaic), False
+
+
+def apply_tile_delta(canvas: np.ndarray, frame_data) -> bool:
+    """
+    Pega los tiles de un payload delta sobre canvas (en el lugar).
+    Devuelve False si el payload no corresponde al canvas o está dañado.
+    """
+    view = memoryview(frame_data)
+    magic, ts, width, height, count, mosaic_cols = TILE_HEADER.unpack_from(view)
+    if magic != TILE_MAGIC or canvas is None or canvas.shape[:2] != (height, width):
+        return False
+    if count == 0:
+        return True
+
+    coords_end = TILE_HEADER.size + count * TILE_COORD.size
+    if len(view) <= coords_end or mosaic_cols == 0:
+        return False
+    coords = np.frombuffer(view[TILE_HEADER.size:coords_end], dtype='>u2').reshape(count, 2)
+    mosaic = cv2.imdecode(np.frombuffer(view[coords_end:], dtype=np.uint8), cv2.IMREAD_COLOR)
+    mosaic_rows = math.ceil(count / mosaic_cols)
+    if mosaic is None or mosaic.shape[:2] != (mosaic_rows * ts, mosaic_cols * ts):
+        return False
+
+    tiles = mosaic.reshape(mosaic_rows, ts, mosaic_cols, ts, 3).transpose(0, 2, 1, 3, 4)
+    tiles = tiles.reshape(-1, ts, ts, 3)
+    for tile, (tile_x, tile_y) in zip(tiles, coords):
+        x = int(tile_x) * ts
+        y = int(tile_y) * ts
+        if x >= width or y >= height:
+            return False
+        w = min(ts, width - x)
+        h = min(ts, height - y)
+        canvas[y:y + h, x:x + w] = tile[:h, :w]
+    return True
+
+
+class DeltaChain:
+    """
+    Validez del canvas del cliente como base de los deltas. Un delta parcial (chunks
+    rellenados con otro frame) o posterior a un frame perdido, vencido o salteado
+    dejaría tiles basura o viejos en el canvas hasta el próximo keyframe: esos deltas
+    no se aplican, se pide un keyframe (como mucho uno cada keyframe_interval_s) y la
+    cadena se retoma con el próximo frame completo.
+    """
+    def __init__(self, request_keyframe=None, keyframe_interval_s: float = 1.0):
+        self.request_keyframe = request_keyframe
+        self.keyframe_interval_s = keyframe_interval_s
+        self.last_keyframe_request = 0.0
+        self.valid = False
+        self.last_frame_id = None
+        self.rejected = 0
+
+    def full_frame(self, metadata, deltas: bool = True):
+        """Un JPEG completo vuelve a dar una base válida para los deltas siguientes."""
+        self.last_frame_id = metadata['frame_id']
+        self.valid = True
+        if deltas and metadata.get('partial'):
+            # Los chunks rellenados quedarían en el canvas bajo todos los deltas siguientes
+            self._request_keyframe(f"Frame completo parcial (frame {metadata['frame_id']})")
+
+    def accept_delta(self, metadata) -> bool:
+        """True si el delta puede aplicarse sobre el canvas actual."""
+        frame_id = metadata['frame_id']
+        gap = self.last_frame_id is None or frame_id_diff(frame_id, self.last_frame_id) != 1
+        self.last_frame_id = frame_id
+        if self.valid and not gap and not metadata.get('partial'):
+            return True
+        self.rejected += 1
+        if self.valid:
+            self.valid = False
+            reason = "Delta parcial" if metadata.get('partial') else "Frame perdido antes del delta"
+            self._request_keyframe(f"{reason} (frame {frame_id}), deltas en pausa")
+        else:
+            self._request_keyframe()
+        return False
+
+    def _request_keyframe(self, reason=None):
+        now = time.monotonic()
+        if self.request_keyframe is None or now - self.last_keyframe_request < self.keyframe_interval_s:
+            return
+        self.last_keyframe_request = now
+        if reason:
+            print(f"[DECODER] {reason}: pidiendo keyframe")
+        self.request_keyframe()
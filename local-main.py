@@ -18,10 +18,9 @@ log = FrameLogMetrics()
 
 reassembler = FrameReassembler(payload_size=PAYLOAD_SIZE, width=WIDTH, height=HEIGHT, logger=log)
 
-decoder = LiveVideoViewer(width=WIDTH, height=HEIGHT)
+decoder = LiveVideoViewer(width=WIDTH, height=HEIGHT, request_keyframe=encoder.request_keyframe)
 
 #nuevo: añado logger en buffer
-log = FrameLogMetrics()
 buffer_logger = BufferLogger(log_file="buffer.log")
 
 playbackbuffer = VideoPlaybackBuffer(fps=FPS, logger=buffer_logger)
@@ -40,12 +39,13 @@ try:
 
         # Recuperar y enviar a buffer y decodificador
         frame = reassembler.get_next_frame()
-        frame_data, _ = playbackbuffer.push_and_get(frame)
+        frame_data, metadata = playbackbuffer.push_and_get(frame)
 
         if frame_data:
-            decoder.decode_and_display(frame_data)
+            decoder.decode_and_display(frame_data, metadata)
 
 finally:
     encoder.release()
     decoder.release()
+    log.stop()
     buffer_logger.stop()
@@ -1,63 +1,197 @@
 # decoder/bufferlogger.py
-import logging
+import collections
+import itertools
+import struct
 import threading
 import time
-import queue
+from datetime import datetime
 from typing import Optional
 
+# Cada evento es un registro binario de tamaño fijo en un anillo preasignado:
+# el hilo que reproduce solo hace un struct.pack_into; el texto se arma en el hilo
+# escritor (modo texto) o después, con tools/decode_buffer_log.py (modo binario).
+# Si el escritor se atrasa más de un anillo, se pierden los eventos más viejos
+# (se cuentan) en lugar de crecer la memoria.
+RECORD = struct.Struct('<dfifBB2x')  # instante monotónico, buffer_ms, frame_id, espera (objetivo en DELAY), evento, estado
+# Cada sesión (cada BufferLogger) agrega su cabecera antes de sus registros: el reloj
+# monotónico cambia de origen entre procesos y al reiniciar el equipo
+FILE_HEADER = struct.Struct('<4sHHd')  # magic, versión, tamaño de registro, reloj de pared - monotónico
+FILE_MAGIC = b'BLOG'
+FILE_VERSION = 1
+SESSION_PREFIX = FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, RECORD.size, 0.0)[:8]
+EVENT_OFFSET = struct.calcsize('<dfif')  # Posición del byte de evento dentro de un registro
+
+EV_ADD = 1
+EV_DROP = 2
+EV_STATE = 3
+EV_RESYNC = 4
+EV_DELAY = 5  # Demora de reproducción: buffer_ms = real, espera = objetivo
+EVENT_NAMES = {EV_ADD: 'ADD', EV_DROP: 'DROP', EV_STATE: 'STATE', EV_RESYNC: 'RESYNC', EV_DELAY: 'DELAY'}
+
+# Estados que reporta VideoPlaybackBuffer; cualquier otro se guarda como STATE_OTHER
+STATES = ("Underflow (empty)", "Buffering (initial fill)", "Playback started", "Frame delivered",
+          "Waiting for playback time", "Buffer cleared")
+STATE_CODES = {state: code for code, state in enumerate(STATES)}
+STATE_OTHER = 255
+
+
+def format_record(t, buffer_ms, frame_id, wait, event, state, wall_offset=0.0) -> str:
+    """Texto de un registro, con el mismo formato que el log original."""
+    stamp = datetime.fromtimestamp(t + wall_offset).strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
+    if event == EV_ADD:
+        message = f"ADD: Frame {frame_id} added. Buffer: {buffer_ms:.2f}ms"
+    elif event == EV_DROP:
+        message = f"DROP: Frame {frame_id} discarded due to overflow."
+    elif event == EV_RESYNC:
+        message = f"RESYNC: Keyframe {frame_id} triggered resync. Buffer: {buffer_ms:.2f}ms"
+    elif event == EV_DELAY:
+        message = f"DELAY: Frame {frame_id}. Target: {wait:.2f}ms. Actual: {buffer_ms:.2f}ms"
+    else:
+        name = STATES[state] if state < len(STATES) else "Otro"
+        message = f"STATE: {name}. Buffer: {buffer_ms:.2f}ms"
+        if wait:
+            message += f". Wait: {wait:.3f}s"
+    return f"{stamp} - {message}"
+
+
+def _is_record(data, position) -> bool:
+    """Un registro completo en position con evento conocido y relleno en cero."""
+    if position + RECORD.size > len(data):
+        return False
+    end = position + RECORD.size
+    return data[position + EVENT_OFFSET] in EVENT_NAMES and data[end - 2:end] == b'\0\0'
+
+
+def read_sessions(path):
+    """
+    Lee un log binario: lista de (reloj de pared - monotónico, registros), una por sesión.
+    Se recorre registro a registro desde cada cabecera: una cabecera nueva solo se reconoce
+    en el límite de un registro (los campos de un registro pueden contener el magic).
+    Si lo que sigue no es ni cabecera ni registro válido, la sesión quedó cortada (proceso
+    terminado a mitad de una escritura): se descarta el resto y se busca la próxima cabecera.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(SESSION_PREFIX):
+        raise ValueError(f"{path} no es un log binario de BufferLogger")
+
+    sessions = []
+    position = 0
+    while position + FILE_HEADER.size <= len(data):
+        _, _, _, wall_offset = FILE_HEADER.unpack_from(data, position)
+        position += FILE_HEADER.size
+        records = []
+        while _is_record(data, position) and not data.startswith(SESSION_PREFIX, position):
+            records.append(RECORD.unpack_from(data, position))
+            position += RECORD.size
+        sessions.append((wall_offset, iter(records)))
+        if not data.startswith(SESSION_PREFIX, position):
+            position = data.find(SESSION_PREFIX, position + 1)
+            if position == -1:
+                break
+    return sessions
+
+
 class BufferLogger:
-    def __init__(self, log_file: str = "buffer.log", flush_interval: float = 2.0):
+    """
+    Log de eventos del buffer de reproducción sobre un anillo de registros binarios.
+    - binary=False: el hilo escritor formatea a texto en log_file cada flush_interval
+    - binary=True: se vuelcan los registros tal cual (decodificar con tools/decode_buffer_log.py)
+    Con debug=False, log_debug no hace nada y los estados repetidos de cada sondeo
+    ("Waiting for playback time", ...) se registran solo cuando cambian. Los mensajes
+    de debug son texto libre: van solo al log de texto.
+    """
+    def __init__(self, log_file: str = "buffer.log", flush_interval: float = 2.0,
+                 capacity: int = 8192, debug: bool = False, binary: bool = False):
         self.log_file = log_file
         self.flush_interval = flush_interval
-        self.log_queue = queue.Queue()
-        self.stop_event = threading.Event()
-
-        self.logger = logging.getLogger("BufferLogger")
-        self.logger.setLevel(logging.DEBUG)
+        self.capacity = capacity
+        self.debug_enabled = debug
+        self.binary = binary
 
-        fh = logging.FileHandler(self.log_file)
-        formatter = logging.Formatter('%(asctime)s - %(message)s')
-        fh.setFormatter(formatter)
+        self.ring = bytearray(capacity * RECORD.size)
+        self.sequence = itertools.count()  # next() es atómico con el GIL: sirve con varios productores
+        self.written = 0                   # Registros escritos (próxima secuencia libre)
+        self.read_position = 0
+        self.lost = 0
+        self.last_state = None
+        self.debug_messages = collections.deque(maxlen=capacity)
+        self.wall_offset = time.time() - time.monotonic()
 
-        self.logger.addHandler(fh)
+        self.file = open(log_file, 'ab' if binary else 'a')
+        if binary:
+            self.file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION, RECORD.size, self.wall_offset))
 
+        self.stop_event = threading.Event()
         self.thread = threading.Thread(target=self._writer_loop, daemon=True)
         self.thread.start()
 
+    def _record(self, event, frame_id=-1, buffer_ms=0.0, state=0, wait=0.0):
+        sequence = next(self.sequence)
+        RECORD.pack_into(self.ring, (sequence % self.capacity) * RECORD.size,
+                         time.monotonic(), buffer_ms, frame_id, wait or 0.0, event, state)
+        self.written = sequence + 1
+
     def _writer_loop(self):
-        while not self.stop_event.is_set():
+        while not self.stop_event.wait(self.flush_interval):
             try:
-                while not self.log_queue.empty():
-                    msg = self.log_queue.get_nowait()
-                    self.logger.debug(msg)
+                self._flush()
             except Exception as e:
                 print(f"[BufferLogger] Error writing log: {e}")
-            time.sleep(self.flush_interval)
+
+    def _flush(self):
+        end = self.written
+        start = self.read_position
+        if end - start > self.capacity:
+            # El escritor quedó más de una vuelta atrás: esos registros ya se pisaron
+            self.lost += end - start - self.capacity
+            start = end - self.capacity
+        self.read_position = end
+
+        chunks = []
+        for sequence in range(start, end):
+            offset = (sequence % self.capacity) * RECORD.size
+            chunks.append(bytes(self.ring[offset:offset + RECORD.size]))
+
+        if self.binary:
+            self.file.write(b''.join(chunks))
+        else:
+            lines = [format_record(*RECORD.unpack(chunk), wall_offset=self.wall_offset) for chunk in chunks]
+            while self.debug_messages:
+                t, message = self.debug_messages.popleft()
+                stamp = datetime.fromtimestamp(t + self.wall_offset).strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
+                lines.append(f"{stamp} - DEBUG: {message}")
+            if lines:
+                self.file.write("\n".join(lines) + "\n")
+        self.file.flush()
 
     def stop(self):
         self.stop_event.set()
         self.thread.join()
-        self._flush_remaining()
-
-    def _flush_remaining(self):
-        while not self.log_queue.empty():
-            msg = self.log_queue.get_nowait()
-            self.logger.debug(msg)
+        self._flush()
+        self.file.close()
+        if self.lost:
+            print(f"[BufferLogger] {self.lost} eventos perdidos (el escritor no dio abasto)")
 
     def log_debug(self, message: str):
-        self.log_queue.put(f"DEBUG: {message}")
+        # Los llamadores deben consultar debug_enabled antes de armar el mensaje
+        if self.debug_enabled:
+            self.debug_messages.append((time.monotonic(), message))
 
     def log_buffer_add(self, frame_id: int, buffer_ms: float):
-        self.log_queue.put(f"ADD: Frame {frame_id} added. Buffer: {buffer_ms:.2f}ms")
+        self._record(EV_ADD, frame_id, buffer_ms)
 
     def log_buffer_drop(self, frame_id: int):
-        self.log_queue.put(f"DROP: Frame {frame_id} discarded due to overflow.")
+        self._record(EV_DROP, frame_id)
 
     def log_buffer_state(self, state: str, buffer_ms: float, time_to_wait: Optional[float] = None):
-        if time_to_wait:
-            self.log_queue.put(f"STATE: {state}. Buffer: {buffer_ms:.2f}ms. Wait: {time_to_wait:.3f}s")
-        else:
-            self.log_queue.put(f"STATE: {state}. Buffer: {buffer_ms:.2f}ms")
+        if state == self.last_state and not self.debug_enabled:
+            return  # Mismo estado que en el sondeo anterior
+        self.last_state = state
+        self._record(EV_STATE, -1, buffer_ms, STATE_CODES.get(state, STATE_OTHER), time_to_wait)
 
     def log_resync_event(self, frame_id: int, buffer_ms: float):
-        self.log_queue.put(f"RESYNC: Keyframe {frame_id} triggered resync. Buffer: {buffer_ms:.2f}ms")
+        self._record(EV_RESYNC, frame_id, buffer_ms)
+
+    def log_playout_delay(self, frame_id: int, target_ms: float, actual_ms: float):
+        self._record(EV_DELAY, frame_id, actual_ms, 0, target_ms)
@@ -1,94 +1,133 @@
-import time
 import threading
 import logging
 
+from logger.metrics import REGISTRY, MetricsRegistry
+
+
 class FrameLogMetrics:
-    def __init__(self, interval_seconds=1, log_path='frame_metrics.log'):
+    """
+    Métricas del reensamblado y de las retransmisiones sobre el MetricsRegistry:
+    los log_* solo incrementan contadores por hilo o registran en histogramas (sin lock
+    ni time.time() por paquete). Un hilo aparte escribe cada interval_seconds una línea
+    de resumen en log_path, con un logger propio (no toca el logger raíz).
+    """
+    def __init__(self, interval_seconds=1, log_path='frame_metrics.log', registry: MetricsRegistry = REGISTRY):
         self.interval = interval_seconds
         self.log_path = log_path
 
         # Contadores
-        self.total_chunks = 0
-        self.frame_complete = 0
-        self.frame_partial = 0
-        self.frame_expired = 0
-        self.total_chunks_per_frame = 0
-        self.total_frames = 0
-        self.total_latency_per_frame = 0.0
-
-
-        # Inicialización de logging
-        logging.basicConfig(
-            filename=self.log_path,
-            level=logging.INFO,
-            format='%(asctime)s - %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-
-        # Temporizador
-        self.lock = threading.Lock()
-        self.last_report_time = time.time()
-
-    def _check_and_report(self):
-        now = time.time()
-        with self.lock:
-            if now - self.last_report_time >= self.interval:
-                self._report_locked()
-                self._reset_counters_locked()
-                self.last_report_time = now
-
-    def _reset_counters_locked(self):
-        self.total_chunks = 0
-        self.frame_complete = 0
-        self.frame_partial = 0
-        self.frame_expired = 0
-        self.total_chunks_per_frame = 0
-        self.total_frames = 0
-
-    def _report_locked(self):
-        # Ya estamos dentro del lock
+        self.chunks_received = registry.counter('chunks_received_total', "Chunks de datos recibidos")
+        self.frame_complete = registry.counter('frames_complete_total', "Frames completos entregados")
+        self.frame_partial = registry.counter('frames_partial_total', "Frames parciales entregados con ocultamiento")
+        self.frame_expired = registry.counter('frames_expired_total', "Frames descartados por incompletos")
+        self.frame_skipped = registry.counter('frames_skipped_total', "Frames que nunca llegaron")
+        self.fec_recovered_chunks = registry.counter('fec_recovered_chunks_total', "Chunks reconstruidos por FEC")
+        self.nack_sent = registry.counter('nack_requested_chunks_total', "Chunks pedidos por NACK")
+        self.nack_late = registry.counter('nack_late_retransmits_total', "Retransmisiones que llegaron tarde")
+        self.nack_recovered_frames = registry.counter('nack_recovered_frames_total', "Frames completados por NACK")
+        self.retransmit_hits = registry.counter('retransmit_cache_hits_total', "Chunks pedidos encontrados en la caché")
+        self.retransmit_misses = registry.counter('retransmit_cache_misses_total', "Chunks pedidos ya desalojados")
+
+        # Distribuciones (los promedios esconden los picos del p99)
+        self.frame_latency = registry.histogram('frame_latency_seconds',
+                                                "Latencia media de los chunks de cada frame completo", scale=1e6)
+        self.chunks_per_frame = registry.histogram('chunks_per_frame', "Chunks recibidos por frame")
+
+        # Logger propio con su archivo
+        self.logger = logging.getLogger(f"FrameLogMetrics.{log_path}")
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = logging.FileHandler(log_path)
+            handler.setFormatter(logging.Formatter('%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+            self.logger.addHandler(handler)
+
+        self.last_values = {}
+        self.last_latency = None  # Buckets del histograma en el reporte anterior
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._report_loop, daemon=True)
+        self.thread.start()
+
+    def _delta(self, name, counter):
+        value = counter.value()
+        delta = value - self.last_values.get(name, 0)
+        self.last_values[name] = value
+        return delta
+
+    def _report_loop(self):
+        while not self.stop_event.wait(self.interval):
+            self.report()
+
+    def report(self):
         try:
-            avg_chunks = (self.total_chunks_per_frame / self.total_frames) if self.total_frames > 0 else 0
-            avg_latency = (self.total_latency_per_frame / self.total_frames) if self.total_frames > 0 else 0.0
+            complete = self._delta('complete', self.frame_complete)
+            partial = self._delta('partial', self.frame_partial)
+            expired = self._delta('expired', self.frame_expired)
+            hits = self._delta('hits', self.retransmit_hits)
+            misses = self._delta('misses', self.retransmit_misses)
+            lookups = hits + misses
+            hit_rate = (hits / lookups) if lookups > 0 else 0.0
+            # Como el resto de la línea, solo el último intervalo (el acumulado esconde los picos)
+            latency, self.last_latency = self.frame_latency.interval_quantiles(self.last_latency, (0.5, 0.99))
 
             log_msg = (
-                f"Frames: {self.total_frames} | "
-                f"Completos: {self.frame_complete} | "
-                f"Parciales: {self.frame_partial} | "
-                f"Vencidos: {self.frame_expired} | "
-                f"Chunks totales: {self.total_chunks} | "
-                f"Chunks por frame (prom.): {avg_chunks:.2f} | "
-                f"Latencia promedio (s): {avg_latency:.4f}"
+                f"Frames: {complete + partial + expired} | "
+                f"Completos: {complete} | "
+                f"Parciales: {partial} | "
+                f"Vencidos: {expired} | "
+                f"Saltados: {self._delta('skipped', self.frame_skipped)} | "
+                f"Chunks recuperados FEC: {self._delta('fec', self.fec_recovered_chunks)} | "
+                f"NACK pedidos: {self._delta('nack', self.nack_sent)} | "
+                f"NACK tardíos: {self._delta('late', self.nack_late)} | "
+                f"Frames recuperados NACK: {self._delta('nack_frames', self.nack_recovered_frames)} | "
+                f"Hit rate caché: {hit_rate:.2%} | "
+                f"Chunks totales: {self._delta('chunks', self.chunks_received)} | "
+                f"Latencia p50/p99 (s): {latency[0.5]:.4f}/{latency[0.99]:.4f}"
             )
 
-            logging.info(log_msg)
+            self.logger.info(log_msg)
         except Exception as e:
-            logging.error(f"[ERROR] Al registrar métricas: {e}")
+            self.logger.error(f"[ERROR] Al registrar métricas: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.report()
 
     # Métodos públicos de log
     def log_chunk_received(self):
-        with self.lock:
-            self.total_chunks += 1
-        self._check_and_report()
+        self.chunks_received.inc()
 
     def log_frame_complete(self, received_chunks, avg_latency):
-        with self.lock:
-            self.frame_complete += 1
-            self.total_frames += 1
-            self.total_chunks_per_frame += received_chunks
-            self.total_latency_per_frame += avg_latency
-        self._check_and_report()
+        self.frame_complete.inc()
+        self.chunks_per_frame.record(received_chunks)
+        self.frame_latency.record(avg_latency)
 
     def log_frame_partial(self, received_chunks):
-        with self.lock:
-            self.frame_partial += 1
-            self.total_frames += 1
-            self.total_chunks_per_frame += received_chunks
-        self._check_and_report()
+        self.frame_partial.inc()
+        self.chunks_per_frame.record(received_chunks)
 
     def log_frame_expired(self, received_chunks):
-        with self.lock:
-            self.frame_expired += 1
-            self.total_frames += 1
-            self.total_chunks_per_frame += received_chunks
-        self._check_and_report()
+        self.frame_expired.inc()
+        self.chunks_per_frame.record(received_chunks)
+
+    def log_frames_skipped(self, count):
+        self.frame_skipped.inc(count)
+
+    def log_fec_recovered(self, chunks):
+        self.fec_recovered_chunks.inc(chunks)
+
+    def log_nack_sent(self, requested_chunks):
+        self.nack_sent.inc(requested_chunks)
+
+    def log_late_retransmit(self):
+        self.nack_late.inc()
+
+    def log_nack_recovered_frame(self):
+        self.nack_recovered_frames.inc()
+
+    def log_retransmit_lookup(self, hit):
+        if hit:
+            self.retransmit_hits.inc()
+        else:
+            self.retransmit_misses.inc()
@@ -0,0 +1,180 @@
+import json
+
+import numpy as np
+
+from encoder.chunker import HEADER
+from udp_connection.clocksync import stream_time
+
+# Etapas de un frame, en orden; cada marca es el instante en que termina la etapa, en el
+# reloj de las cabeceras (stream_time() del servidor; en el cliente, estimado con ClockSync).
+# Las del servidor y las del cliente quedan en procesos distintos: se unen por
+# (frame_id, instante de la cabecera), que ambos lados conocen.
+STAGES = ('capture', 'resize', 'encode', 'chunk', 'first_send', 'last_send',
+          'first_receive', 'last_receive', 'reassembled', 'buffered', 'decoded', 'displayed')
+STAGE_INDEX = {name: index for index, name in enumerate(STAGES)}
+CLIENT_STAGES = STAGES[STAGE_INDEX['first_receive']:]
+# Cada etapa se mide desde la marca anterior presente, salvo estas: el primer paquete
+# puede llegar antes de que termine el envío del frame, así que la red se mide entre primeros
+STAGE_REFERENCE = {'first_receive': 'first_send'}
+
+# Límites de los histogramas en ms (escala aproximadamente logarítmica)
+HISTOGRAM_BINS_MS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 8, 12, 16, 25, 33, 50, 75, 100, 150, 250, 500, 1000)
+
+
+class FrameTracer:
+    """
+    Anillo de spans por frame: una fila por frame_id (módulo capacity) y una columna por etapa.
+    Marcar es escribir un float en un arreglo preasignado, sin lock ni asignaciones:
+    cada etapa la escribe un solo hilo y una fila solo se reutiliza cuando el frame_id dio la vuelta.
+    """
+    def __init__(self, capacity: int = 4096, clock=None):
+        if capacity <= 0 or 65536 % capacity:
+            raise ValueError("capacity debe ser una potencia de 2 hasta 65536")
+        # En el cliente, con un ClockSync las marcas quedan en el reloj del servidor
+        self.now = clock.server_now if clock else stream_time
+        self.mask = capacity - 1
+        self.times = np.full((capacity, len(STAGES)), np.nan)
+        self.frame_ids = np.full(capacity, -1, dtype=np.int32)
+        self.origins = np.zeros(capacity)  # Instante de la cabecera de chunks del frame
+
+    def _row(self, frame_id: int, origin: float) -> int:
+        row = frame_id & self.mask
+        if self.frame_ids[row] != frame_id or self.origins[row] != origin:
+            self.times[row] = np.nan
+            self.frame_ids[row] = frame_id
+            self.origins[row] = origin
+        return row
+
+    def mark(self, frame_id: int, origin: float, stage: str, t: float = None):
+        self.times[self._row(frame_id, origin), STAGE_INDEX[stage]] = self.now() if t is None else t
+
+    def mark_first(self, frame_id: int, origin: float, stage: str, t: float):
+        """Como mark, pero conserva la primera marca (p. ej. primer envío entre varios clientes)."""
+        row = self._row(frame_id, origin)
+        column = STAGE_INDEX[stage]
+        if self.times[row, column] != self.times[row, column]:  # NaN: todavía sin marca
+            self.times[row, column] = t
+
+    def mark_chunked(self, chunks, stage_times=None):
+        """Marca captura, escalado y codificación (instantes de la fuente) y el fin del chunking."""
+        first = chunks[0]
+        header = first[0] if isinstance(first, tuple) else first
+        frame_id, _, _, _, _, timestamp = HEADER.unpack_from(header)
+        if stage_times is not None:
+            for stage, t in zip(('capture', 'resize', 'encode'), stage_times):
+                self.mark(frame_id, timestamp, stage, t)
+        self.mark(frame_id, timestamp, 'chunk')
+
+    def mark_sent(self, chunks, started: float, finished: float):
+        first = chunks[0]
+        header = first[0] if isinstance(first, tuple) else first
+        frame_id, _, _, _, _, timestamp = HEADER.unpack_from(header)
+        self.mark_first(frame_id, timestamp, 'first_send', started)
+        self.mark(frame_id, timestamp, 'last_send', finished)
+
+    def spans(self):
+        """Copia de las filas con al menos una marca: (frame_ids, origins, times)."""
+        used = (self.frame_ids >= 0) & ~np.all(np.isnan(self.times), axis=1)
+        return self.frame_ids[used].copy(), self.origins[used].copy(), self.times[used].copy()
+
+    def save(self, path):
+        frame_ids, origins, times = self.spans()
+        np.savez(path, frame_ids=frame_ids, origins=origins, times=times, stages=np.array(STAGES))
+        print(f"[TRACE] {len(frame_ids)} spans guardados en {path}")
+
+
+def load_spans(paths):
+    """
+    Une los spans de varios archivos (servidor y cliente) por (frame_id, origen).
+    Devuelve (frame_ids (n,), tiempos (n, etapas)).
+    """
+    merged = {}
+    for path in paths:
+        data = np.load(path)
+        columns = [STAGE_INDEX[str(name)] for name in data['stages']]
+        for frame_id, origin, row in zip(data['frame_ids'], data['origins'], data['times']):
+            times = merged.setdefault((int(frame_id), float(origin)), np.full(len(STAGES), np.nan))
+            for column, t in zip(columns, row):
+                if t == t:
+                    times[column] = t
+    if not merged:
+        return np.empty(0, dtype=np.int64), np.empty((0, len(STAGES)))
+    keys = sorted(merged, key=lambda key: key[1])
+    return np.array([key[0] for key in keys], dtype=np.int64), np.array([merged[key] for key in keys])
+
+
+def _intervals(times):
+    """(etapa, inicio, fin) de cada etapa marcada de un frame."""
+    previous = None
+    for column, stage in enumerate(STAGES):
+        t = times[column]
+        if t != t:
+            continue
+        start = previous
+        if stage in STAGE_REFERENCE:
+            reference = times[STAGE_INDEX[STAGE_REFERENCE[stage]]]
+            start = reference if reference == reference else previous
+        if start is not None:
+            yield stage, start, t
+        previous = t
+
+
+def stage_latencies(spans: np.ndarray) -> dict:
+    """Duración en ms de cada etapa por frame (ver STAGE_REFERENCE)."""
+    latencies = {stage: [] for stage in STAGES[1:]}
+    for times in spans:
+        for stage, start, end in _intervals(times):
+            latencies[stage].append((end - start) * 1000.0)
+    return {stage: np.array(values) for stage, values in latencies.items() if values}
+
+
+def stage_histograms(spans: np.ndarray, bins_ms=HISTOGRAM_BINS_MS) -> dict:
+    """Por etapa: percentiles y cantidad de frames en cada intervalo de bins_ms (el último abierto)."""
+    edges = np.array([0.0, *bins_ms, np.inf])
+    report = {}
+    for stage, values in stage_latencies(spans).items():
+        counts, _ = np.histogram(values, bins=edges)
+        report[stage] = {
+            'frames': int(len(values)),
+            'mean_ms': float(values.mean()),
+            'p50_ms': float(np.percentile(values, 50)),
+            'p95_ms': float(np.percentile(values, 95)),
+            'p99_ms': float(np.percentile(values, 99)),
+            'max_ms': float(values.max()),
+            'bins_ms': list(bins_ms),
+            'counts': counts.tolist(),
+        }
+    total = spans[:, -1] - np.nanmin(spans, axis=1) if len(spans) else np.empty(0)
+    total = total[~np.isnan(total)] * 1000.0
+    if len(total):
+        report['total'] = {'frames': int(len(total)), 'p50_ms': float(np.percentile(total, 50)),
+                           'p99_ms': float(np.percentile(total, 99))}
+    return report
+
+
+def chrome_trace(frame_ids: np.ndarray, spans: np.ndarray) -> dict:
+    """
+    Eventos en formato Trace Event de Chrome (chrome://tracing, Perfetto): un evento
+    completo por etapa y frame, servidor y cliente como procesos, una pista por etapa.
+    Cada evento lleva el frame_id, el mismo de los logs del reensamblado y del playback.
+    """
+    events = []
+    for pid, name in ((1, 'servidor'), (2, 'cliente')):
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': name}})
+    for column, stage in enumerate(STAGES[1:], start=1):
+        pid = 2 if stage in CLIENT_STAGES else 1
+        events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': column, 'args': {'name': stage}})
+
+    for frame_id, times in zip(frame_ids, spans):
+        for stage, start, end in _intervals(times):
+            events.append({
+                'name': stage, 'ph': 'X', 'ts': start * 1e6, 'dur': (end - start) * 1e6,
+                'pid': 2 if stage in CLIENT_STAGES else 1, 'tid': STAGE_INDEX[stage],
+                'args': {'frame_id': int(frame_id)},
+            })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+def write_chrome_trace(frame_ids: np.ndarray, spans: np.ndarray, path):
+    with open(path, 'w') as f:
+        json.dump(chrome_trace(frame_ids, spans), f)
@@ -0,0 +1,291 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Métricas sin lock en el camino caliente:
+# - Counter: cada hilo incrementa su propia celda; se suman al leer (scrape)
+# - Histogram: buckets log-lineales estilo HDR por hilo (error relativo ~3%), fusionados al leer
+# - Gauge: valor fijado o función evaluada solo al leer (p. ej. queue.qsize)
+# MetricsExporter escribe periódicamente un archivo de texto de Prometheus (node_exporter
+# textfile collector) y opcionalmente lo sirve por HTTP en localhost.
+
+SUB_BUCKET_BITS = 5                    # 32 sub-buckets por potencia de 2
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_SHIFT = 40                         # Valores hasta ~2^46 unidades
+HISTOGRAM_BUCKETS = (MAX_SHIFT + 2) * SUB_BUCKETS
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+
+def bucket_index(value: int) -> int:
+    if value < 2 * SUB_BUCKETS:
+        return max(value, 0)
+    shift = min(value.bit_length() - SUB_BUCKET_BITS - 1, MAX_SHIFT)
+    return (shift + 1) * SUB_BUCKETS + min((value >> shift) - SUB_BUCKETS, SUB_BUCKETS - 1)
+
+
+def bucket_bounds(index: int):
+    """Rango [desde, hasta) de valores que caen en el bucket."""
+    if index < 2 * SUB_BUCKETS:
+        return index, index + 1
+    shift = index // SUB_BUCKETS - 1
+    mantissa = index % SUB_BUCKETS + SUB_BUCKETS
+    return mantissa << shift, (mantissa + 1) << shift
+
+
+class _PerThread:
+    """Una celda por hilo, creada la primera vez que el hilo escribe; la lista global solo crece con hilos nuevos."""
+    def __init__(self, factory):
+        self.factory = factory
+        self.local = threading.local()
+        self.cells = []
+        self.lock = threading.Lock()
+
+    def cell(self):
+        try:
+            return self.local.cell
+        except AttributeError:
+            cell = self.factory()
+            with self.lock:
+                self.cells.append(cell)
+            self.local.cell = cell
+            return cell
+
+
+class Counter:
+    def __init__(self, name, help_text=''):
+        self.name = name
+        self.help = help_text
+        self.cells = _PerThread(lambda: [0])
+
+    def inc(self, amount=1):
+        self.cells.cell()[0] += amount
+
+    def value(self):
+        with self.cells.lock:
+            return sum(cell[0] for cell in self.cells.cells)
+
+    def render(self):
+        return [f"{self.name} {self.value()}"]
+
+
+class Gauge:
+    def __init__(self, name, help_text='', fn=None):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.current = 0
+
+    def set(self, value):
+        self.current = value
+
+    def value(self):
+        if self.fn is None:
+            return self.current
+        try:
+            return self.fn()
+        except Exception:
+            return float('nan')  # La fuente ya no existe (p. ej. worker detenido)
+
+    def render(self):
+        return [f"{self.name} {self.value()}"]
+
+
+class Histogram:
+    """
+    Histograma HDR simplificado. Los valores se registran como enteros en la unidad
+    indicada por scale (p. ej. scale=1e6 para registrar segundos con resolución de µs)
+    y se exportan de nuevo en la unidad original.
+    """
+    def __init__(self, name, help_text='', scale=1.0):
+        self.name = name
+        self.help = help_text
+        self.scale = scale
+        # Celda por hilo: [buckets, cantidad, suma]
+        self.cells = _PerThread(lambda: [[0] * HISTOGRAM_BUCKETS, 0, 0.0])
+
+    def record(self, value):
+        cell = self.cells.cell()
+        cell[0][bucket_index(int(value * self.scale))] += 1
+        cell[1] += 1
+        cell[2] += value
+
+    def merged(self):
+        """(buckets, cantidad, suma) de todos los hilos."""
+        buckets = [0] * HISTOGRAM_BUCKETS
+        count = 0
+        total = 0.0
+        with self.cells.lock:
+            cells = list(self.cells.cells)
+        for cell_buckets, cell_count, cell_sum in cells:
+            for index, hits in enumerate(cell_buckets):
+                if hits:
+                    buckets[index] += hits
+            count += cell_count
+            total += cell_sum
+        return buckets, count, total
+
+    def quantiles(self, quantiles=SUMMARY_QUANTILES):
+        buckets, count, _ = self.merged()
+        return self._quantiles(buckets, count, quantiles)
+
+    def interval_quantiles(self, previous, quantiles=SUMMARY_QUANTILES):
+        """
+        Cuantiles solo de lo registrado desde previous (un merged() anterior, o None).
+        Devuelve (cuantiles, merged actual) para pasar como previous la próxima vez.
+        """
+        current = self.merged()
+        buckets, count, _ = current
+        if previous is not None:
+            buckets = [now - before for now, before in zip(buckets, previous[0])]
+            count -= previous[1]
+        return self._quantiles(buckets, count, quantiles), current
+
+    def _quantiles(self, buckets, count, quantiles):
+        result = {}
+        if count == 0:
+            return {q: float('nan') for q in quantiles}
+        targets = sorted(quantiles)
+        seen = 0
+        position = 0
+        for index, hits in enumerate(buckets):
+            if not hits:
+                continue
+            seen += hits
+            while position < len(targets) and seen >= targets[position] * count:
+                low, high = bucket_bounds(index)
+                result[targets[position]] = (low + high - 1) / 2 / self.scale
+                position += 1
+            if position == len(targets):
+                break
+        return result
+
+    def render(self):
+        _, count, total = self.merged()
+        lines = [f'{self.name}{{quantile="{q}"}} {v}' for q, v in self.quantiles().items()]
+        lines.append(f"{self.name}_sum {total}")
+        lines.append(f"{self.name}_count {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Registro de métricas por nombre; pedir dos veces el mismo nombre devuelve la misma métrica."""
+    TYPES = {Counter: 'counter', Gauge: 'gauge', Histogram: 'summary'}
+
+    def __init__(self, prefix='screenstream_'):
+        self.prefix = prefix
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        name = self.prefix + name
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, help_text, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"La métrica {name} ya existe con otro tipo")
+            return metric
+
+    def counter(self, name, help_text='') -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name, help_text='', scale=1.0) -> Histogram:
+        return self._get(Histogram, name, help_text, scale=scale)
+
+    def gauge(self, name, help_text='', fn=None) -> Gauge:
+        gauge = self._get(Gauge, name, help_text)
+        if fn is not None:
+            gauge.fn = fn  # Un worker nuevo reemplaza la función del anterior
+        return gauge
+
+    def render_prometheus(self) -> str:
+        with self.lock:
+            metrics = sorted(self.metrics.values(), key=lambda metric: metric.name)
+        lines = []
+        for metric in metrics:
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {self.TYPES[type(metric)]}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """Valores actuales: contadores y gauges como número, histogramas como cuantiles + cantidad."""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        result = {}
+        for metric in metrics:
+            if isinstance(metric, Histogram):
+                _, count, total = metric.merged()
+                result[metric.name] = {'count': count, 'sum': total, **metric.quantiles()}
+            else:
+                result[metric.name] = metric.value()
+        return result
+
+
+REGISTRY = MetricsRegistry()
+
+
+class MetricsExporter:
+    """
+    Escribe el registro en formato de texto de Prometheus cada interval segundos
+    (reemplazo atómico del archivo) y, con http_port, lo sirve en http://127.0.0.1:<puerto>/metrics.
+    """
+    def __init__(self, registry: MetricsRegistry = REGISTRY, path=None, interval: float = 5.0,
+                 http_port=None):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self.http_port = http_port
+        self.http_server = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        if self.http_port is not None:
+            registry = self.registry
+
+            class Handler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.rstrip('/') not in ('', '/metrics'):
+                        self.send_error(404)
+                        return
+                    body = registry.render_prometheus().encode()
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, *args):
+                    pass  # Sin una línea por scrape en la consola
+
+            self.http_server = ThreadingHTTPServer(('127.0.0.1', self.http_port), Handler)
+            self.http_server.daemon_threads = True
+            threading.Thread(target=self.http_server.serve_forever, daemon=True).start()
+            print(f"[METRICS] Sirviendo en http://127.0.0.1:{self.http_port}/metrics")
+        if self.path is not None:
+            self.thread.start()
+
+    def write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.registry.render_prometheus())
+        os.replace(tmp_path, self.path)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"[METRICS] Error escribiendo {self.path}: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        if self.path is not None:
+            self.write()  # Último snapshot
+        if self.http_server is not None:
+            self.http_server.shutdown()
+            self.http_server.server_close()
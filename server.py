@@ -1,25 +1,86 @@
 import time
 from udp_connection.udp_server import UDPServer
-from encoder.screencapturer import ScreenCapturer
+from encoder.framesource import open_frame_source
+from encoder.fec import FecEncoder
+from udp_connection.nack import RetransmitCache
+from udp_connection.subscribers import SubscriberRegistry
+from logger.frametracer import FrameTracer
+from logger.metrics import REGISTRY, MetricsExporter
 
 WIDTH, HEIGHT = 800, 600
 FPS = 60
 PAYLOAD_SIZE = 1400
 BUFFER_SIZE = PAYLOAD_SIZE + 16  # Cabecera actualizada a 16 bytes
+ZERO_COPY = True  # Envía cabecera + vista del payload con sendmsg, sin concatenar
+BATCH_SEND = True  # Agrupa los chunks de cada frame en llamadas sendmmsg
+FEC_SCHEME = None  # 'xor' o 'rs' para agregar paquetes de paridad a cada frame
+FEC_PARITY = 4
+NACK_ENABLED = False  # Responde NACKs del cliente desde una caché de chunks recientes
+TILE_DELTA = False  # Envía solo los tiles que cambiaron (keyframe completo cada segundo)
+CLIENT_TIMEOUT_S = 10.0  # Se da de baja a un cliente sin heartbeat durante este tiempo
+MULTICAST_GROUP = None  # p. ej. '239.1.1.1': un solo envío por frame al grupo, control por unicast
+MULTICAST_PORT = 5006
+MULTICAST_TTL = 1  # 1 = no sale de la red local
+MULTICAST_INTERFACE = '0.0.0.0'  # '127.0.0.1' para probar en un solo equipo por loopback
+MONITOR = 1  # Índice de monitor de mss (1 = pantalla principal, 0 = todos juntos)
+RECORD_PATH = None  # p. ej. 'sesion.sfr': graba los frames transmitidos para reproducirlos luego
+REPLAY_PATH = None  # Transmite una grabación .sfr en lugar de capturar la pantalla
+REPLAY_SPEED = 1.0  # 1.0 = tiempos originales, 2.0 = al doble, 0 = sin esperas
+REPLAY_LOOP = False
+METRICS_PATH = None  # p. ej. 'server_metrics.prom': snapshot periódico en formato de Prometheus
+METRICS_HTTP_PORT = None  # p. ej. 9100: sirve las métricas en http://127.0.0.1:<puerto>/metrics
+TRACE_PATH = None  # p. ej. 'server_trace.npz': instantes por etapa de cada frame (ver tools/trace_report.py)
 
-server = UDPServer(port=5005, buffer_size=BUFFER_SIZE)
+tracer = FrameTracer() if TRACE_PATH else None
+
+server = UDPServer(port=5005, buffer_size=BUFFER_SIZE, zero_copy=ZERO_COPY, batch_send=BATCH_SEND,
+                   fec=FecEncoder(FEC_SCHEME, FEC_PARITY) if FEC_SCHEME else None,
+                   retransmit_cache=RetransmitCache() if NACK_ENABLED else None,
+                   multicast_group=MULTICAST_GROUP, multicast_port=MULTICAST_PORT,
+                   multicast_ttl=MULTICAST_TTL, multicast_interface=MULTICAST_INTERFACE,
+                   tracer=tracer)
 server.set_socket()
 server.bind()
 
-encoder = ScreenCapturer(width=WIDTH, height=HEIGHT, fps=FPS)
+encoder = open_frame_source(width=WIDTH, height=HEIGHT, fps=FPS, tile_delta=TILE_DELTA, monitor=MONITOR,
+                            record_path=RECORD_PATH, replay_path=REPLAY_PATH,
+                            replay_speed=REPLAY_SPEED, replay_loop=REPLAY_LOOP)
+
+# Clientes suscriptos: cada frame se codifica una vez y se reparte a todos
+registry = SubscriberRegistry(server, timeout_s=CLIENT_TIMEOUT_S,
+                              on_join=lambda addr: encoder.request_keyframe(),
+                              on_keyframe_request=lambda addr: encoder.request_keyframe())
+
+
+exporter = None
+if METRICS_PATH or METRICS_HTTP_PORT:
+    registry.register_metrics(REGISTRY)
+    exporter = MetricsExporter(path=METRICS_PATH, http_port=METRICS_HTTP_PORT)
+    exporter.start()
+
+
+def handle_control(timeout=0.0):
+    """Altas, bajas y heartbeats de los clientes (los NACK se atienden en poll_control)."""
+    for data, addr in server.poll_control(timeout):
+        registry.handle_message(data, addr)
+    registry.expire()
+
 
 print("[SERVER] Esperando conexión del cliente...")
-_, client_addr = server.receive()
-print(f"[SERVER] Cliente detectado: {client_addr}")
+while registry.count() == 0:
+    handle_control(timeout=None)
 
 try:
     for frame in encoder:
-        server.toggle_pause(client_addr)
+        handle_control()
+
+        was_paused = server.is_paused()
+        if server.toggle_pause() != was_paused:
+            for addr in registry.control_addresses():
+                if server.is_paused():
+                    server.send_pause(addr)
+                else:
+                    server.send_resume(addr)
 
         if server.should_stop():
             print("[SERVER] 'q' presionado. Finalizando transmisión.")
@@ -31,10 +92,17 @@ try:
         # 🔹 Nuevo: determinar si es keyframe y el quality_id
         is_keyframe, quality_id = encoder.is_keyframe()
 
-        # 🔹 Enviar chunks con la nueva cabecera
-        server.send_frame_chunks(frame, client_addr, quality_id, is_keyframe)
+        # 🔹 Dividir una sola vez y encolar para cada cliente
+        chunks = server.build_chunks(frame, quality_id, is_keyframe)
+        if tracer:
+            tracer.mark_chunked(chunks, encoder.stage_times)
+        registry.broadcast(chunks)
 
-    server.send_eof(client_addr)
+    registry.close()
 
 finally:
     encoder.release()
+    if tracer:
+        tracer.save(TRACE_PATH)
+    if exporter:
+        exporter.stop()
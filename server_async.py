@@ -0,0 +1,100 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import keyboard
+
+from encoder.framesource import FrameSource, open_frame_source
+from encoder.chunker import Chunker
+from encoder.fec import FecEncoder
+from udp_connection.nack import RetransmitCache
+from udp_connection.async_transport import AsyncUDPServer
+from logger.frametracer import FrameTracer
+
+# Variante asyncio de server.py / server_threads.py: la red corre en un solo event loop
+# y solo la captura + codificación + división en chunks va a un executor.
+
+# Configuración
+WIDTH, HEIGHT = 800, 600
+FPS = 60
+PAYLOAD_SIZE = 1400
+FEC_SCHEME = None  # 'xor' o 'rs' para agregar paquetes de paridad a cada frame
+FEC_PARITY = 4
+NACK_ENABLED = False  # Responde NACKs del cliente desde una caché de chunks recientes
+TILE_DELTA = False  # Envía solo los tiles que cambiaron (keyframe completo cada segundo)
+CLIENT_TIMEOUT_S = 10.0  # Se da de baja a un cliente sin heartbeat durante este tiempo
+MONITOR = 1  # Índice de monitor de mss (1 = pantalla principal, 0 = todos juntos)
+RECORD_PATH = None  # p. ej. 'sesion.sfr': graba los frames transmitidos para reproducirlos luego
+REPLAY_PATH = None  # Transmite una grabación .sfr en lugar de capturar la pantalla
+REPLAY_SPEED = 1.0  # 1.0 = tiempos originales, 2.0 = al doble, 0 = sin esperas
+REPLAY_LOOP = False
+TRACE_PATH = None  # p. ej. 'server_trace.npz': instantes por etapa de cada frame (ver tools/trace_report.py)
+
+
+def encode_next(encoder: FrameSource, chunker: Chunker, tracer: FrameTracer = None):
+    """Corre en el executor: captura, codifica y divide un frame (None si la fuente terminó)."""
+    frame = next(encoder, None)
+    if frame is None:
+        return None
+    is_keyframe, quality_id = encoder.is_keyframe()
+    chunks = chunker.chunk_frame(frame, quality_id, is_keyframe)
+    if tracer:
+        tracer.mark_chunked(chunks, encoder.stage_times)
+    return chunks
+
+
+async def main():
+    loop = asyncio.get_running_loop()
+    encoder = open_frame_source(width=WIDTH, height=HEIGHT, fps=FPS, tile_delta=TILE_DELTA, monitor=MONITOR,
+                                record_path=RECORD_PATH, replay_path=REPLAY_PATH,
+                                replay_speed=REPLAY_SPEED, replay_loop=REPLAY_LOOP)
+    chunker = Chunker(payload_size=PAYLOAD_SIZE,
+                      fec=FecEncoder(FEC_SCHEME, FEC_PARITY) if FEC_SCHEME else None)
+    tracer = FrameTracer() if TRACE_PATH else None
+    server = AsyncUDPServer(port=5005, client_timeout_s=CLIENT_TIMEOUT_S, tracer=tracer,
+                            retransmit_cache=RetransmitCache() if NACK_ENABLED else None,
+                            on_join=lambda addr: encoder.request_keyframe(),
+                            on_keyframe_request=lambda addr: encoder.request_keyframe())
+
+    # Un solo hilo: mss debe usarse siempre desde el hilo que lo creó
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encoder")
+    stop = asyncio.Event()
+    paused = False
+
+    def toggle_pause():
+        nonlocal paused
+        paused = not paused
+        print(f"[ASYNC SERVER] {'PAUSADO' if paused else 'REANUDADO'}")
+        server.send_control(b'PAUSE' if paused else b'RESUME')
+        if not paused:
+            encoder.request_keyframe()
+
+    # Teclas por callback (sin sondeo): el hilo de keyboard reenvía al loop
+    keyboard.add_hotkey('p', lambda: loop.call_soon_threadsafe(toggle_pause))
+    keyboard.add_hotkey('q', lambda: loop.call_soon_threadsafe(stop.set))
+
+    await server.start()
+    print("[ASYNC SERVER] Esperando conexión del cliente...")
+    await server.wait_for_subscriber()
+
+    try:
+        while not stop.is_set():
+            chunks = await loop.run_in_executor(executor, encode_next, encoder, chunker, tracer)
+            if chunks is None:
+                print("[ASYNC SERVER] La fuente no tiene más frames.")
+                break
+            if not paused:
+                server.broadcast(chunks)
+        print("[ASYNC SERVER] 'q' presionado. Finalizando transmisión.")
+    finally:
+        server.close()
+        executor.submit(encoder.release).result()
+        executor.shutdown()
+        if tracer:
+            tracer.save(TRACE_PATH)
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("[MAIN] Interrupción manual detectada.")
@@ -1,6 +1,12 @@
-from encoder.screencapturer import ScreenCapturer
+from encoder.framesource import open_frame_source
 from encoder.chunker import Chunker
+from encoder.fec import FecEncoder
+from encoder.parallelencoder import ParallelJpegEncoder
 from udp_connection.udp_server import UDPServer
+from udp_connection.nack import RetransmitCache
+from logger.framelogmetrics import FrameLogMetrics
+from logger.frametracer import FrameTracer
+from logger.metrics import REGISTRY, MetricsExporter
 
 from workers.encoder.screencapture_worker import ScreenCaptureWorker
 from workers.encoder.chunker_worker import ChunkerWorker
@@ -12,16 +18,51 @@ WIDTH, HEIGHT = 800, 600
 FPS = 60
 PAYLOAD_SIZE = 1400
 BUFFER_SIZE = PAYLOAD_SIZE + 16
+BATCH_SEND = True  # Agrupa los chunks de cada frame en llamadas sendmmsg
+FEC_SCHEME = None  # 'xor' o 'rs' para agregar paquetes de paridad a cada frame
+FEC_PARITY = 4
+NACK_ENABLED = False  # Responde NACKs del cliente desde una caché de chunks recientes
+TILE_DELTA = False  # Envía solo los tiles que cambiaron (keyframe completo cada segundo)
+CLIENT_TIMEOUT_S = 10.0  # Se da de baja a un cliente sin heartbeat durante este tiempo
+MULTICAST_GROUP = None  # p. ej. '239.1.1.1': un solo envío por frame al grupo, control por unicast
+MULTICAST_PORT = 5006
+MULTICAST_TTL = 1  # 1 = no sale de la red local
+MULTICAST_INTERFACE = '0.0.0.0'  # '127.0.0.1' para probar en un solo equipo por loopback
+ENCODER_WORKERS = 0  # Procesos para codificar JPEG en paralelo (0 = en el hilo de captura)
+MONITOR = 1  # Índice de monitor de mss (1 = pantalla principal, 0 = todos juntos)
+RECORD_PATH = None  # p. ej. 'sesion.sfr': graba los frames transmitidos para reproducirlos luego
+REPLAY_PATH = None  # Transmite una grabación .sfr en lugar de capturar la pantalla
+REPLAY_SPEED = 1.0  # 1.0 = tiempos originales, 2.0 = al doble, 0 = sin esperas
+REPLAY_LOOP = False
+METRICS_PATH = None  # p. ej. 'server_metrics.prom': snapshot periódico en formato de Prometheus
+METRICS_HTTP_PORT = None  # p. ej. 9100: sirve las métricas en http://127.0.0.1:<puerto>/metrics
+TRACE_PATH = None  # p. ej. 'server_trace.npz': instantes por etapa de cada frame (ver tools/trace_report.py)
 
 # Instancias
-screen_capturer = ScreenCapturer(width=WIDTH, height=HEIGHT, fps=FPS)
-screen_worker = ScreenCaptureWorker(screen_capturer)
+tracer = FrameTracer() if TRACE_PATH else None
+screen_capturer = open_frame_source(width=WIDTH, height=HEIGHT, fps=FPS, tile_delta=TILE_DELTA, monitor=MONITOR,
+                                    record_path=RECORD_PATH, replay_path=REPLAY_PATH,
+                                    replay_speed=REPLAY_SPEED, replay_loop=REPLAY_LOOP)
+encoder_pool = ParallelJpegEncoder(width=WIDTH, height=HEIGHT, workers=ENCODER_WORKERS) if ENCODER_WORKERS else None
+screen_worker = ScreenCaptureWorker(screen_capturer, encoder_pool=encoder_pool)
 
-chunker = Chunker(payload_size=PAYLOAD_SIZE)
-chunker_worker = ChunkerWorker(chunker)
+chunker = Chunker(payload_size=PAYLOAD_SIZE,
+                  fec=FecEncoder(FEC_SCHEME, FEC_PARITY) if FEC_SCHEME else None)
+chunker_worker = ChunkerWorker(chunker, source=screen_worker, tracer=tracer)
 
-udp_server = UDPServer(port=5005, buffer_size=BUFFER_SIZE)
-udp_worker = UDPServerWorker(udp_server)
+retransmit_cache = None
+if NACK_ENABLED:
+    retransmit_cache = RetransmitCache(capacity=4096, metrics=FrameLogMetrics(log_path='server_metrics.log'))
+
+udp_server = UDPServer(port=5005, buffer_size=BUFFER_SIZE, batch_send=BATCH_SEND,
+                       retransmit_cache=retransmit_cache,
+                       multicast_group=MULTICAST_GROUP, multicast_port=MULTICAST_PORT,
+                       multicast_ttl=MULTICAST_TTL, multicast_interface=MULTICAST_INTERFACE,
+                       tracer=tracer)
+# Cada cliente nuevo (o que lo pida) recibe un keyframe (necesario en modo delta por tiles)
+udp_worker = UDPServerWorker(udp_server, client_timeout_s=CLIENT_TIMEOUT_S,
+                             on_join=lambda addr: screen_capturer.request_keyframe(),
+                             on_keyframe_request=lambda addr: screen_capturer.request_keyframe())
 
 # Control principal
 workers = {
@@ -36,12 +77,24 @@ control = ControlWorker(
     screen_capturer=screen_capturer
 )
 
+exporter = None
+if METRICS_PATH or METRICS_HTTP_PORT:
+    for worker in workers.values():
+        worker.register_metrics(REGISTRY)
+    exporter = MetricsExporter(path=METRICS_PATH, http_port=METRICS_HTTP_PORT)
+
 # Lanzador simple
 if __name__ == "__main__":
     try:
         control.start()
+        if exporter:
+            exporter.start()
         control.main_thread.join()  # Espera a que finalice el ciclo principal
     except KeyboardInterrupt:
         print("[MAIN] Interrupción manual detectada.")
     finally:
         control.stop()
+        if tracer:
+            tracer.save(TRACE_PATH)
+        if exporter:
+            exporter.stop()
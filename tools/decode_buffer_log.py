@@ -0,0 +1,41 @@
+import argparse
+import csv
+import sys
+
+from logger.bufferlogger import EV_DELAY, EV_STATE, EVENT_NAMES, STATES, format_record, read_sessions
+
+# Decodifica el log binario de BufferLogger (BUFFER_LOG_BINARY = True en los clientes).
+# Uso: python -m tools.decode_buffer_log buffer.blog            -> mismo texto que buffer.log
+#      python -m tools.decode_buffer_log buffer.blog --csv x.csv -> una fila por evento
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Decodifica el log binario del buffer de reproducción")
+    parser.add_argument('path', help="archivo escrito por BufferLogger(binary=True)")
+    parser.add_argument('--csv', help="archivo CSV de salida en lugar de texto por consola")
+    args = parser.parse_args()
+
+    sessions = read_sessions(args.path)
+    if not args.csv:
+        for wall_offset, records in sessions:
+            for record in records:
+                sys.stdout.write(format_record(*record, wall_offset=wall_offset) + "\n")
+        return
+
+    with open(args.csv, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['time', 'event', 'state', 'frame_id', 'buffer_ms', 'wait_s', 'target_ms'])
+        rows = 0
+        for wall_offset, records in sessions:
+            for t, buffer_ms, frame_id, wait, event, state in records:
+                writer.writerow([f"{t + wall_offset:.6f}", EVENT_NAMES.get(event, event),
+                                 STATES[state] if event == EV_STATE and state < len(STATES) else '',
+                                 frame_id if frame_id >= 0 else '', f"{buffer_ms:.3f}",
+                                 '' if event == EV_DELAY else f"{wait:.6f}",
+                                 f"{wait:.3f}" if event == EV_DELAY else ''])
+                rows += 1
+    print(f"[BUFFER_LOG] {rows} eventos guardados en {args.csv}")
+
+
+if __name__ == '__main__':
+    main()
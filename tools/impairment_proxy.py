@@ -0,0 +1,282 @@
+import argparse
+import heapq
+import random
+import select
+import socket
+import threading
+import time
+
+# Proxy UDP que degrada la red entre servidor y cliente en la misma máquina:
+# pérdida (uniforme o en ráfagas Gilbert-Elliott), retardo, jitter, reordenamiento,
+# duplicación y límite de ancho de banda, con azar reproducible por semilla.
+# El cliente se apunta al puerto del proxy (SERVER_PORT en client.py / client3.py) y
+# el proxy reenvía al servidor real. Solo unicast: en modo multicast los datos no pasan por acá.
+# Uso: python -m tools.impairment_proxy --listen-port 5015 --server-port 5005 --profile wifi-congested --seed 7
+
+# Perfiles aproximados; cualquier opción explícita de la línea de comandos los pisa
+PROFILES = {
+    'wifi-good': dict(delay_ms=3, jitter_ms=2, loss=0.002, reorder=0.001),
+    'wifi-congested': dict(delay_ms=8, jitter_ms=12, burst_loss=0.02, burst_len=4, reorder=0.01,
+                           duplicate=0.001, bandwidth_kbps=40000),
+    'wifi-edge': dict(delay_ms=15, jitter_ms=25, burst_loss=0.05, burst_len=8, reorder=0.02,
+                      duplicate=0.005, bandwidth_kbps=12000),
+}
+
+
+class GilbertElliottLoss:
+    """
+    Pérdida en ráfagas con dos estados (bueno / malo).
+    p_good_bad y p_bad_good son las probabilidades de cambiar de estado en cada paquete;
+    loss_good y loss_bad la probabilidad de perder el paquete en cada estado.
+    """
+    def __init__(self, rng, p_good_bad, p_bad_good, loss_good=0.0, loss_bad=1.0):
+        self.rng = rng
+        self.p_good_bad = p_good_bad
+        self.p_bad_good = p_bad_good
+        self.loss_good = loss_good
+        self.loss_bad = loss_bad
+        self.bad = False
+
+    @classmethod
+    def from_average(cls, rng, loss, burst_len):
+        """Parámetros a partir de la pérdida media y el largo medio de ráfaga (en paquetes)."""
+        p_bad_good = 1.0 / max(burst_len, 1.0)
+        p_good_bad = p_bad_good * loss / max(1.0 - loss, 1e-9)
+        return cls(rng, min(p_good_bad, 1.0), p_bad_good)
+
+    def lose(self) -> bool:
+        if self.bad:
+            if self.rng.random() < self.p_bad_good:
+                self.bad = False
+        elif self.rng.random() < self.p_good_bad:
+            self.bad = True
+        return self.rng.random() < (self.loss_bad if self.bad else self.loss_good)
+
+
+class UniformLoss:
+    def __init__(self, rng, loss):
+        self.rng = rng
+        self.loss = loss
+
+    def lose(self) -> bool:
+        return self.rng.random() < self.loss
+
+
+class Impairment:
+    """
+    Degradación de un sentido del enlace. schedule() decide, para cada paquete,
+    en qué instantes sale (ninguno si se pierde, dos si se duplica).
+    - delay_ms / jitter_ms: retardo base + variación normal (sin reordenar: se respeta el orden FIFO)
+    - reorder: probabilidad de que un paquete se adelante al orden FIFO con reorder_ms de retardo extra
+    - bandwidth_kbps: los paquetes se serializan a esa tasa; si la cola supera queue_ms se descartan
+    """
+    def __init__(self, seed=None, loss=0.0, burst_loss=0.0, burst_len=1.0, delay_ms=0.0, jitter_ms=0.0,
+                 reorder=0.0, reorder_ms=20.0, duplicate=0.0, bandwidth_kbps=0.0, queue_ms=200.0):
+        self.rng = random.Random(seed)
+        self.loss_model = None
+        if burst_loss > 0:
+            self.loss_model = GilbertElliottLoss.from_average(self.rng, burst_loss, burst_len)
+        elif loss > 0:
+            self.loss_model = UniformLoss(self.rng, loss)
+        self.delay_s = delay_ms / 1000.0
+        self.jitter_s = jitter_ms / 1000.0
+        self.reorder = reorder
+        self.reorder_s = reorder_ms / 1000.0
+        self.duplicate = duplicate
+        self.bytes_per_s = bandwidth_kbps * 1000.0 / 8 if bandwidth_kbps else 0.0
+        self.queue_s = queue_ms / 1000.0
+
+        self.link_free_at = 0.0     # Fin de la serialización del último paquete aceptado
+        self.last_departure = 0.0   # Para que el jitter no reordene por sí solo
+
+        self.stats = {'packets': 0, 'lost': 0, 'queue_drops': 0, 'reordered': 0, 'duplicated': 0}
+
+    def schedule(self, size: int, now: float) -> list:
+        self.stats['packets'] += 1
+        if self.loss_model is not None and self.loss_model.lose():
+            self.stats['lost'] += 1
+            return []
+
+        ready = now
+        if self.bytes_per_s:
+            start = max(now, self.link_free_at)
+            if start - now > self.queue_s:
+                self.stats['queue_drops'] += 1
+                return []
+            self.link_free_at = start + size / self.bytes_per_s
+            ready = self.link_free_at
+
+        departure = ready + self.delay_s
+        if self.jitter_s:
+            departure += abs(self.rng.gauss(0.0, self.jitter_s))
+
+        if self.reorder and self.rng.random() < self.reorder:
+            self.stats['reordered'] += 1
+            departure += self.reorder_s  # Sale después de los que llegaron más tarde
+        else:
+            departure = max(departure, self.last_departure)
+            self.last_departure = departure
+
+        departures = [departure]
+        if self.duplicate and self.rng.random() < self.duplicate:
+            self.stats['duplicated'] += 1
+            departures.append(departure + self.rng.uniform(0.0, 0.002))
+        return departures
+
+
+class ImpairmentProxy:
+    """
+    Reenvía datagramas entre los clientes (que le escriben a listen_port) y el servidor.
+    Cada cliente tiene su propio socket hacia el servidor, así el servidor los ve como
+    suscriptores distintos. downstream degrada servidor → cliente (el video); upstream
+    (opcional) degrada cliente → servidor (READY, heartbeats, NACK).
+    """
+    def __init__(self, listen_port, server_addr, downstream: Impairment, upstream: Impairment = None,
+                 listen_ip='127.0.0.1', stats_interval=5.0):
+        self.server_addr = server_addr
+        self.downstream = downstream
+        self.upstream = upstream
+        self.stats_interval = stats_interval
+
+        self.listen_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.listen_socket.bind((listen_ip, listen_port))
+
+        self.upstream_sockets = {}  # dirección del cliente -> socket hacia el servidor
+        self.client_of = {}         # socket hacia el servidor -> dirección del cliente
+        self.pending = []           # heap (salida, orden, datos, socket, destino)
+        self.sequence = 0
+
+        self.running = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+        print(f"[PROXY] {self.listen_socket.getsockname()} -> {self.server_addr}")
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
+        for sock in self.upstream_sockets.values():
+            sock.close()
+        self.listen_socket.close()
+        self.print_stats()
+
+    def _upstream_socket(self, client_addr):
+        sock = self.upstream_sockets.get(client_addr)
+        if sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            sock.connect(self.server_addr)
+            self.upstream_sockets[client_addr] = sock
+            self.client_of[sock] = client_addr
+            print(f"[PROXY] Nuevo cliente {client_addr}")
+        return sock
+
+    def _enqueue(self, impairment, data, sock, dest, now):
+        departures = impairment.schedule(len(data), now) if impairment is not None else [now]
+        for departure in departures:
+            heapq.heappush(self.pending, (departure, self.sequence, data, sock, dest))
+            self.sequence += 1
+
+    def _flush(self, now):
+        while self.pending and self.pending[0][0] <= now:
+            _, _, data, sock, dest = heapq.heappop(self.pending)
+            try:
+                if dest is None:
+                    sock.send(data)
+                else:
+                    sock.sendto(data, dest)
+            except OSError:
+                pass  # El otro extremo todavía no escucha: se pierde como en la red real
+
+    def _run(self):
+        next_stats = time.time() + self.stats_interval
+        while self.running:
+            now = time.time()
+            timeout = 0.1
+            if self.pending:
+                timeout = min(timeout, max(0.0, self.pending[0][0] - now))
+            readable, _, _ = select.select([self.listen_socket, *self.client_of], [], [], timeout)
+
+            now = time.time()
+            for sock in readable:
+                try:
+                    if sock is self.listen_socket:
+                        data, client_addr = sock.recvfrom(65536)
+                        self._enqueue(self.upstream, data, self._upstream_socket(client_addr), None, now)
+                    else:
+                        data = sock.recv(65536)
+                        self._enqueue(self.downstream, data, self.listen_socket, self.client_of[sock], now)
+                except OSError:
+                    continue
+            self._flush(time.time())
+
+            if self.stats_interval and now >= next_stats:
+                self.print_stats()
+                next_stats = now + self.stats_interval
+
+    def print_stats(self):
+        for name, impairment in (('servidor→cliente', self.downstream), ('cliente→servidor', self.upstream)):
+            if impairment is None:
+                continue
+            s = impairment.stats
+            print(f"[PROXY] {name}: paquetes={s['packets']} perdidos={s['lost']} "
+                  f"descartes de cola={s['queue_drops']} reordenados={s['reordered']} "
+                  f"duplicados={s['duplicated']}")
+
+
+IMPAIRMENT_OPTIONS = ('loss', 'burst_loss', 'burst_len', 'delay_ms', 'jitter_ms', 'reorder', 'reorder_ms',
+                      'duplicate', 'bandwidth_kbps', 'queue_ms')
+
+
+def impairment_from_args(args, seed):
+    options = dict(PROFILES.get(args.profile, {}))
+    options.update({name: getattr(args, name) for name in IMPAIRMENT_OPTIONS if getattr(args, name) is not None})
+    return Impairment(seed=seed, **options)
+
+
+def add_impairment_arguments(parser):
+    """Opciones compartidas con los benchmarks que levantan el proxy en el mismo proceso."""
+    parser.add_argument('--profile', choices=sorted(PROFILES), help="perfil base de degradación")
+    parser.add_argument('--loss', type=float, help="pérdida uniforme (0-1)")
+    parser.add_argument('--burst-loss', type=float, help="pérdida media en ráfagas Gilbert-Elliott (0-1)")
+    parser.add_argument('--burst-len', type=float, help="largo medio de ráfaga en paquetes")
+    parser.add_argument('--delay-ms', type=float)
+    parser.add_argument('--jitter-ms', type=float)
+    parser.add_argument('--reorder', type=float, help="probabilidad de reordenar un paquete")
+    parser.add_argument('--reorder-ms', type=float, help="retardo extra de un paquete reordenado")
+    parser.add_argument('--duplicate', type=float, help="probabilidad de duplicar un paquete")
+    parser.add_argument('--bandwidth-kbps', type=float, help="límite de ancho de banda (0 = sin límite)")
+    parser.add_argument('--queue-ms', type=float, help="cola máxima antes de descartar con ancho de banda limitado")
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proxy UDP con pérdida, jitter y reordenamiento")
+    parser.add_argument('--listen-port', type=int, default=5015, help="puerto al que se conectan los clientes")
+    parser.add_argument('--server-ip', default='127.0.0.1')
+    parser.add_argument('--server-port', type=int, default=5005)
+    parser.add_argument('--upstream', action='store_true',
+                        help="degradar también cliente → servidor (con otra semilla)")
+    parser.add_argument('--stats-interval', type=float, default=5.0)
+    add_impairment_arguments(parser)
+    args = parser.parse_args()
+
+    proxy = ImpairmentProxy(args.listen_port, (args.server_ip, args.server_port),
+                            downstream=impairment_from_args(args, args.seed),
+                            upstream=impairment_from_args(args, args.seed + 1) if args.upstream else None,
+                            stats_interval=args.stats_interval)
+    proxy.start()
+    try:
+        while True:
+            time.sleep(1.0)
+    except KeyboardInterrupt:
+        print("[PROXY] Interrupción manual detectada.")
+    finally:
+        proxy.stop()
+
+
+if __name__ == '__main__':
+    main()
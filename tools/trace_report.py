@@ -0,0 +1,42 @@
+import argparse
+import json
+
+from logger.frametracer import load_spans, stage_histograms, write_chrome_trace
+
+# Reporte de los spans por etapa guardados con TRACE_PATH en el servidor y el cliente:
+# tabla de latencia por etapa, histogramas en JSON y traza para chrome://tracing / Perfetto.
+# Uso: python -m tools.trace_report server_trace.npz client_trace.npz --chrome trace.json --json etapas.json
+# Servidor y cliente en equipos distintos: con CLOCK_SYNC en el cliente sus marcas quedan en el reloj
+# del servidor; si no, los relojes deben estar sincronizados (NTP) para las etapas de red.
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia por etapa a partir de los spans de frames")
+    parser.add_argument('traces', nargs='+', help="archivos .npz guardados por FrameTracer")
+    parser.add_argument('--chrome', help="archivo JSON en formato Trace Event de Chrome")
+    parser.add_argument('--json', help="archivo donde guardar los histogramas por etapa")
+    args = parser.parse_args()
+
+    frame_ids, spans = load_spans(args.traces)
+    report = stage_histograms(spans)
+    print(f"[TRACE] {len(spans)} frames")
+    print(f"{'etapa':>14} {'frames':>7} {'media ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'máx ms':>8}")
+    for stage, stats in report.items():
+        if stage == 'total':
+            continue
+        print(f"{stage:>14} {stats['frames']:>7} {stats['mean_ms']:>9.2f} {stats['p50_ms']:>8.2f} "
+              f"{stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f} {stats['max_ms']:>8.2f}")
+    if 'total' in report:
+        total = report['total']
+        print(f"{'total':>14} {total['frames']:>7} {'':>9} {total['p50_ms']:>8.2f} {'':>8} {total['p99_ms']:>8.2f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.chrome:
+        write_chrome_trace(frame_ids, spans, args.chrome)
+        print(f"[TRACE] Traza de Chrome guardada en {args.chrome}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+import asyncio
+import socket
+import time
+from typing import Optional
+
+from udp_connection.nack import NACK_PREFIX, parse_nack, pack_nack
+from udp_connection.subscribers import MSG_JOIN, MSG_LEAVE, MSG_HEARTBEAT, MSG_KEYFRAME
+from udp_connection.clocksync import PING_PREFIX, pong_reply, stream_time
+
+EOF_PACKET = b'\xff\xff\xff\xff\xff\xff'
+
+
+def _as_bytes(chunk):
+    """Los chunks pueden venir como tuplas (cabecera, payload): el transport necesita un solo buffer."""
+    return b''.join(chunk) if isinstance(chunk, tuple) else chunk
+
+
+class AsyncUDPServer(asyncio.DatagramProtocol):
+    """
+    Transporte del servidor sobre asyncio (DatagramProtocol).
+    Altas/bajas/heartbeats, NACKs y envío de chunks corren en el event loop, sin hilos.
+    A diferencia de SubscriberRegistry no hay colas por cliente: todos comparten
+    el buffer del transport, y si se supera su límite (pause_writing) el frame
+    se descarta para todos y se cuenta en cada cliente.
+    """
+    def __init__(self, host_ip='0.0.0.0', port=9999, retransmit_cache=None,
+                 client_timeout_s: float = 10.0, on_join=None, on_keyframe_request=None, tracer=None):
+        self.host_ip = host_ip
+        self.port = port
+        self.retransmit_cache = retransmit_cache
+        self.tracer = tracer  # FrameTracer opcional: primer y último envío de cada frame
+        self.client_timeout_s = client_timeout_s
+        self.on_join = on_join
+        self.on_keyframe_request = on_keyframe_request  # Un cliente perdió la base de sus deltas
+
+        self.transport = None
+        self.subscribers = {}  # addr: estadísticas y última actividad
+        self.subscriber_joined = asyncio.Event()
+        self.writing_paused = False
+        self.expire_handle = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, local_addr=(self.host_ip, self.port))
+        print(f"[ASYNC SERVER] Escuchando en {self.host_ip}:{self.port}")
+        self.expire_handle = loop.call_later(self.client_timeout_s / 2, self._expire)
+
+    def close(self):
+        if self.expire_handle:
+            self.expire_handle.cancel()
+        if self.transport:
+            for addr in list(self.subscribers):
+                self.transport.sendto(EOF_PACKET, addr)
+            self.transport.close()
+
+    # --- Protocolo ---
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if data.startswith(PING_PREFIX):
+            reply = pong_reply(data, stream_time())
+            if reply is not None:
+                self.transport.sendto(reply, addr)
+            return
+        if data.startswith(NACK_PREFIX):
+            self._handle_nack(data, addr)
+            self._touch(addr)
+            return
+        message = data.strip()
+        if message == MSG_JOIN:
+            self._join(addr)
+        elif message == MSG_LEAVE:
+            self._leave(addr, "BYE")
+        elif message == MSG_HEARTBEAT:
+            self._touch(addr)
+        elif message == MSG_KEYFRAME:
+            self._touch(addr)
+            if self.on_keyframe_request:
+                self.on_keyframe_request(addr)
+
+    def error_received(self, exc):
+        print(f"[ASYNC SERVER] Error de socket: {exc}")
+
+    def pause_writing(self):
+        self.writing_paused = True
+
+    def resume_writing(self):
+        self.writing_paused = False
+
+    # --- Suscriptores ---
+
+    def _join(self, addr):
+        if addr in self.subscribers:
+            self._touch(addr)
+            return
+        now = time.monotonic()
+        self.subscribers[addr] = {'joined_at': now, 'last_seen': now, 'frames_sent': 0,
+                                  'frames_dropped': 0, 'packets_sent': 0, 'bytes_sent': 0}
+        self.subscriber_joined.set()
+        print(f"[ASYNC SERVER] Cliente unido: {addr} ({len(self.subscribers)} conectados)")
+        if self.on_join:
+            self.on_join(addr)
+
+    def _leave(self, addr, reason):
+        stats = self.subscribers.pop(addr, None)
+        if stats is not None:
+            print(f"[ASYNC SERVER] Cliente retirado ({reason}): {addr}, "
+                  f"enviados {stats['frames_sent']}, descartados {stats['frames_dropped']}")
+        if not self.subscribers:
+            self.subscriber_joined.clear()
+
+    def _touch(self, addr):
+        stats = self.subscribers.get(addr)
+        if stats is not None:
+            stats['last_seen'] = time.monotonic()
+
+    def _expire(self):
+        now = time.monotonic()
+        for addr, stats in list(self.subscribers.items()):
+            if now - stats['last_seen'] > self.client_timeout_s:
+                self._leave(addr, "timeout")
+        loop = asyncio.get_running_loop()
+        self.expire_handle = loop.call_later(self.client_timeout_s / 2, self._expire)
+
+    async def wait_for_subscriber(self):
+        await self.subscriber_joined.wait()
+
+    # --- Envío ---
+
+    def _handle_nack(self, data, addr):
+        request = parse_nack(data)
+        if request is None or self.retransmit_cache is None:
+            return
+        frame_id, indices = request
+        for packet in self.retransmit_cache.lookup(frame_id, indices):
+            self.transport.sendto(_as_bytes(packet), addr)
+
+    def broadcast(self, chunks) -> int:
+        """Envía un frame ya dividido a todos los clientes; devuelve a cuántos se envió."""
+        if self.transport is None or not self.subscribers:
+            return 0
+        if self.writing_paused:
+            for stats in self.subscribers.values():
+                stats['frames_dropped'] += 1
+            return 0
+
+        if self.retransmit_cache:
+            self.retransmit_cache.store(chunks)
+        packets = [_as_bytes(chunk) for chunk in chunks]
+        size = sum(len(packet) for packet in packets)
+        started = stream_time()
+        for addr, stats in self.subscribers.items():
+            for packet in packets:
+                self.transport.sendto(packet, addr)
+            stats['frames_sent'] += 1
+            stats['packets_sent'] += len(packets)
+            stats['bytes_sent'] += size
+        if self.tracer:
+            self.tracer.mark_sent(packets, started, stream_time())
+        return len(self.subscribers)
+
+    def send_control(self, message: bytes):
+        """Mensaje de control a todos los clientes (p. ej. PAUSE / RESUME)."""
+        for addr in self.subscribers:
+            self.transport.sendto(message, addr)
+
+    def get_subscriber_stats(self) -> dict:
+        now = time.monotonic()
+        return {addr: dict(stats, idle_s=now - stats['last_seen']) for addr, stats in self.subscribers.items()}
+
+
+class AsyncUDPClient(asyncio.DatagramProtocol):
+    """
+    Transporte del cliente sobre asyncio: recepción, reensamblado, NACKs y
+    heartbeats corren en el event loop. Los frames armados se entregan a on_frame.
+    El reensamblador se consulta al llegar cada paquete y, sin paquetes, en el
+    próximo plazo que informa (un timer del loop, sin sondeo periódico).
+    """
+    def __init__(self, reassembler, on_frame, host_ip='127.0.0.1', port=9999,
+                 heartbeat_interval: float = 2.0, nack: bool = False, recv_buffer: int = 16 * 1024 * 1024):
+        self.reassembler = reassembler
+        self.on_frame = on_frame
+        self.host_ip = host_ip
+        self.port = port
+        self.heartbeat_interval = heartbeat_interval
+        self.nack = nack
+        self.recv_buffer = recv_buffer
+
+        self.transport = None
+        self.closed = asyncio.Event()
+        self.paused = False
+        self.deadline_handle = None
+        self.heartbeat_handle = None
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await loop.create_datagram_endpoint(lambda: self, remote_addr=(self.host_ip, self.port))
+        self.transport.sendto(MSG_JOIN)
+        print(f"[ASYNC CLIENT] READY enviado a {self.host_ip}:{self.port}")
+        self.heartbeat_handle = loop.call_later(self.heartbeat_interval, self._heartbeat)
+
+    def close(self):
+        for handle in (self.deadline_handle, self.heartbeat_handle):
+            if handle:
+                handle.cancel()
+        if self.transport:
+            self.transport.sendto(MSG_LEAVE)
+            self.transport.close()
+
+    # --- Protocolo ---
+
+    def connection_made(self, transport):
+        self.transport = transport
+        sock = transport.get_extra_info('socket')
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.recv_buffer)
+        except OSError as e:
+            print(f"[ASYNC CLIENT] No se pudo ajustar SO_RCVBUF: {e}")
+
+    def datagram_received(self, data, addr):
+        if data[:6] == EOF_PACKET:
+            print("[ASYNC CLIENT] Fin de transmisión recibido.")
+            self.closed.set()
+            return
+        if data in (b'PAUSE', b'RESUME'):
+            self.paused = data == b'PAUSE'
+            print(f"[ASYNC CLIENT] Transmisión {'pausada' if self.paused else 'reanudada'} por el servidor.")
+            return
+
+        self.reassembler.add_chunk(data)
+        self._drain()
+
+    def error_received(self, exc):
+        print(f"[ASYNC CLIENT] Error de socket: {exc}")
+
+    def connection_lost(self, exc):
+        self.closed.set()
+
+    # --- Reensamblado ---
+
+    def _drain(self):
+        while True:
+            frame = self.reassembler.get_next_frame()
+            if frame is None:
+                break
+            self.on_frame(frame)
+
+        if self.nack:
+            for frame_id, indices in self.reassembler.collect_nacks():
+                self.transport.sendto(pack_nack(frame_id, indices))
+
+        # Reprograma el timer al próximo plazo (frames parciales o vencidos)
+        if self.deadline_handle:
+            self.deadline_handle.cancel()
+            self.deadline_handle = None
+        wait = self.reassembler.time_to_next_deadline()
+        if wait is not None:
+            self.deadline_handle = asyncio.get_running_loop().call_later(wait, self._drain)
+
+    def request_keyframe(self):
+        """Pide al servidor un frame completo (p. ej. tras perder un delta)."""
+        if self.transport and not self.transport.is_closing():
+            self.transport.sendto(MSG_KEYFRAME)
+
+    def _heartbeat(self):
+        self.transport.sendto(MSG_HEARTBEAT)
+        loop = asyncio.get_running_loop()
+        self.heartbeat_handle = loop.call_later(self.heartbeat_interval, self._heartbeat)
+
+    async def wait_closed(self, timeout: Optional[float] = None):
+        await asyncio.wait_for(self.closed.wait(), timeout)
@@ -0,0 +1,149 @@
+import ctypes
+import errno
+import os
+import socket
+import threading
+import time
+
+from udp_connection import mmsg
+
+
+class BatchSender:
+    """
+    Envía los chunks de un frame en lotes con sendmmsg (una syscall por lote).
+    Cada paquete puede ser un objeto bytes o una tupla de buffers (scatter-gather,
+    p. ej. (cabecera, vista del payload)). Si sendmmsg no está disponible o la
+    dirección no es IPv4, cae a un envío por chunk.
+    """
+    MAX_IOV_PER_PACKET = 2
+
+    def __init__(self, sock: socket.socket, batch_size: int = 64, use_sendmmsg: bool = True):
+        self.socket = sock
+        self.batch_size = batch_size
+        self.use_sendmmsg = use_sendmmsg and mmsg.AVAILABLE and sock.family == socket.AF_INET
+
+        # Estructuras preasignadas, reutilizadas en cada lote
+        self._msgs = (mmsg.MMsgHdr * batch_size)()
+        self._iovs = (mmsg.IOVec * (batch_size * self.MAX_IOV_PER_PACKET))()
+        self._sockaddr = mmsg.SockAddrIn()
+        self._last_addr = None
+        # Las estructuras son compartidas: un solo envío a la vez (p. ej. frames y retransmisiones)
+        self.lock = threading.Lock()
+
+        # Estadísticas acumuladas
+        self.total_packets = 0
+        self.total_failed = 0
+        self.total_batches = 0
+        self.total_send_time = 0.0
+
+    def _prepare_addr(self, addr):
+        if addr != self._last_addr:
+            mmsg.fill_sockaddr(self._sockaddr, addr)
+            self._last_addr = addr
+
+    def send(self, packets, addr) -> dict:
+        """
+        Envía todos los paquetes a addr y devuelve un informe:
+        {'sent', 'failed', 'batches': [duración de cada lote en s], 'errors': [(índice, mensaje)]}
+        """
+        with self.lock:
+            if self.use_sendmmsg:
+                try:
+                    self._prepare_addr(addr)
+                except (OSError, TypeError):
+                    report = self._send_fallback(packets, addr)
+                else:
+                    report = self._send_mmsg(packets)
+            else:
+                report = self._send_fallback(packets, addr)
+
+            self.total_packets += report['sent']
+            self.total_failed += report['failed']
+            self.total_batches += len(report['batches'])
+            self.total_send_time += sum(report['batches'])
+
+        if report['errors']:
+            index, message = report['errors'][0]
+            print(f"[ERROR] Envío por lotes: {report['failed']} chunks fallidos (primero #{index}: {message})")
+        return report
+
+    def _send_mmsg(self, packets):
+        report = {'sent': 0, 'failed': 0, 'batches': [], 'errors': []}
+        fd = self.socket.fileno()
+        name = ctypes.cast(ctypes.pointer(self._sockaddr), ctypes.c_void_p)
+        name_len = ctypes.sizeof(self._sockaddr)
+        total = len(packets)
+        start = 0
+
+        while start < total:
+            count = min(self.batch_size, total - start)
+            keep_alive = []  # Mantiene vivas las vistas mientras dura la syscall
+            iov_index = 0
+            for slot in range(count):
+                packet = packets[start + slot]
+                pieces = packet if isinstance(packet, tuple) else (packet,)
+                first_iov = iov_index
+                for piece in pieces:
+                    iov = self._iovs[iov_index]
+                    iov.iov_base = mmsg.buffer_address(piece)
+                    iov.iov_len = len(piece)
+                    keep_alive.append(piece)
+                    iov_index += 1
+                hdr = self._msgs[slot].msg_hdr
+                hdr.msg_name = name
+                hdr.msg_namelen = name_len
+                hdr.msg_iov = ctypes.pointer(self._iovs[first_iov])
+                hdr.msg_iovlen = len(pieces)
+
+            # Un lote puede quedar parcialmente enviado: se reintenta desde el primero pendiente
+            offset = 0
+            batch_start = time.perf_counter()
+            while offset < count:
+                msgvec = ctypes.cast(ctypes.byref(self._msgs, offset * ctypes.sizeof(mmsg.MMsgHdr)),
+                                     ctypes.POINTER(mmsg.MMsgHdr))
+                sent, err = mmsg.sendmmsg(fd, msgvec, count - offset)
+                if sent < 0:
+                    if err == errno.EINTR:
+                        continue
+                    # Falla el primer mensaje pendiente: se registra y se salta
+                    report['failed'] += 1
+                    report['errors'].append((start + offset, os.strerror(err)))
+                    offset += 1
+                else:
+                    report['sent'] += sent
+                    offset += sent
+            report['batches'].append(time.perf_counter() - batch_start)
+            start += count
+
+        return report
+
+    def _send_fallback(self, packets, addr):
+        """Camino por chunk: una syscall por datagrama."""
+        report = {'sent': 0, 'failed': 0, 'batches': [], 'errors': []}
+        has_sendmsg = hasattr(self.socket, 'sendmsg')
+        batch_start = time.perf_counter()
+        for index, packet in enumerate(packets):
+            try:
+                if isinstance(packet, tuple):
+                    if has_sendmsg:
+                        self.socket.sendmsg(list(packet), [], 0, addr)
+                    else:
+                        self.socket.sendto(b''.join(packet), addr)
+                else:
+                    self.socket.sendto(packet, addr)
+                report['sent'] += 1
+            except socket.error as e:
+                report['failed'] += 1
+                report['errors'].append((index, str(e)))
+        report['batches'].append(time.perf_counter() - batch_start)
+        return report
+
+    def get_stats(self) -> dict:
+        """Estadísticas acumuladas desde la creación."""
+        return {
+            'mode': 'sendmmsg' if self.use_sendmmsg else 'per-chunk',
+            'packets': self.total_packets,
+            'failed': self.total_failed,
+            'batches': self.total_batches,
+            'avg_batch_time_s': (self.total_send_time / self.total_batches) if self.total_batches else 0.0,
+        }
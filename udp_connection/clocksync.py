@@ -0,0 +1,213 @@
+import collections
+import select
+import socket
+import struct
+import threading
+import time
+
+# Sincronización de relojes servidor → cliente por ping/pong (estilo NTP) sobre UDP:
+#   cliente: TPING(secuencia, t1)            t1, t4: time.monotonic() del cliente
+#   servidor: TPONG(secuencia, t1, t2, t3)   t2, t3: stream_time() del servidor
+#   offset = ((t2 - t1) + (t3 - t4)) / 2     demora = (t4 - t1) - (t3 - t2)
+# Las muestras con demora alta (colas, ping leído tarde por el servidor) se descartan
+# frente a la mínima de la ventana; con las restantes se ajusta offset + deriva.
+PING_PREFIX = b'TPING'
+PONG_PREFIX = b'TPONG'
+PING = struct.Struct('>Id')    # secuencia, t1
+PONG = struct.Struct('>Iddd')  # secuencia, t1, t2, t3
+
+_EPOCH = time.time() - time.monotonic()
+
+
+def stream_time() -> float:
+    """
+    Reloj de las cabeceras del servidor: monotónico (no salta si se ajusta la hora)
+    y anclado a la hora de pared al iniciar el proceso.
+    """
+    return _EPOCH + time.monotonic()
+
+
+def pack_ping(sequence: int, sent: float) -> bytes:
+    return PING_PREFIX + PING.pack(sequence, sent)
+
+
+def pong_reply(data: bytes, received: float):
+    """Respuesta del servidor a un TPING recibido en received (None si el paquete no es válido)."""
+    if len(data) < len(PING_PREFIX) + PING.size:
+        return None
+    sequence, sent = PING.unpack_from(data, len(PING_PREFIX))
+    return PONG_PREFIX + PONG.pack(sequence, sent, received, stream_time())
+
+
+def parse_pong(data: bytes):
+    """Devuelve (secuencia, t1, t2, t3) o None si el paquete no es un TPONG válido."""
+    if not data.startswith(PONG_PREFIX) or len(data) < len(PONG_PREFIX) + PONG.size:
+        return None
+    return PONG.unpack_from(data, len(PONG_PREFIX))
+
+
+class ClockSync:
+    """
+    Estima el reloj del servidor (stream_time) desde el cliente con un socket propio,
+    así los caminos de recepción de chunks no cambian. Un hilo manda una ráfaga de
+    pings al arrancar y luego uno cada interval segundos.
+    server_now() da el instante actual en el reloj del servidor (time.time() hasta la
+    primera muestra).
+    """
+    def __init__(self, server_addr, interval: float = 2.0, burst: int = 8, burst_interval: float = 0.05,
+                 timeout: float = 0.5, window: int = 32, delay_tolerance_s: float = 0.002,
+                 max_drift_ppm: float = 500.0, reset_threshold_s: float = 0.5):
+        self.server_addr = server_addr
+        self.interval = interval
+        self.burst = burst
+        self.burst_interval = burst_interval
+        self.timeout = timeout
+        self.delay_tolerance_s = delay_tolerance_s
+        self.max_drift = max_drift_ppm * 1e-6
+        self.reset_threshold_s = reset_threshold_s
+
+        self.samples = collections.deque(maxlen=window)  # (instante local, offset, demora)
+        self.estimate = None  # (instante local de referencia, offset, deriva); se reemplaza entero
+        self.min_delay = None
+        self.accepted = 0
+        self.rejected = 0
+        self.resets = 0
+        self.sequence = 0
+
+        self.socket = None
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        if self.socket:
+            self.socket.close()
+
+    def server_now(self) -> float:
+        estimate = self.estimate
+        now = time.monotonic()
+        if estimate is None:
+            return time.time()
+        reference, offset, drift = estimate
+        return now + offset + drift * (now - reference)
+
+    def is_synced(self) -> bool:
+        return self.estimate is not None
+
+    def _run(self):
+        pings = 0
+        while not self.stop_event.is_set():
+            self._exchange()
+            pings += 1
+            self.stop_event.wait(self.burst_interval if pings < self.burst else self.interval)
+
+    def _exchange(self):
+        """Un ping y la espera de su pong (los pongs viejos o ajenos se descartan)."""
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+        try:
+            self.socket.sendto(pack_ping(self.sequence, time.monotonic()), self.server_addr)
+        except socket.error as e:
+            print(f"[CLOCK] Error al enviar ping: {e}")
+            return
+        deadline = time.monotonic() + self.timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            readable, _, _ = select.select([self.socket], [], [], remaining)
+            if not readable:
+                return
+            try:
+                data, _ = self.socket.recvfrom(64)
+            except socket.error:
+                return
+            received = time.monotonic()
+            pong = parse_pong(data)
+            if pong is not None and pong[0] == self.sequence:
+                _, sent, server_received, server_sent = pong
+                self.add_sample(sent, server_received, server_sent, received)
+                return
+
+    def add_sample(self, t1: float, t2: float, t3: float, t4: float):
+        offset = ((t2 - t1) + (t3 - t4)) / 2.0
+        delay = (t4 - t1) - (t3 - t2)
+        if delay < 0:
+            self.rejected += 1
+            return
+
+        estimate = self.estimate
+        if estimate is not None and delay <= self.min_delay + self.delay_tolerance_s:
+            reference, current, drift = estimate
+            predicted = current + drift * ((t1 + t4) / 2.0 - reference)
+            if abs(offset - predicted) > self.reset_threshold_s:
+                # El reloj del servidor cambió de origen (p. ej. se reinició): ventana nueva
+                self.samples.clear()
+                self.resets += 1
+                print(f"[CLOCK] Salto de {(offset - predicted) * 1000:.1f} ms en el reloj del servidor, reiniciando")
+
+        self.samples.append(((t1 + t4) / 2.0, offset, delay))
+        self._update_estimate()
+
+    def _update_estimate(self):
+        self.min_delay = min(sample[2] for sample in self.samples)
+        limit = self.min_delay + self.delay_tolerance_s
+        accepted = [sample for sample in self.samples if sample[2] <= limit]
+        self.accepted = len(accepted)
+        self.rejected += 1 if self.samples[-1][2] > limit else 0
+
+        offsets = sorted(sample[1] for sample in accepted)
+        median = offsets[len(offsets) // 2]
+        first_sync = self.estimate is None
+        previous_drift = self.estimate[2] if self.estimate else 0.0
+
+        times = [sample[0] for sample in accepted]
+        reference = sum(times) / len(times)
+        if len(accepted) >= 3 and times[-1] - times[0] >= 1.0:
+            # Mínimos cuadrados del offset en función del tiempo local
+            offset_mean = sum(sample[1] for sample in accepted) / len(accepted)
+            spread = sum((t - reference) ** 2 for t in times)
+            drift = sum((t - reference) * (sample[1] - offset_mean) for t, sample in zip(times, accepted)) / spread
+            drift = max(-self.max_drift, min(self.max_drift, drift))
+            self.estimate = (reference, offset_mean, drift)
+        else:
+            self.estimate = (reference, median, previous_drift)
+
+        if first_sync:
+            print(f"[CLOCK] Sincronizado con {self.server_addr}: offset {self._wall_offset(median) * 1000:.2f} ms, "
+                  f"RTT {self.min_delay * 1000:.2f} ms")
+
+    @staticmethod
+    def _wall_offset(offset: float) -> float:
+        """
+        Offset respecto de la hora de pared del cliente (el crudo es stream_time del servidor
+        menos el monotónico local): ≈0 en el mismo equipo o con NTP, la diferencia real si no.
+        """
+        return offset - (time.time() - time.monotonic())
+
+    def get_stats(self) -> dict:
+        estimate = self.estimate
+        return {
+            'synced': estimate is not None,
+            'offset_ms': self._wall_offset(self.server_now() - time.monotonic()) * 1000.0 if estimate else None,
+            'drift_ppm': estimate[2] * 1e6 if estimate else None,
+            'rtt_ms': self.min_delay * 1000.0 if self.min_delay is not None else None,
+            'samples': len(self.samples),
+            'accepted': self.accepted,
+            'rejected': self.rejected,
+            'resets': self.resets,
+        }
+
+    def register_metrics(self, registry):
+        registry.gauge('clock_offset_seconds', "Offset estimado del reloj del servidor respecto de la hora local",
+                       fn=lambda: self._wall_offset(self.server_now() - time.monotonic())
+                       if self.estimate else float('nan'))
+        registry.gauge('clock_drift_ppm', "Deriva estimada entre relojes",
+                       fn=lambda: self.estimate[2] * 1e6 if self.estimate else float('nan'))
+        registry.gauge('clock_rtt_seconds', "Menor RTT de la ventana de muestras",
+                       fn=lambda: self.min_delay if self.min_delay is not None else float('nan'))
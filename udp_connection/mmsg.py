@@ -0,0 +1,105 @@
+# udp_connection/mmsg.py
+# Enlace mínimo por ctypes a sendmmsg/recvmmsg (Linux).
+# Si la libc no expone estas llamadas, AVAILABLE queda en False y los
+# llamadores deben usar el camino de un datagrama por syscall.
+import ctypes
+import ctypes.util
+import socket
+import sys
+
+import numpy as np
+
+
+class IOVec(ctypes.Structure):
+    _fields_ = [
+        ("iov_base", ctypes.c_void_p),
+        ("iov_len", ctypes.c_size_t),
+    ]
+
+
+class MsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_name", ctypes.c_void_p),
+        ("msg_namelen", ctypes.c_uint32),
+        ("msg_iov", ctypes.POINTER(IOVec)),
+        ("msg_iovlen", ctypes.c_size_t),
+        ("msg_control", ctypes.c_void_p),
+        ("msg_controllen", ctypes.c_size_t),
+        ("msg_flags", ctypes.c_int),
+    ]
+
+
+class MMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("msg_hdr", MsgHdr),
+        ("msg_len", ctypes.c_uint),
+    ]
+
+
+class SockAddrIn(ctypes.Structure):
+    _fields_ = [
+        ("sin_family", ctypes.c_ushort),
+        ("sin_port", ctypes.c_uint16),
+        ("sin_addr", ctypes.c_uint8 * 4),
+        ("sin_zero", ctypes.c_uint8 * 8),
+    ]
+
+
+class CMsgHdr(ctypes.Structure):
+    _fields_ = [
+        ("cmsg_len", ctypes.c_size_t),
+        ("cmsg_level", ctypes.c_int),
+        ("cmsg_type", ctypes.c_int),
+    ]
+
+
+MSG_DONTWAIT = getattr(socket, "MSG_DONTWAIT", 0x40)
+MSG_WAITFORONE = 0x10000
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint, ctypes.c_int]
+        libc.sendmmsg.restype = ctypes.c_int
+        libc.recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(MMsgHdr), ctypes.c_uint,
+                                  ctypes.c_int, ctypes.c_void_p]
+        libc.recvmmsg.restype = ctypes.c_int
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+libc = _load_libc()
+AVAILABLE = libc is not None
+
+
+def buffer_address(buf):
+    """Dirección de memoria de cualquier objeto con protocolo buffer (incluye vistas de solo lectura)."""
+    return np.frombuffer(buf, dtype=np.uint8).ctypes.data if len(buf) else 0
+
+
+def fill_sockaddr(sockaddr: SockAddrIn, addr):
+    """Rellena un sockaddr_in a partir de una tupla (host, puerto) IPv4."""
+    sockaddr.sin_family = socket.AF_INET
+    sockaddr.sin_port = socket.htons(addr[1])
+    sockaddr.sin_addr[:] = socket.inet_aton(addr[0])
+
+
+def parse_sockaddr(sockaddr: SockAddrIn):
+    """Convierte un sockaddr_in en tupla (host, puerto)."""
+    return socket.inet_ntoa(bytes(sockaddr.sin_addr)), socket.ntohs(sockaddr.sin_port)
+
+
+def sendmmsg(fd, msgvec, vlen, flags=0):
+    """Devuelve (enviados, errno). enviados = -1 si la llamada falló."""
+    n = libc.sendmmsg(fd, msgvec, vlen, flags)
+    return n, (ctypes.get_errno() if n < 0 else 0)
+
+
+def recvmmsg(fd, msgvec, vlen, flags=0):
+    """Devuelve (recibidos, errno). recibidos = -1 si la llamada falló."""
+    n = libc.recvmmsg(fd, msgvec, vlen, flags, None)
+    return n, (ctypes.get_errno() if n < 0 else 0)
@@ -0,0 +1,106 @@
+import collections
+import struct
+import time
+
+from encoder.chunker import HEADER, HEADER_SIZE, FLAG_PARITY, FLAG_RETRANSMIT
+
+# Paquete NACK (cliente → servidor): b'NACK' + frame_id + cantidad + índices faltantes
+NACK_PREFIX = b'NACK'
+NACK_HEADER = struct.Struct('>HH')
+NACK_MAX_INDICES = 600  # Mantiene el NACK dentro de un datagrama de ~1.2 KB
+
+
+def pack_nack(frame_id: int, indices) -> bytes:
+    indices = list(indices)[:NACK_MAX_INDICES]
+    return NACK_PREFIX + NACK_HEADER.pack(frame_id, len(indices)) + struct.pack(f'>{len(indices)}H', *indices)
+
+
+def parse_nack(data: bytes):
+    """Devuelve (frame_id, [índices]) o None si el paquete no es un NACK válido."""
+    if not data.startswith(NACK_PREFIX) or len(data) < len(NACK_PREFIX) + NACK_HEADER.size:
+        return None
+    frame_id, count = NACK_HEADER.unpack_from(data, len(NACK_PREFIX))
+    offset = len(NACK_PREFIX) + NACK_HEADER.size
+    if len(data) < offset + 2 * count:
+        return None
+    return frame_id, list(struct.unpack_from(f'>{count}H', data, offset))
+
+
+class RetransmitCache:
+    """
+    Caché acotada de los últimos chunks enviados, indexada por (frame_id, chunk_index).
+    Funciona como un anillo: al superar capacity se descartan los más antiguos.
+    Las retransmisiones se limitan con un token bucket (rate por segundo, ráfaga burst).
+    """
+    def __init__(self, capacity: int = 4096, rate: float = 2000.0, burst: int = 200, metrics=None):
+        self.capacity = capacity
+        self.entries = {}
+        self.order = collections.deque()
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill = time.monotonic()
+        self.metrics = metrics
+
+        self.hits = 0
+        self.misses = 0
+        self.rate_limited = 0
+
+    def store(self, chunks):
+        """Guarda los chunks de datos de un frame (bytes o tuplas (cabecera, payload))."""
+        for chunk in chunks:
+            header = chunk[0] if isinstance(chunk, tuple) else chunk
+            frame_id, chunk_index, _, _, flags, _ = HEADER.unpack_from(header)
+            if flags & FLAG_PARITY:
+                continue
+
+            # Cabecera propia con la marca de retransmisión (la original puede estar en un slab reutilizado)
+            marked = bytearray(header[:HEADER_SIZE])
+            marked[7] |= FLAG_RETRANSMIT
+            payload = chunk[1] if isinstance(chunk, tuple) else memoryview(chunk)[HEADER_SIZE:]
+
+            key = (frame_id, chunk_index)
+            if key not in self.entries:
+                self.order.append(key)
+            self.entries[key] = (bytes(marked), payload)
+
+        while len(self.order) > self.capacity:
+            self.entries.pop(self.order.popleft(), None)
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+    def lookup(self, frame_id: int, indices):
+        """Devuelve los chunks a retransmitir como tuplas (cabecera, payload)."""
+        packets = []
+        for index in indices:
+            entry = self.entries.get((frame_id, index))
+            if entry is None:
+                self.misses += 1
+                if self.metrics:
+                    self.metrics.log_retransmit_lookup(False)
+                continue
+            self.hits += 1
+            if self.metrics:
+                self.metrics.log_retransmit_lookup(True)
+            if not self._take_token():
+                self.rate_limited += 1
+                continue
+            packets.append(entry)
+        return packets
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            'rate_limited': self.rate_limited,
+        }
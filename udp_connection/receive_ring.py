@@ -0,0 +1,130 @@
+import ctypes
+import errno
+import socket
+import struct
+
+from udp_connection import mmsg
+
+# SO_RXQ_OVFL no siempre está expuesto por el módulo socket (valor de Linux)
+SO_RXQ_OVFL = getattr(socket, "SO_RXQ_OVFL", 40)
+_OVFL_CMSG_SPACE = 32  # >= CMSG_SPACE(sizeof(uint32)) en 32 y 64 bits
+
+
+class ReceiveRing:
+    """
+    Anillo de recepción preasignado: un único slab dividido en slots de tamaño fijo.
+    Cada llamada a receive_batch() llena el siguiente grupo de batch_size slots con
+    recvmmsg (o recvmsg_into/recvfrom_into como fallback) y devuelve la lista de
+    vistas (memoryview) de los datagramas recibidos.
+
+    Las vistas de un lote se reutilizan tras num_batches lotes: el consumidor debe
+    terminar de procesar (o copiar) cada lote antes de que el anillo dé la vuelta.
+    """
+    def __init__(self, sock: socket.socket, slot_size: int = 1416, batch_size: int = 64,
+                 num_batches: int = 16, use_recvmmsg: bool = True):
+        self.socket = sock
+        self.slot_size = slot_size
+        self.batch_size = batch_size
+        self.num_batches = num_batches
+        self.next_batch = 0
+
+        self.slab = bytearray(slot_size * batch_size * num_batches)
+        view = memoryview(self.slab)
+        self.slots = [view[i * slot_size:(i + 1) * slot_size] for i in range(batch_size * num_batches)]
+
+        # Contador de descartes del kernel (SO_RXQ_OVFL, acumulado por el socket)
+        self.kernel_drops = 0
+        self.truncated = 0
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, SO_RXQ_OVFL, 1)
+            self.ovfl_enabled = True
+        except (OSError, AttributeError):
+            self.ovfl_enabled = False
+
+        self.use_recvmmsg = use_recvmmsg and mmsg.AVAILABLE and sock.family == socket.AF_INET
+        self.use_recvmsg = hasattr(sock, "recvmsg_into")
+        if self.use_recvmmsg:
+            self._setup_mmsg()
+
+    def _setup_mmsg(self):
+        total_slots = self.batch_size * self.num_batches
+        slab_base = ctypes.addressof((ctypes.c_char * len(self.slab)).from_buffer(self.slab))
+        self._iovs = (mmsg.IOVec * total_slots)()
+        for i in range(total_slots):
+            self._iovs[i].iov_base = slab_base + i * self.slot_size
+            self._iovs[i].iov_len = self.slot_size
+        self._control = ctypes.create_string_buffer(_OVFL_CMSG_SPACE * self.batch_size)
+        self._msgs = (mmsg.MMsgHdr * self.batch_size)()
+
+    def receive_batch(self):
+        """Bloquea hasta el primer datagrama y devuelve todos los disponibles (hasta batch_size)."""
+        first_slot = self.next_batch * self.batch_size
+        self.next_batch = (self.next_batch + 1) % self.num_batches
+        if self.use_recvmmsg:
+            return self._receive_mmsg(first_slot)
+        return self._receive_fallback(first_slot)
+
+    def _receive_mmsg(self, first_slot):
+        control_base = ctypes.addressof(self._control)
+        for i in range(self.batch_size):
+            hdr = self._msgs[i].msg_hdr
+            hdr.msg_name = None
+            hdr.msg_namelen = 0
+            hdr.msg_iov = ctypes.pointer(self._iovs[first_slot + i])
+            hdr.msg_iovlen = 1
+            hdr.msg_control = control_base + i * _OVFL_CMSG_SPACE
+            hdr.msg_controllen = _OVFL_CMSG_SPACE
+            hdr.msg_flags = 0
+
+        while True:
+            received, err = mmsg.recvmmsg(self.socket.fileno(), self._msgs, self.batch_size,
+                                          mmsg.MSG_WAITFORONE)
+            if received >= 0:
+                break
+            if err != errno.EINTR:
+                raise OSError(err, "recvmmsg falló")
+
+        packets = []
+        for i in range(received):
+            msg = self._msgs[i]
+            if msg.msg_hdr.msg_flags & socket.MSG_TRUNC:
+                self.truncated += 1
+                continue
+            if msg.msg_hdr.msg_controllen:
+                self._parse_ovfl_cmsg(msg.msg_hdr.msg_control, msg.msg_hdr.msg_controllen)
+            packets.append(self.slots[first_slot + i][:msg.msg_len])
+        return packets
+
+    def _parse_ovfl_cmsg(self, address, length):
+        header_size = ctypes.sizeof(mmsg.CMsgHdr)
+        if length < header_size + 4:
+            return
+        cmsg = mmsg.CMsgHdr.from_address(address)
+        if cmsg.cmsg_level == socket.SOL_SOCKET and cmsg.cmsg_type == SO_RXQ_OVFL:
+            self.kernel_drops = ctypes.c_uint32.from_address(address + header_size).value
+
+    def _receive_fallback(self, first_slot):
+        packets = []
+        flags = 0  # El primero bloquea; el resto se lee sin esperar
+        for i in range(self.batch_size):
+            slot = self.slots[first_slot + i]
+            try:
+                if self.use_recvmsg:
+                    nbytes, ancdata, msg_flags, _ = self.socket.recvmsg_into(
+                        [slot], socket.CMSG_SPACE(4), flags)
+                    for level, kind, data in ancdata:
+                        if level == socket.SOL_SOCKET and kind == SO_RXQ_OVFL and len(data) >= 4:
+                            self.kernel_drops = struct.unpack('I', data[:4])[0]
+                    if msg_flags & socket.MSG_TRUNC:
+                        self.truncated += 1
+                        flags = mmsg.MSG_DONTWAIT
+                        continue
+                else:
+                    nbytes, _ = self.socket.recvfrom_into(slot, 0, flags)
+            except (BlockingIOError, InterruptedError):
+                break
+            packets.append(slot[:nbytes])
+            if not hasattr(socket, "MSG_DONTWAIT"):
+                break  # Sin lectura no bloqueante: un datagrama por lote
+            flags = mmsg.MSG_DONTWAIT
+        return packets
@@ -0,0 +1,236 @@
+import queue
+import threading
+import time
+from typing import Optional
+
+# Mensajes de control de los clientes
+MSG_JOIN = b'READY'
+MSG_LEAVE = b'BYE'
+MSG_HEARTBEAT = b'HEARTBEAT'
+MSG_KEYFRAME = b'KEYFRAME'
+
+
+class Subscriber:
+    """
+    Un cliente suscripto: cola de envío propia y un hilo que la vacía.
+    Si la cola se llena (cliente lento) se descarta el frame más antiguo de ese
+    cliente, sin frenar al resto.
+    """
+    def __init__(self, addr, server, queue_size: int = 4):
+        self.addr = addr
+        self.server = server
+        self.send_queue = queue.Queue(maxsize=queue_size)
+        self.joined_at = time.monotonic()
+        self.last_seen = self.joined_at
+
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.packets_sent = 0
+        self.bytes_sent = 0
+
+        self.running = True
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        try:
+            self.send_queue.put_nowait(None)
+        except queue.Full:
+            pass
+        if self.thread.is_alive():
+            self.thread.join(timeout=1.0)
+
+    def enqueue(self, chunks):
+        while True:
+            try:
+                self.send_queue.put_nowait(chunks)
+                return
+            except queue.Full:
+                try:
+                    self.send_queue.get_nowait()
+                    self.frames_dropped += 1
+                except queue.Empty:
+                    pass
+
+    def _run(self):
+        while self.running:
+            try:
+                chunks = self.send_queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if chunks is None:
+                break
+            self.server.send_chunks(chunks, self.addr, store=False)
+            self.frames_sent += 1
+            self.packets_sent += len(chunks)
+            self.bytes_sent += sum(
+                sum(len(piece) for piece in chunk) if isinstance(chunk, tuple) else len(chunk)
+                for chunk in chunks
+            )
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        return {
+            'connected_s': now - self.joined_at,
+            'idle_s': now - self.last_seen,
+            'frames_sent': self.frames_sent,
+            'frames_dropped': self.frames_dropped,
+            'packets_sent': self.packets_sent,
+            'bytes_sent': self.bytes_sent,
+            'queued': self.send_queue.qsize(),
+        }
+
+
+class SubscriberRegistry:
+    """
+    Registro de clientes de un servidor: alta con READY, baja con BYE y expiración
+    si no se recibe nada (p. ej. HEARTBEAT) durante timeout_s.
+    Cada frame se codifica y divide una sola vez y broadcast() lo reparte a todos.
+    Si el servidor está en modo multicast, el frame se envía una sola vez al grupo
+    y el registro solo lleva la cuenta de quién sigue mirando.
+    on_join se llama con la dirección de cada cliente nuevo y on_keyframe_request
+    cuando un cliente pide KEYFRAME (p. ej. para forzar un keyframe).
+    """
+    def __init__(self, server, timeout_s: float = 10.0, queue_size: int = 4,
+                 max_subscribers: int = 64, on_join=None, on_keyframe_request=None):
+        self.server = server
+        self.timeout_s = timeout_s
+        self.queue_size = queue_size
+        self.max_subscribers = max_subscribers
+        self.on_join = on_join
+        self.on_keyframe_request = on_keyframe_request
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+        self.group_sender = None
+        multicast_addr = getattr(server, 'multicast_addr', None)
+        if multicast_addr:
+            self.group_sender = Subscriber(multicast_addr, server, queue_size)
+            self.group_sender.start()
+
+    def join(self, addr) -> bool:
+        with self.lock:
+            subscriber = self.subscribers.get(addr)
+            if subscriber is not None:
+                subscriber.last_seen = time.monotonic()
+                return True
+            if len(self.subscribers) >= self.max_subscribers:
+                print(f"[SUBSCRIBERS] Rechazado {addr}: se alcanzó el máximo de {self.max_subscribers}")
+                return False
+            subscriber = Subscriber(addr, self.server, self.queue_size)
+            if self.group_sender is None:
+                subscriber.start()  # En multicast envía solo el hilo del grupo
+            self.subscribers[addr] = subscriber
+            self.changed.notify_all()
+        print(f"[SUBSCRIBERS] Cliente unido: {addr} ({len(self.subscribers)} conectados)")
+        if self.on_join:
+            self.on_join(addr)
+        return True
+
+    def leave(self, addr, reason: str = "BYE"):
+        with self.lock:
+            subscriber = self.subscribers.pop(addr, None)
+            self.changed.notify_all()
+        if subscriber is not None:
+            subscriber.stop()
+            print(f"[SUBSCRIBERS] Cliente retirado ({reason}): {addr}, "
+                  f"enviados {subscriber.frames_sent}, descartados {subscriber.frames_dropped}")
+
+    def touch(self, addr):
+        with self.lock:
+            subscriber = self.subscribers.get(addr)
+            if subscriber is not None:
+                subscriber.last_seen = time.monotonic()
+
+    def expire(self):
+        """Da de baja a los clientes sin actividad durante más de timeout_s."""
+        now = time.monotonic()
+        with self.lock:
+            stale = [addr for addr, s in self.subscribers.items() if now - s.last_seen > self.timeout_s]
+        for addr in stale:
+            self.leave(addr, reason="timeout")
+
+    def handle_message(self, data: bytes, addr):
+        """Procesa un mensaje de control de un cliente."""
+        message = data.strip()
+        if message == MSG_JOIN:
+            self.join(addr)
+        elif message == MSG_LEAVE:
+            self.leave(addr)
+        elif message == MSG_KEYFRAME:
+            self.touch(addr)
+            if self.on_keyframe_request:
+                self.on_keyframe_request(addr)
+        else:
+            self.touch(addr)
+
+    def broadcast(self, chunks) -> int:
+        """Encola el mismo frame ya dividido para todos los clientes; devuelve cuántos lo recibirán."""
+        cache = self.server.retransmit_cache
+        if cache:
+            cache.store(chunks)  # Una sola vez: los NACK se responden al cliente que los pide
+        with self.lock:
+            subscribers = list(self.subscribers.values())
+        if self.group_sender is not None:
+            if subscribers:
+                self.group_sender.enqueue(chunks)
+            return len(subscribers)
+        for subscriber in subscribers:
+            subscriber.enqueue(chunks)
+        return len(subscribers)
+
+    def wait_for_subscriber(self, timeout: Optional[float] = None) -> bool:
+        with self.lock:
+            return bool(self.changed.wait_for(lambda: self.subscribers, timeout=timeout))
+
+    def control_addresses(self) -> list:
+        """Destinos de los avisos del servidor (PAUSE, RESUME): el grupo en multicast, o cada cliente."""
+        if self.group_sender is not None:
+            return [self.group_sender.addr]
+        return self.addresses()
+
+    def addresses(self) -> list:
+        with self.lock:
+            return list(self.subscribers)
+
+    def count(self) -> int:
+        with self.lock:
+            return len(self.subscribers)
+
+    def close(self):
+        """Detiene los hilos de envío y avisa el cierre a todos los clientes."""
+        with self.lock:
+            subscribers = list(self.subscribers.values())
+            self.subscribers.clear()
+        for subscriber in subscribers:
+            subscriber.stop()
+            if self.group_sender is None:
+                self.server.send_eof(subscriber.addr)
+        if self.group_sender is not None:
+            self.group_sender.stop()
+            self.server.send_eof(self.group_sender.addr)
+
+    def _max_queued(self) -> int:
+        with self.lock:
+            senders = list(self.subscribers.values())
+        if self.group_sender is not None:
+            senders.append(self.group_sender)
+        return max((sender.send_queue.qsize() for sender in senders), default=0)
+
+    def register_metrics(self, registry):
+        """Gauges evaluados al exportar: clientes conectados y la cola de envío más cargada."""
+        registry.gauge('subscribers', "Clientes suscriptos", fn=self.count)
+        registry.gauge('subscriber_queue_depth_max', "Frames en la cola de envío más cargada",
+                       fn=self._max_queued)
+
+    def get_stats(self) -> dict:
+        """Estadísticas por cliente, indexadas por dirección (en multicast, también las del grupo)."""
+        with self.lock:
+            stats = {addr: s.get_stats() for addr, s in self.subscribers.items()}
+        if self.group_sender is not None:
+            stats[self.group_sender.addr] = self.group_sender.get_stats()
+        return stats
@@ -1,21 +1,64 @@
 import socket
-import keyboard
+import struct
+import threading
+from udp_connection.receive_ring import ReceiveRing
+from udp_connection.nack import pack_nack
 
 class UDPClient:
-    def __init__(self, host_ip='127.0.0.1', port=9999, buffer_size=1024):
+    def __init__(self, host_ip='127.0.0.1', port=9999, buffer_size=1024,
+                 multicast_group=None, multicast_port=None, multicast_interface='0.0.0.0'):
         self.host_ip = host_ip
         self.port = port
         self.buffer_size = buffer_size
         self.socket = None
+        self.control_socket = None  # Envíos al servidor (READY, heartbeats, NACK)
+        self.receive_ring = None
+        self.heartbeat_stop = threading.Event()
+        self.heartbeat_thread = None
+        # Modo multicast: los chunks (y PAUSE, EOF y retransmisiones) llegan por el grupo;
+        # el control hacia (host_ip, port) sale por un socket unicast propio, así cada
+        # cliente del mismo equipo es un suscriptor distinto para el servidor.
+        self.multicast_group = multicast_group
+        self.multicast_port = multicast_port or port + 1
+        self.multicast_interface = multicast_interface
+        self.multicast_joined = False
 
     def set_socket(self):
         """Crea el socket UDP del cliente."""
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.control_socket = self.socket
+        if self.multicast_group:
+            # Varios clientes en el mismo equipo pueden compartir el puerto del grupo
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind(('', self.multicast_port))
+            self.join_multicast()
+            self.control_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def _membership(self):
+        return struct.pack('4s4s', socket.inet_aton(self.multicast_group),
+                           socket.inet_aton(self.multicast_interface))
+
+    def join_multicast(self):
+        """Se une al grupo multicast en la interfaz configurada."""
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, self._membership())
+        self.multicast_joined = True
+        print(f"[CLIENT] Unido al grupo {self.multicast_group}:{self.multicast_port} "
+              f"(interfaz {self.multicast_interface})")
+
+    def leave_multicast(self):
+        """Abandona el grupo multicast (el socket sigue sirviendo para el control unicast)."""
+        if not self.multicast_joined:
+            return
+        try:
+            self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_DROP_MEMBERSHIP, self._membership())
+        except socket.error as e:
+            print(f"[ERROR] Al abandonar el grupo multicast: {e}")
+        self.multicast_joined = False
 
     def send_packet(self, data):
         """Envía datos al servidor."""
         try:
-            self.socket.sendto(data.encode(), (self.host_ip, self.port))
+            self.control_socket.sendto(data.encode(), (self.host_ip, self.port))
             print(f"[CLIENT] Enviado a {self.host_ip}:{self.port} -> {data}")
         except socket.error as e:
             print(f"[ERROR] Al enviar datos: {e}")
@@ -41,6 +84,54 @@ class UDPClient:
             print(f"[ERROR] Al recibir chunk: {e}")
             return None, None
 
+    def send_nack(self, frame_id, indices):
+        """Pide al servidor que reenvíe los chunks faltantes de un frame."""
+        try:
+            self.control_socket.sendto(pack_nack(frame_id, indices), (self.host_ip, self.port))
+        except socket.error as e:
+            print(f"[ERROR] Al enviar NACK: {e}")
+
+    def start_heartbeat(self, interval=2.0):
+        """Avisa periódicamente al servidor que el cliente sigue conectado."""
+        def loop():
+            while not self.heartbeat_stop.wait(interval):
+                try:
+                    self.control_socket.sendto(b'HEARTBEAT', (self.host_ip, self.port))
+                except socket.error as e:
+                    print(f"[ERROR] Al enviar heartbeat: {e}")
+
+        self.heartbeat_stop.clear()
+        self.heartbeat_thread = threading.Thread(target=loop, daemon=True)
+        self.heartbeat_thread.start()
+
+    def send_bye(self):
+        """Detiene el heartbeat y avisa al servidor que el cliente se retira."""
+        self.heartbeat_stop.set()
+        self.send_packet("BYE")
+        self.leave_multicast()
+
+    def request_keyframe(self):
+        """Pide al servidor un frame completo (p. ej. tras perder un delta)."""
+        self.send_packet("KEYFRAME")
+
+    def enable_receive_ring(self, batch_size=64, num_batches=16):
+        """Activa la recepción por lotes sobre un anillo de slots preasignados."""
+        self.receive_ring = ReceiveRing(self.socket, slot_size=self.buffer_size,
+                                        batch_size=batch_size, num_batches=num_batches)
+        return self.receive_ring
+
+    def receive_batch(self):
+        """Recibe un lote de chunks como vistas sobre el anillo (lista vacía si hubo error)."""
+        try:
+            return self.receive_ring.receive_batch()
+        except socket.error as e:
+            print(f"[ERROR] Al recibir lote: {e}")
+            return []
+
+    def get_kernel_drops(self):
+        """Datagramas descartados por el kernel según SO_RXQ_OVFL (0 si no hay anillo)."""
+        return self.receive_ring.kernel_drops if self.receive_ring else 0
+
     #funciones para cerrar el servidor al apretar "q"
     def is_eof(self, data):
         """Detecta si el paquete es EOF."""
@@ -48,4 +139,5 @@ class UDPClient:
 
     def should_stop(self):
         """Detecta si el usuario presiona 'q'."""
+        import keyboard  # Solo al usar las teclas: el cliente puede correr sin teclado (benchmarks)
         return keyboard.is_pressed('q')
\ No newline at end of file
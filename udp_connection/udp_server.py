@@ -1,21 +1,59 @@
 import socket
+import select
+import struct
 from encoder.chunker import Chunker
-import keyboard
+from udp_connection.batch_sender import BatchSender
+from udp_connection.nack import parse_nack
+from udp_connection.clocksync import PING_PREFIX, pong_reply, stream_time
 
 class UDPServer:
-    def __init__(self, host_ip='0.0.0.0', port=9999, buffer_size=1024):
+    def __init__(self, host_ip='0.0.0.0', port=9999, buffer_size=1024, zero_copy=False,
+                 batch_send=False, batch_size=64, fec=None, retransmit_cache=None,
+                 multicast_group=None, multicast_port=None, multicast_ttl=1,
+                 multicast_interface='0.0.0.0', multicast_loop=True, tracer=None):
         self.host_ip = host_ip
         self.port = port
         self.buffer_size = buffer_size
         self.socket = None
         #creo un objeto de tipo chunker para enviar datos
-        self.chunker = Chunker(payload_size=buffer_size - 16)  # 16 bytes para el header
+        self.chunker = Chunker(payload_size=buffer_size - 16, fec=fec)  # 16 bytes para el header
         self.paused = False  # ← NUEVO
+        # Modo zero-copy: cabecera y payload se envían por separado con sendmsg
+        self.zero_copy = zero_copy and hasattr(socket.socket, 'sendmsg')
+        # Envío por lotes (sendmmsg); el BatchSender se crea junto con el socket
+        self.batch_send = batch_send
+        self.batch_size = batch_size
+        self.batch_sender = None
+        self.last_batch_report = None
+        # Caché de chunks enviados para responder NACKs (None = modo NACK desactivado)
+        self.retransmit_cache = retransmit_cache
+        # Modo multicast: los frames (y las retransmisiones) van una sola vez al grupo; el
+        # puerto propio queda como canal unicast de control (READY, heartbeats, NACK, KEYFRAME)
+        self.multicast_addr = (multicast_group, multicast_port or port + 1) if multicast_group else None
+        self.multicast_ttl = multicast_ttl
+        self.multicast_interface = multicast_interface
+        self.multicast_loop = multicast_loop
+        self.tracer = tracer  # FrameTracer opcional: marca el primer y el último envío de cada frame
 
     def set_socket(self):
         """Crea y configura el socket UDP."""
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
         self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.multicast_addr:
+            self.set_multicast_options()
+        if self.batch_send:
+            self.batch_sender = BatchSender(self.socket, batch_size=self.batch_size)
+
+    def set_multicast_options(self):
+        """
+        TTL, interfaz de salida y loopback para los envíos al grupo.
+        Para probar en un solo equipo: interfaz '127.0.0.1' y `ip link set lo multicast on`.
+        """
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, struct.pack('b', self.multicast_ttl))
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.multicast_interface))
+        self.socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1 if self.multicast_loop else 0)
+        print(f"[SERVER] Multicast hacia {self.multicast_addr[0]}:{self.multicast_addr[1]} "
+              f"(TTL {self.multicast_ttl}, interfaz {self.multicast_interface})")
 
     def bind(self):
         """Vincula el socket al host y puerto especificados."""
@@ -48,9 +86,112 @@ class UDPServer:
 
     def send_frame_chunks(self, frame_data, addr, quality_id, is_keyframe):
         """Divide un frame en chunks y los envía al cliente."""
+        if self.batch_sender:
+            if self.zero_copy:
+                chunks = self.chunker.chunk_frame_views(frame_data, quality_id, is_keyframe)
+            else:
+                chunks = self.chunker.chunk_frame(frame_data, quality_id, is_keyframe)
+            self.send_chunks(chunks, addr)
+            return
+
+        if self.zero_copy:
+            self.send_frame_views(frame_data, addr, quality_id, is_keyframe)
+            return
+
         chunks = self.chunker.chunk_frame(frame_data, quality_id, is_keyframe)
+        self.send_chunks(chunks, addr)
+
+    def send_frame_views(self, frame_data, addr, quality_id, is_keyframe):
+        """Envía el frame sin copiarlo: cada datagrama es [cabecera, vista del payload]."""
+        for header, payload in self.chunker.iter_chunk_views(frame_data, quality_id, is_keyframe):
+            if self.retransmit_cache:
+                self.retransmit_cache.store([(header, payload)])
+            try:
+                self.socket.sendmsg([header, payload], [], 0, addr)
+            except socket.error as e:
+                print(f"[ERROR] Al enviar chunk: {e}")
+
+    def build_chunks(self, frame_data, quality_id, is_keyframe):
+        """
+        Divide el frame una sola vez para repartirlo a varios clientes.
+        En zero-copy las cabeceras se copian fuera del slab reutilizable (los
+        payloads siguen siendo vistas del frame) para que sigan válidas mientras
+        los frames esperan en las colas de cada cliente.
+        """
+        if self.zero_copy:
+            views = self.chunker.chunk_frame_views(frame_data, quality_id, is_keyframe)
+            return [(bytes(header), payload) for header, payload in views]
+        return self.chunker.chunk_frame(frame_data, quality_id, is_keyframe)
+
+    def send_chunks(self, chunks, addr, store=True):
+        """
+        Envía una lista de chunks ya armados, por lotes si está habilitado.
+        store=False si los chunks ya se guardaron en la caché de retransmisión.
+        """
+        if store and self.retransmit_cache:
+            self.retransmit_cache.store(chunks)
+        if self.tracer is None:
+            return self._send_raw(chunks, addr)
+        started = stream_time()
+        report = self._send_raw(chunks, addr)
+        self.tracer.mark_sent(chunks, started, stream_time())
+        return report
+
+    def _send_raw(self, chunks, addr):
+        if self.batch_sender:
+            self.last_batch_report = self.batch_sender.send(chunks, addr)
+            return self.last_batch_report
         for chunk in chunks:
-            self.send_packet_bytes(chunk, addr)
+            if isinstance(chunk, tuple):
+                try:
+                    self.socket.sendmsg(list(chunk), [], 0, addr)
+                except (socket.error, AttributeError):
+                    self.send_packet_bytes(b''.join(chunk), addr)
+            else:
+                self.send_packet_bytes(chunk, addr)
+
+    def handle_nack(self, data, addr):
+        """Responde un NACK reenviando desde la caché los chunks pedidos."""
+        request = parse_nack(data)
+        if request is None or self.retransmit_cache is None:
+            return
+        frame_id, indices = request
+        packets = self.retransmit_cache.lookup(frame_id, indices)
+        if packets:
+            self._send_raw(packets, self.multicast_addr or addr)
+
+    def handle_ping(self, data, addr, received):
+        """Responde un ping de sincronización de reloj (ver udp_connection/clocksync.py)."""
+        reply = pong_reply(data, received)
+        if reply is not None:
+            self.send_packet_bytes(reply, addr)
+
+    def poll_control(self, timeout=0.0):
+        """
+        Lee los mensajes de control pendientes sin bloquear más de timeout.
+        Los NACK y los pings de reloj se atienden acá; el resto se devuelve como lista de (data, addr).
+        """
+        messages = []
+        while True:
+            readable, _, _ = select.select([self.socket], [], [], timeout)
+            if not readable:
+                return messages
+            timeout = 0.0  # Después del primero, solo se drena lo que ya llegó
+            try:
+                data, addr = self.socket.recvfrom(self.buffer_size)
+            except socket.error as e:
+                print(f"[ERROR] Al recibir control: {e}")
+                return messages
+            if data.startswith(PING_PREFIX):
+                self.handle_ping(data, addr, stream_time())
+            elif data.startswith(b'NACK'):
+                self.handle_nack(data, addr)
+            else:
+                messages.append((data, addr))
+
+    def get_send_stats(self):
+        """Estadísticas del envío por lotes (None si no está habilitado)."""
+        return self.batch_sender.get_stats() if self.batch_sender else None
 
     #para enviarlos por bytes
     def send_packet_bytes(self, byte_data, addr):
@@ -69,11 +210,13 @@ class UDPServer:
 
     def should_stop(self):
         """Devuelve True si se presionó 'q'."""
+        import keyboard  # Solo al usar las teclas: el servidor puede correr sin teclado (benchmarks)
         return keyboard.is_pressed('q')
 
     #funciones para pausar el servidor con la tecla "p"
     def toggle_pause(self, addr=None):
         """Alterna el estado de pausa si se presiona 'p'."""
+        import keyboard
         if keyboard.is_pressed('p'):
             self.paused = not self.paused
             print(f"[SERVER] {'PAUSADO' if self.paused else 'REANUDADO'}")
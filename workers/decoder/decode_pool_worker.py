@@ -0,0 +1,237 @@
+import threading
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+from decoder.catchup import CatchUpController
+from decoder.livevideoviewer import LiveVideoViewer, decode_jpeg, fit_to_window
+from encoder.tiledelta import is_tile_delta
+
+# Memorias compartidas ya abiertas en cada proceso decodificador (nombre → (SharedMemory, slots))
+_attached = {}
+
+
+def _init_decoder_process():
+    cv2.setNumThreads(1)  # El paralelismo lo da el pool: sin hilos internos compitiendo por los núcleos
+
+
+def _decode_into(frame_data, factor: int, out, display: bool):
+    """
+    Trabajo del pool de hilos: decodifica y, si se va a mostrar, escala sobre el slot.
+    Devuelve ((imagen decodificada, factor) o None si el JPEG no es válido, duración).
+    """
+    started = time.perf_counter()
+    image = decode_jpeg(frame_data, factor)
+    if image is None:
+        return None, time.perf_counter() - started
+    if display:
+        fit_to_window(image, out.shape[1], out.shape[0], out=out)
+    return (image, factor), time.perf_counter() - started
+
+
+def _decode_shared(name: str, shape, slot: int, frame_data: bytes, factor: int):
+    """
+    Trabajo del pool de procesos: decodifica y escala directo sobre el slot en memoria
+    compartida. Devuelve ((ancho, alto) del stream o None si el JPEG no es válido, duración).
+    """
+    started = time.perf_counter()
+    if name not in _attached:
+        shm = shared_memory.SharedMemory(name=name)
+        _attached[name] = (shm, np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+    slots = _attached[name][1]
+    image = decode_jpeg(frame_data, factor)
+    if image is None:
+        return None, time.perf_counter() - started
+    fit_to_window(image, shape[2], shape[1], out=slots[slot])
+    return (image.shape[1] * factor, image.shape[0] * factor), time.perf_counter() - started
+
+
+class DecodePoolWorker:
+    """
+    Decodificación JPEG en paralelo con presentación en orden.
+    Un hilo toma los frames listos de la cola de reproducción (con la política de
+    puesta al día si hay CatchUpController) y los reparte a un pool de hilos (cv2
+    libera el GIL al decodificar) o de procesos; cada frame se escala sobre uno de
+    los max_pending + 1 slots preasignados del tamaño de la ventana. get() entrega
+    los frames en el orden de llegada, listos para cv2.imshow.
+    Los deltas por tiles dependen del canvas anterior: se aplican en get(), en orden,
+    y con deltas los JPEG se decodifican a tamaño completo (en modo procesos, en get()).
+    """
+    def __init__(self,
+                 viewer: LiveVideoViewer,
+                 input_queue: queue.Queue,
+                 workers: int = 2,
+                 mode: str = 'thread',
+                 max_pending: Optional[int] = None,
+                 catchup: Optional[CatchUpController] = None):
+        if mode not in ('thread', 'process'):
+            raise ValueError(f"Modo de decodificación desconocido: {mode}")
+
+        self.viewer = viewer
+        self.input_queue = input_queue
+        self.workers = workers
+        self.mode = mode
+        self.catchup = catchup
+        self.max_pending = max_pending or 2 * workers
+
+        # Un slot más que los frames en vuelo: el último entregado se sigue mostrando
+        # hasta la próxima llamada a get()
+        shape = (self.max_pending + 1, viewer.height, viewer.width, 3)
+        self.shared = None
+        if mode == 'process':
+            self.shared = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+            self.slots = np.ndarray(shape, dtype=np.uint8, buffer=self.shared.buf)
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_decoder_process)
+        else:
+            self.slots = np.zeros(shape, dtype=np.uint8)
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decoder")
+
+        self.in_flight = threading.Semaphore(self.max_pending)
+        self.pending = queue.Queue()  # (future o None, frame_data, metadata, mostrar, slot), en orden
+        self.sequence = 0
+        self.last_full = None  # Último JPEG completo entregado, por si el canvas debe rehacerse
+        self.decode_time = None  # Histograma opcional (register_metrics)
+
+        self.running = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.stop_event = threading.Event()
+
+    def start(self):
+        """Inicia el hilo que reparte los frames al pool."""
+        if not self.running:
+            self.running = True
+            self.thread.start()
+            print(f"[DECODE POOL] {self.workers} decodificadores ({self.mode}), hasta {self.max_pending} frames en vuelo.")
+
+    def stop(self):
+        """Detiene el reparto, espera al pool y libera la memoria compartida."""
+        self.running = False
+        self.stop_event.set()
+        if self.thread.is_alive():
+            self.thread.join()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.shared:
+            self.slots = None
+            try:
+                self.shared.close()
+            except BufferError:
+                pass  # Quedan vistas del último frame mostrado; se libera al terminar el proceso
+            self.shared.unlink()
+        print("[DECODE POOL] Detenido.")
+
+    def register_metrics(self, registry):
+        registry.gauge('decode_pending_frames', "Frames repartidos al pool que aún no se entregaron",
+                       fn=self.pending.qsize)
+        self.decode_time = registry.histogram('decode_time_seconds', "Decodificación y escalado de un frame",
+                                              scale=1e6)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[np.ndarray, dict]]:
+        """
+        Próximo frame para mostrar como (imagen del tamaño de la ventana, metadata), en orden.
+        La imagen es un slot reutilizable: vale hasta la siguiente llamada.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.pending.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            try:
+                image = self._finish(*item)
+            finally:
+                self.in_flight.release()
+            if image is not None:
+                return image, item[2]
+
+    def _finish(self, future, frame_data, metadata, display: bool, slot: int):
+        """Etapa en orden: completa el frame y devuelve el slot a mostrar (None si no se muestra)."""
+        out = self.slots[slot]
+        if future is None:
+            # Delta o JPEG que debe quedar como canvas completo: se decodifica acá, en orden
+            started = time.perf_counter()
+            if is_tile_delta(frame_data):
+                self._ensure_full_canvas()
+            else:
+                self.last_full = frame_data
+            frame = self.viewer.decode_frame(frame_data, metadata=metadata)
+            if frame is None or not display:
+                return None
+            fit_to_window(frame, self.viewer.width, self.viewer.height, out=out)
+            self._record(time.perf_counter() - started)
+            return out
+
+        try:
+            result, elapsed = future.result()
+        except Exception as e:
+            print(f"[DECODE POOL] Error al decodificar el frame {metadata.get('frame_id', 'N/A')}: {e}")
+            return None
+        if result is None:
+            return None
+        self.last_full = frame_data
+        if self.mode == 'thread':
+            self.viewer.set_canvas(*result, metadata)
+        else:
+            # La imagen completa quedó en el proceso decodificador: el canvas ya no corresponde
+            self.viewer.stream_size = result
+            self.viewer.canvas = None
+            self.viewer.full_frame_received(metadata)
+        self._record(elapsed / self.workers)  # Con el pool lleno, cada frame cuesta 1/workers
+        return out if display else None
+
+    def _ensure_full_canvas(self):
+        """
+        El primer delta puede llegar con el canvas reducido o sin canvas (el JPEG previo se
+        decodificó antes de saber que había deltas): se rehace desde el último JPEG completo.
+        """
+        canvas = self.viewer.canvas
+        if canvas is not None and (canvas.shape[1], canvas.shape[0]) == self.viewer.stream_size:
+            return
+        if self.last_full is not None:
+            self.viewer.decode_frame(self.last_full)
+
+    def _record(self, seconds: float):
+        if self.decode_time:
+            self.decode_time.record(seconds)
+        if self.catchup:
+            self.catchup.record_decode(seconds)
+
+    def _next_frames(self):
+        if self.catchup:
+            return self.catchup.next_frames(self.input_queue, timeout=0.1)
+        try:
+            return [self.input_queue.get(timeout=0.1)]
+        except queue.Empty:
+            return []
+
+    def _submit(self, frame_data, metadata, display: bool):
+        slot = self.sequence % len(self.slots)
+        self.sequence += 1
+        future = None
+        # Con deltas el canvas debe ser de tamaño completo; en modo procesos la imagen no
+        # vuelve del decodificador, así que esos JPEG se decodifican en la etapa ordenada
+        in_order = is_tile_delta(frame_data) or (self.viewer.tile_deltas and self.mode == 'process')
+        if not in_order:
+            factor = self.viewer.decode_factor()
+            if self.mode == 'thread':
+                future = self.executor.submit(_decode_into, frame_data, factor, self.slots[slot], display)
+            else:
+                future = self.executor.submit(_decode_shared, self.shared.name, self.slots.shape, slot,
+                                              bytes(frame_data), factor)
+        self.pending.put((future, frame_data, metadata, display, slot))
+
+    def _run(self):
+        """Reparte los frames al pool sin superar max_pending frames sin entregar."""
+        while self.running and not self.stop_event.is_set():
+            frames = self._next_frames()
+            for index, (frame_data, metadata) in enumerate(frames):
+                # Con puesta al día solo se muestra el último; los anteriores actualizan el canvas
+                while not self.in_flight.acquire(timeout=0.1):
+                    if self.stop_event.is_set():
+                        return
+                self._submit(frame_data, metadata, index == len(frames) - 1)
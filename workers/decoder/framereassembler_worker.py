@@ -13,9 +13,14 @@ class FrameReassemblerWorker:
     def __init__(self, reassembler: FrameReassembler,
                  input_queue: queue.Queue,
                  output_queue: Optional[queue.Queue] = None,
-                 max_output_size: int = 60):
+                 max_output_size: int = 60,
+                 idle_timeout: float = 0.1,
+                 nack_sender=None):
 
         self.reassembler = reassembler
+        self.idle_timeout = idle_timeout  # Espera máxima sin plazos pendientes
+        # Callable (frame_id, índices) para pedir retransmisiones, p. ej. UDPClient.send_nack
+        self.nack_sender = nack_sender
         self.input_queue = input_queue
         self.output_queue = output_queue or queue.Queue(maxsize=max_output_size)
 
@@ -37,6 +42,12 @@ class FrameReassemblerWorker:
         self.thread.join()
         print("[REASSEMBLER WORKER] Hilo detenido.")
 
+    def register_metrics(self, registry):
+        registry.gauge('reassembled_queue_depth', "Frames reensamblados esperando el buffer de reproducción",
+                       fn=self.output_queue.qsize)
+        registry.gauge('reassembler_pending_frames', "Frames con chunks pendientes",
+                       fn=lambda: len(self.reassembler.frames))
+
     def get_next_frame(self, timeout: Optional[float] = None):
         """Obtiene el siguiente frame ensamblado desde la cola de salida."""
         #time.sleep(0.03)
@@ -46,26 +57,42 @@ class FrameReassemblerWorker:
             return None
 
     def _run(self):
-        """Loop principal de ensamblado."""
+        """
+        Loop principal de ensamblado. Espera un chunk o el próximo plazo del
+        ensamblador, lo que ocurra primero, para liberar frames vencidos a tiempo
+        aunque no lleguen más paquetes.
+        """
         print("[REASSEMBLER WORKER] Loop de ensamblado iniciado.")
         while self.running and not self.stop_event.is_set():
-            
+            timeout = self.idle_timeout
+            wait = self.reassembler.time_to_next_deadline()
+            if wait is not None:
+                timeout = min(timeout, wait)
+
             try:
                 # Intentar obtener chunk
-                chunk = self.input_queue.get(timeout=0.1)
+                chunk = self.input_queue.get(timeout=timeout)
                 if chunk:
-                    self.reassembler.add_chunk(chunk)
-                    
-                    # Armar todos los frames posibles
-                    while True:
-                        
-                        frame = self.reassembler.get_next_frame()
-                        if frame is None:
-                            break
-                        try:
-                            self.output_queue.put(frame, timeout=0.1)
-                            #print(f"[REASSEMBLER WORKER] Frame encolado: ID {frame['frame_id']}")
-                        except queue.Full:
-                            print("[REASSEMBLER WORKER] Cola de frames llena, frame descartado.")
+                    # En modo por lotes el item es una lista de paquetes
+                    if isinstance(chunk, list):
+                        for packet in chunk:
+                            self.reassembler.add_chunk(packet)
+                    else:
+                        self.reassembler.add_chunk(chunk)
             except queue.Empty:
-                continue
+                pass  # Venció un plazo: puede haber frames parciales o vencidos
+
+            # Armar todos los frames posibles
+            while True:
+                frame = self.reassembler.get_next_frame()
+                if frame is None:
+                    break
+                try:
+                    self.output_queue.put(frame, timeout=0.1)
+                    #print(f"[REASSEMBLER WORKER] Frame encolado: ID {frame['frame_id']}")
+                except queue.Full:
+                    print("[REASSEMBLER WORKER] Cola de frames llena, frame descartado.")
+
+            if self.nack_sender:
+                for frame_id, indices in self.reassembler.collect_nacks():
+                    self.nack_sender(frame_id, indices)
@@ -10,9 +10,18 @@ class UDPReceiverWorker:
     Encapsula el manejo de un cliente UDP en un hilo separado.
     Recibe paquetes (chunks) y los encola para ser procesados por el hilo principal.
     """
-    def __init__(self, udp_client: UDPClient, max_queue_size: int = 2400):
+    def __init__(self, udp_client: UDPClient, max_queue_size: int = 2400,
+                 batch_mode: bool = False, batch_size: int = 64, num_batches: int = 16):
         self.client = udp_client
+        self.batch_mode = batch_mode
+        if batch_mode:
+            # Cada item de la cola es un lote (lista de vistas sobre el anillo).
+            # La cola admite num_batches - 2 lotes: uno se está llenando y otro
+            # lo está procesando el consumidor, así ningún slot se pisa en uso.
+            self.client.enable_receive_ring(batch_size=batch_size, num_batches=num_batches)
+            max_queue_size = max(1, num_batches - 2)
         self.packet_queue = queue.Queue(maxsize=max_queue_size)
+        self.dropped = 0
         self.running = False
         self.thread = threading.Thread(target=self._run, daemon=True)
         self.stop_event = threading.Event()  # alternativa al flag bool si se desea más control
@@ -29,7 +38,17 @@ class UDPReceiverWorker:
         self.running = False
         self.stop_event.set()
         self.thread.join()
-        print("[UDP RECEIVER] Hilo detenido.")
+        print(f"[UDP RECEIVER] Hilo detenido. Descartes: usuario={self.dropped}, kernel={self.get_kernel_drops()}")
+
+    def get_kernel_drops(self) -> int:
+        """Datagramas descartados por el kernel (SO_RXQ_OVFL), solo en modo por lotes."""
+        return self.client.get_kernel_drops()
+
+    def register_metrics(self, registry):
+        registry.gauge('receive_queue_depth', "Paquetes (o lotes) recibidos sin reensamblar",
+                       fn=self.packet_queue.qsize)
+        registry.gauge('receive_dropped_packets', "Paquetes descartados por cola llena", fn=lambda: self.dropped)
+        registry.gauge('receive_kernel_drops', "Datagramas descartados por el kernel", fn=self.get_kernel_drops)
 
     def should_stop(self) -> bool:
         """Consulta si se ha presionado la tecla de parada."""
@@ -39,7 +58,7 @@ class UDPReceiverWorker:
         """
         Devuelve el próximo paquete recibido (si hay alguno).
         :param timeout: Tiempo máximo de espera para obtener el paquete.
-        :return: Bytes del paquete o None si no hay disponible.
+        :return: Bytes del paquete (o lista de paquetes en modo por lotes) o None si no hay disponible.
         """
         #time.sleep(0.028)
         try:
@@ -50,6 +69,10 @@ class UDPReceiverWorker:
     def _run(self):
         """Loop principal del hilo, recibe y encola paquetes UDP."""
         print("[UDP RECEIVER] Loop de recepción iniciado.")
+        if self.batch_mode:
+            self._run_batches()
+            return
+
         while self.running and not self.stop_event.is_set():
  
             try:
@@ -68,7 +91,30 @@ class UDPReceiverWorker:
                     self.packet_queue.put(chunk, timeout=0.1)
                     #print(f"[UDP RECEIVER] Chunk recibido ({len(chunk)} bytes), encolado.")
                 except queue.Full:
+                    self.dropped += 1
                     print("[UDP RECEIVER] Cola llena. Paquete descartado.")
 
             except socket.error as e:
                 print(f"[UDP RECEIVER] Error de socket: {e}")
+
+    def _run_batches(self):
+        """Loop por lotes: un item de la cola por cada llamada a recvmmsg."""
+        while self.running and not self.stop_event.is_set():
+            batch = self.client.receive_batch()
+            if not batch:
+                continue
+
+            # EOF manual por paquete especial
+            if any(self.client.is_eof(packet) for packet in batch):
+                batch = [packet for packet in batch if not self.client.is_eof(packet)]
+                if batch:
+                    self.packet_queue.put(batch)
+                print("[UDP RECEIVER] Paquete EOF detectado, cerrando hilo.")
+                self.running = False
+                break
+
+            try:
+                self.packet_queue.put(batch, timeout=0.1)
+            except queue.Full:
+                self.dropped += len(batch)
+                print(f"[UDP RECEIVER] Cola llena. Lote de {len(batch)} paquetes descartado.")
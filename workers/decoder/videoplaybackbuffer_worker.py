@@ -38,6 +38,11 @@ class VideoPlaybackBufferWorker:
         self.thread.join()
         print("[PLAYBACK WORKER] Hilo detenido.")
 
+    def register_metrics(self, registry):
+        registry.gauge('playback_queue_depth', "Frames listos esperando decodificación",
+                       fn=self.output_queue.qsize)
+        self.video_buffer.register_metrics(registry)
+
     def get_next_decoded_frame(self, timeout: Optional[float] = None) -> Optional[Tuple[bytes, dict]]:
         """
         Devuelve el próximo frame listo para decodificar.
@@ -62,22 +67,28 @@ class VideoPlaybackBufferWorker:
                 self.output_queue.put((frame_data, metadata), timeout=0.01)
                 print(f"[PLAYBACK WORKER] (drain) Frame listo para mostrar (ID: {metadata.get('frame_id', 'N/A')})")
             except queue.Full:
-                print("[PLAYBACK WORKER] (drain) Cola de salida llena, detenemos vaciado.")
+                # El frame ya salió del buffer y se pierde: los deltas que lo siguen no sirven
+                # hasta el próximo keyframe, así que se saltea directo al más nuevo del buffer
+                skipped = self.video_buffer.skip_to_newest_keyframe()
+                print(f"[PLAYBACK WORKER] (drain) Cola de salida llena: frame {metadata.get('frame_id', 'N/A')} "
+                      f"descartado, {skipped} frames salteados hasta el último keyframe.")
                 break
 
     def _run(self):
         """Loop principal del worker de reproducción."""
         print("[PLAYBACK WORKER] Loop de reproducción iniciado.")
         while self.running and not self.stop_event.is_set():
+            # Espera un nuevo frame ensamblado, pero no más allá del instante de reproducción
+            # del primero del buffer (la velocidad adaptativa mueve ese instante)
+            wait = self.video_buffer.time_until_playback()
+            timeout = 0.1 if wait is None else min(0.1, wait)
             try:
-                # Espera un nuevo frame ensamblado
-                frame = self.input_queue.get(timeout=0.1)
+                frame = self.input_queue.get(timeout=timeout) if timeout > 0 else self.input_queue.get_nowait()
                 if frame:
                     self.video_buffer.add_frame(frame)
-
-                # Vaciar agresivamente frames listos
-                self.drain()
-
             except queue.Empty:
-                continue
+                pass
+
+            # Vaciar agresivamente frames listos
+            self.drain()
 
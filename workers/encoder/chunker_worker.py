@@ -1,24 +1,29 @@
 import threading
 import queue
-import collections
-from typing import Optional, Dict, List
+from typing import Optional, Dict
 from encoder.chunker import Chunker
 import struct
 import time
 
 class ChunkerWorker:
     """
-    Worker que divide frames en chunks utilizando un hilo separado,
-    sincronizado con los frames capturados.
+    Worker que divide frames en chunks utilizando un hilo separado.
+    Toma cada frame una sola vez (de source.get_frame() o de enqueue_frame) y deja
+    el resultado en una cola acotada hacia la etapa de red. Si la red va atrasada,
+    este hilo se bloquea y la presión llega hasta la captura, que descarta frames.
     """
-    def __init__(self, chunker: Chunker):
+    def __init__(self, chunker: Chunker, source=None, output_size: int = 2, tracer=None):
         self.chunker = chunker
+        self.tracer = tracer  # FrameTracer opcional
+        self.source = source  # p. ej. ScreenCaptureWorker
         self.input_queue = queue.Queue(maxsize=3)  # evita saturar la cola
-        self.buffer = collections.deque(maxlen=1)
-        self.lock = threading.Lock()
+        self.output_queue = queue.Queue(maxsize=output_size)
         self.running = False
         self.thread = threading.Thread(target=self._run, daemon=True)
 
+        self.chunked_frames = 0
+        self.blocked_time = 0.0  # Tiempo esperando a que la red libere la cola de salida
+
     def start(self):
         """Inicia el hilo de procesamiento."""
         self.running = True
@@ -27,38 +32,47 @@ class ChunkerWorker:
     def stop(self):
         """Detiene el hilo y desbloquea si está esperando."""
         self.running = False
-        self.input_queue.put(None)
+        try:
+            self.input_queue.put_nowait(None)
+        except queue.Full:
+            pass
         self.thread.join()
 
-    def enqueue_frame(self, frame_data: bytes, quality_id: int, is_keyframe: bool):
+    def enqueue_frame(self, frame_data: bytes, quality_id: int, is_keyframe: bool,
+                      frame_number: Optional[int] = None, stage_times=None) -> bool:
         """
-        Coloca un nuevo frame en la cola para procesar.
-        Si la cola está llena, descarta el más antiguo (opcional).
+        Coloca un nuevo frame en la cola para procesar (solo sin source).
+        Devuelve False si la cola está llena y el frame no se aceptó.
         """
         try:
-            self.input_queue.put_nowait((frame_data, quality_id, is_keyframe))
+            self.input_queue.put_nowait((frame_number, frame_data, quality_id, is_keyframe, stage_times))
+            return True
         except queue.Full:
-            # opcional: descartar o reemplazar
-            pass  # Silenciosamente ignora si está llena (para evitar backpressure)
+            return False
 
-    def get_latest_chunks(self,fps=None) -> Optional[Dict]:
-        """Devuelve el último lote de chunks generado (si lo hay)."""
-        time.sleep (1/(fps)) #ajusta la frecuencia de llamado a los fps
-        with self.lock:
-            return self.buffer[-1] if self.buffer else None
+    def get_chunks(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Espera el próximo lote de chunks; cada lote se entrega una única vez."""
+        try:
+            return self.output_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def _next_item(self):
+        if self.source is not None:
+            return self.source.get_frame(timeout=0.1)
+        try:
+            return self.input_queue.get(timeout=0.1)
+        except queue.Empty:
+            return None
 
     def _run(self):
         """Bucle principal de procesamiento del hilo."""
         while self.running:
-            try:
-                item = self.input_queue.get(timeout=0.1)
-            except queue.Empty:
-                continue  # Espera nueva entrada
-
+            item = self._next_item()
             if item is None:
-                break  # Señal de cierre
+                continue  # Espera nueva entrada (o señal de cierre)
 
-            frame_data, quality_id, is_keyframe = item
+            frame_number, frame_data, quality_id, is_keyframe, stage_times = item
 
             if not frame_data:
                 continue  # Seguridad: no procesar vacío
@@ -68,6 +82,8 @@ class ChunkerWorker:
 
             if not chunks:
                 continue  # Seguridad adicional
+            if self.tracer:
+                self.tracer.mark_chunked(chunks, stage_times)
 
             frame_id = int.from_bytes(chunks[0][0:2], 'big')
             timestamp = struct.unpack('>d', chunks[0][8:16])[0]
@@ -75,10 +91,30 @@ class ChunkerWorker:
             frame_info = {
                 "chunks": chunks,
                 "frame_id": frame_id,
+                "frame_number": frame_number,
                 "quality_id": quality_id,
                 "is_keyframe": is_keyframe,
                 "timestamp": timestamp
             }
+            self.chunked_frames += 1
+
+            # Entrega bloqueante: sin descartes aquí, la espera se mide como backpressure
+            wait_start = time.perf_counter()
+            while self.running:
+                try:
+                    self.output_queue.put(frame_info, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+            self.blocked_time += time.perf_counter() - wait_start
+
+    def register_metrics(self, registry):
+        registry.gauge('chunker_input_queue_depth', "Frames esperando ser divididos",
+                       fn=self.input_queue.qsize)
+        registry.gauge('chunker_output_queue_depth', "Frames divididos esperando la red",
+                       fn=self.output_queue.qsize)
+        registry.gauge('chunker_blocked_seconds', "Tiempo total bloqueado por la red", fn=lambda: self.blocked_time)
 
-            with self.lock:
-                self.buffer.append(frame_info)
+    def get_stats(self) -> dict:
+        return {'chunked': self.chunked_frames, 'blocked_s': self.blocked_time,
+                'queued': self.output_queue.qsize()}
@@ -1,5 +1,4 @@
 import threading
-import keyboard
 import time
 
 class ControlWorker:
@@ -16,7 +15,11 @@ class ControlWorker:
 
         self.paused = False
         self.should_exit = False
-        self.client_addr = None
+
+        self.frames_sent = 0
+        self.report_interval = 5.0
+        self.last_report_time = time.monotonic()
+        self.last_reported_drops = 0
 
         self.lock = threading.Lock()
         self.key_thread = threading.Thread(target=self._listen_keys, daemon=True)
@@ -29,11 +32,10 @@ class ControlWorker:
             worker.start()
 
         print("[CONTROL] Esperando conexión de cliente UDP...")
-        while self.client_addr is None:
-            self.client_addr = self.workers["udp"].get_client_addr()
-            time.sleep(0.05)
+        while not self.workers["udp"].wait_for_subscriber(timeout=0.5):
+            pass
 
-        print(f"[CONTROL] Cliente conectado desde: {self.client_addr}")
+        print(f"[CONTROL] Cliente conectado desde: {self.workers['udp'].get_client_addr()}")
         self.key_thread.start()
         self.main_thread.start()
 
@@ -48,13 +50,13 @@ class ControlWorker:
             worker.stop()
 
         self.screen_capturer.release()
-        if self.client_addr:
-            self.udp_server.send_eof(self.client_addr)
+        self.workers["udp"].close_subscribers()
 
         print("[CONTROL] Todos los hilos detenidos. Servidor finalizado.")
 
     def _listen_keys(self):
         """Escucha las teclas 'p' (pausa) y 'q' (salir)."""
+        import keyboard  # Solo con teclas: el bucle de transmisión puede correr sin teclado (benchmarks)
         print("[CONTROL] Escuchando teclas 'p' (pausar) y 'q' (salir)...")
         while not self.should_exit:
             if keyboard.is_pressed('p'):
@@ -72,30 +74,59 @@ class ControlWorker:
                 break
             time.sleep(0.1)  # ← Esto es clave para que no monopolice la CPU
     def _run_loop(self):
-        """Bucle principal de transmisión de frames."""
-        screen = self.workers["screen"]
+        """Bucle principal de transmisión: reparte cada lote de chunks una sola vez a todos los clientes."""
         chunker = self.workers["chunker"]
+        udp = self.workers["udp"]
+        was_paused = False
+        awaiting_keyframe = False  # Modo delta: se descartan deltas hasta el próximo frame completo
 
         print("[CONTROL] Comenzando bucle principal de transmisión...")
         while not self.should_exit:
-            with self.lock:
-                if self.paused:
-                    time.sleep(0.1)
-                    continue
-
-            frame = screen.get_latest_frame()
-            if frame is None:
-           
-                continue
-
-            is_keyframe, quality_id = screen.is_keyframe()
-            chunker.enqueue_frame(frame, quality_id, is_keyframe)
-
-            fps=screen.get_fps()
-            chunk_data = chunker.get_latest_chunks(fps)
+            chunk_data = chunker.get_chunks(timeout=0.1)
             if chunk_data is None:
-
                 continue
 
-            for chunk in chunk_data["chunks"]:
-                self.udp_server.send_packet_bytes(chunk, self.client_addr)
+            with self.lock:
+                paused = self.paused
+            if paused:
+                was_paused = True
+                continue  # En pausa los frames se consumen sin enviarse
+            if was_paused:
+                # Los frames descartados durante la pausa son referencia de los deltas que
+                # siguen en las colas de captura y del chunker: no deben llegar al cliente
+                flushed = self.workers["screen"].request_keyframe()
+                awaiting_keyframe = self.screen_capturer.tile_encoder is not None
+                if awaiting_keyframe:
+                    print(f"[CONTROL] Reanudado: {flushed} deltas descartados en captura, esperando frame completo")
+                was_paused = False
+            if awaiting_keyframe:
+                if not chunk_data["is_keyframe"]:
+                    continue  # Delta contra un frame que el cliente no recibió
+                awaiting_keyframe = False
+
+            udp.broadcast(chunk_data["chunks"])
+            self.frames_sent += 1
+            self._report_backpressure()
+
+    def _report_backpressure(self):
+        """Informa periódicamente si la red no da abasto y la captura está descartando frames."""
+        now = time.monotonic()
+        if now - self.last_report_time < self.report_interval:
+            return
+        self.last_report_time = now
+
+        stats = self.get_pipeline_stats()
+        dropped = stats["capture"]["dropped"] - self.last_reported_drops
+        self.last_reported_drops = stats["capture"]["dropped"]
+        if dropped > 0:
+            print(f"[CONTROL] Backpressure: {dropped} frames descartados en captura, "
+                  f"chunker bloqueado {stats['chunker']['blocked_s']:.2f} s en total")
+
+    def get_pipeline_stats(self) -> dict:
+        """Contadores de cada etapa: captura, chunking, envío y por cliente."""
+        return {
+            "capture": self.workers["screen"].get_stats(),
+            "chunker": self.workers["chunker"].get_stats(),
+            "sent": self.frames_sent,
+            "subscribers": self.workers["udp"].get_subscriber_stats(),
+        }
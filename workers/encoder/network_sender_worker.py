@@ -1,15 +1,21 @@
 import threading
 from typing import Optional, Tuple
 from udp_connection.udp_server import UDPServer
+from udp_connection.subscribers import SubscriberRegistry
 
 
 class UDPServerWorker:
     """
     Encapsula el manejo de un servidor UDP en un hilo separado.
+    Atiende los mensajes de control de los clientes (READY, BYE, HEARTBEAT, KEYFRAME, NACK)
+    y mantiene el registro de suscriptores a los que se reparte cada frame.
     """
-    def __init__(self, udp_server: UDPServer):
+    def __init__(self, udp_server: UDPServer, client_timeout_s: float = 10.0,
+                 queue_size: int = 4, on_join=None, on_keyframe_request=None):
         self.server = udp_server
-        self.client_addr: Optional[Tuple[str, int]] = None
+        self.registry = SubscriberRegistry(udp_server, timeout_s=client_timeout_s,
+                                           queue_size=queue_size, on_join=on_join,
+                                           on_keyframe_request=on_keyframe_request)
         self.running = False
         self.thread = threading.Thread(target=self._run, daemon=True)
 
@@ -30,13 +36,31 @@ class UDPServerWorker:
         return self.server.should_stop()
 
     def get_client_addr(self) -> Optional[Tuple[str, int]]:
-        return self.client_addr
+        """Primer cliente conectado (compatibilidad con el modo de un solo cliente)."""
+        addresses = self.registry.addresses()
+        return addresses[0] if addresses else None
+
+    def wait_for_subscriber(self, timeout: Optional[float] = None) -> bool:
+        return self.registry.wait_for_subscriber(timeout)
+
+    def broadcast(self, chunks) -> int:
+        """Reparte un frame ya dividido a todos los clientes conectados."""
+        return self.registry.broadcast(chunks)
+
+    def close_subscribers(self):
+        """Envía EOF a todos los clientes y detiene sus hilos de envío."""
+        self.registry.close()
+
+    def get_subscriber_stats(self) -> dict:
+        return self.registry.get_stats()
+
+    def register_metrics(self, registry):
+        self.registry.register_metrics(registry)
 
     def _run(self):
-        print("[UDP WORKER] Esperando conexión del cliente...")
-        data, addr = self.server.receive()
-        if addr:
-            self.client_addr = addr
-            print(f"[UDP WORKER] Cliente detectado: {addr}")
-        else:
-            print("[UDP WORKER] No se pudo establecer cliente.")
+        print("[UDP WORKER] Esperando conexión de clientes...")
+        while self.running:
+            # Los NACK se atienden dentro de poll_control; el resto son altas, bajas y heartbeats
+            for data, addr in self.server.poll_control(timeout=0.2):
+                self.registry.handle_message(data, addr)
+            self.registry.expire()
@@ -1,53 +1,182 @@
 import threading
-import collections
+import queue
 from typing import Optional
-from encoder.screencapturer import ScreenCapturer
-import time
+from encoder.framesource import FrameSource
+from encoder.parallelencoder import ParallelJpegEncoder
 
 class ScreenCaptureWorker:
     """
     Clase encargada de capturar frames de pantalla en un hilo separado,
-    utilizando una instancia de ScreenCapturer.
+    utilizando una fuente de frames (pantalla, grabación, ...).
+    Cada frame capturado recibe un número creciente y se entrega una sola vez por
+    una cola acotada; si la etapa siguiente va atrasada se descarta el más antiguo
+    y se cuenta como backpressure.
+    Con encoder_pool, este hilo solo captura y la codificación JPEG se reparte
+    entre los procesos del pool; los frames vuelven en orden por otro hilo.
     """
-    def __init__(self, capturer: ScreenCapturer, buffer_size: int = 1):
+    def __init__(self, capturer: FrameSource, buffer_size: int = 2,
+                 encoder_pool: Optional[ParallelJpegEncoder] = None):
         self.capturer = capturer
-        self.buffer = collections.deque(maxlen=buffer_size)
+        self.frame_queue = queue.Queue(maxsize=buffer_size)
         self.lock = threading.Lock()
-        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+
+        self.next_frame_number = 0
+        self.captured = 0
+        self.dropped = 0  # Frames descartados porque la etapa siguiente no los tomó a tiempo
+
+        if encoder_pool is not None and capturer.tile_encoder is not None:
+            # El delta por tiles depende del frame anterior: se codifica en serie
+            print("[WORKER] Delta por tiles activo: se ignora el pool de codificación.")
+            encoder_pool = None
+        elif encoder_pool is not None and not capturer.raw_capture:
+            # Grabaciones y fuentes que ya entregan frames codificados
+            print("[WORKER] La fuente ya entrega frames codificados: se ignora el pool de codificación.")
+            encoder_pool = None
+        self.encoder_pool = encoder_pool
+
+        target = self._capture_raw_loop if encoder_pool is not None else self._capture_loop
+        self.thread = threading.Thread(target=target, daemon=True)
+        self.collect_thread = threading.Thread(target=self._collect_loop, daemon=True)
         self.running = False
 
     def start(self):
         """Inicia el hilo de captura."""
         self.running = True
+        if self.encoder_pool is not None:
+            self.encoder_pool.start()
+            self.collect_thread.start()
         self.thread.start()
 
     def stop(self):
         """Detiene el hilo de captura y libera recursos."""
         self.running = False
         self.thread.join()
+        if self.encoder_pool is not None:
+            self.collect_thread.join()
+            self.encoder_pool.stop()
         self.capturer.release()
 
+    def _publish(self, frame_bytes: bytes, stage_times=None):
+        """Numera el frame y lo deja en la cola; si está llena descarta el más antiguo."""
+        is_keyframe, quality_id = self.capturer.is_keyframe()
+        with self.lock:
+            frame_number = self.next_frame_number
+            self.next_frame_number += 1
+            self.captured += 1
+
+            item = (frame_number, frame_bytes, quality_id, is_keyframe, stage_times)
+            dropped_now = False
+            while True:
+                try:
+                    self.frame_queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        self.frame_queue.get_nowait()
+                        self.dropped += 1
+                        dropped_now = True
+                    except queue.Empty:
+                        pass
+
+            # En modo delta un frame descartado rompe los siguientes: se descartan los
+            # deltas que quedaron en cola y el próximo sale completo
+            delta_broken = dropped_now and self.capturer.tile_encoder is not None
+            if delta_broken:
+                self._flush_deltas()
+        if delta_broken:
+            self.capturer.request_keyframe()
+
+    def _flush_deltas(self) -> int:
+        """
+        Descarta los deltas encolados hasta el primer frame completo (con self.lock tomado).
+        Desde un frame completo en adelante la cadena vuelve a ser válida y se conserva.
+        """
+        kept = []
+        flushed = 0
+        while True:
+            try:
+                item = self.frame_queue.get_nowait()
+            except queue.Empty:
+                break
+            if kept or item[3]:
+                kept.append(item)
+            else:
+                flushed += 1
+        for item in kept:
+            self.frame_queue.put_nowait(item)
+        self.dropped += flushed
+        return flushed
+
+    def request_keyframe(self) -> int:
+        """
+        Fuerza que el próximo frame sea completo. En modo delta descarta además los deltas
+        aún en cola, que dependen de frames que el cliente no va a recibir.
+        Devuelve cuántos frames se descartaron.
+        """
+        flushed = 0
+        if self.capturer.tile_encoder is not None:
+            with self.lock:
+                flushed = self._flush_deltas()
+        self.capturer.request_keyframe()
+        return flushed
+
     def _capture_loop(self):
         """Loop interno del hilo que captura frames JPEG."""
         while self.running:
             try:
-                
                 frame_bytes = next(self.capturer)
-                with self.lock:
-                    self.buffer.append(frame_bytes)
+                self._publish(frame_bytes, self.capturer.stage_times)
+            except StopIteration:
+                print("[WORKER] La fuente no tiene más frames.")
+                break
             except Exception as e:
                 print(f"[WORKER] Error capturando frame: {e}")
 
-    def get_latest_frame(self, sync_with_fps: bool = True) -> Optional[bytes]:
-        if sync_with_fps:
-            pass
-            #time.sleep(self.capturer.frame_duration)
+    def _capture_raw_loop(self):
+        """Loop de captura con pool: entrega los frames BGRA sin codificar."""
+        capturer = self.capturer
+        while self.running:
+            try:
+                raw = capturer.grab_raw()
+                self.encoder_pool.update_config(capturer.width, capturer.height, capturer.quality)
+                if not self.encoder_pool.submit(raw):
+                    with self.lock:
+                        self.dropped += 1
+            except Exception as e:
+                print(f"[WORKER] Error capturando frame: {e}")
+
+    def _collect_loop(self):
+        """Recibe del pool los JPEG ya reordenados por secuencia."""
+        while self.running:
+            frame_bytes = self.encoder_pool.get(timeout=0.1)
+            if frame_bytes is not None:
+                self._publish(frame_bytes)
+
+    def get_frame(self, timeout: Optional[float] = None):
+        """
+        Espera el próximo frame capturado y lo entrega una única vez.
+        Devuelve (frame_number, frame_bytes, quality_id, is_keyframe, stage_times) o None si vence el timeout.
+        stage_times son los instantes de captura/escalado/codificación (None con el pool).
+        """
+        try:
+            return self.frame_queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
 
+    def get_stats(self) -> dict:
+        """Frames capturados y descartados por backpressure."""
         with self.lock:
-            if self.buffer:
-                return self.buffer[-1]
-            else:
-                return None
+            return {'captured': self.captured, 'dropped': self.dropped,
+                    'queued': self.frame_queue.qsize()}
+
+    def register_metrics(self, registry):
+        """Gauges de la etapa de captura (se evalúan solo al exportar)."""
+        registry.gauge('capture_queue_depth', "Frames capturados esperando al chunker",
+                       fn=self.frame_queue.qsize)
+        registry.gauge('capture_frames_dropped', "Frames descartados por backpressure", fn=lambda: self.dropped)
+        if self.encoder_pool is not None:
+            registry.gauge('encoder_output_queue_depth', "Frames codificados por el pool sin publicar",
+                           fn=self.encoder_pool.output_queue.qsize)
 
     def is_keyframe(self) -> tuple[bool, int]:
         """Delegado directo al capturador."""
@@ -60,3 +189,9 @@ class ScreenCaptureWorker:
     def get_fps(self):
         """Devuelve los fps a los que esta capturando"""
         return self.capturer.get_fps()
+
+    def get_encoder_stats(self) -> Optional[dict]:
+        """Tiempo de codificación por proceso del pool (None si se codifica en serie)."""
+        if self.encoder_pool is None:
+            return None
+        return self.encoder_pool.get_worker_stats()